@@ -0,0 +1,118 @@
+from __future__ import annotations
+
+import importlib
+from dataclasses import dataclass
+from typing import Any, BinaryIO, Final
+
+# (api_key, api_version) -> where its codecs live and which headers it uses.
+# Only names are stored here: a codec module is imported the first time
+# one of its classes is needed, so tools that touch a few APIs
+# don't pay for importing all of them.
+
+HEADERS_MODULE: Final = "request_response_headers"
+
+_loaded: dict[tuple[str, str], Any] = {}
+
+
+def _load(module: str, name: str) -> Any:
+    cls = _loaded.get((module, name))
+    if cls is None:
+        cls = _loaded[(module, name)] = getattr(importlib.import_module(module), name)
+    return cls
+
+
+@dataclass(frozen=True)
+class ApiSpec:
+    api_key: int
+    api_version: int
+    name: str
+    module: str
+    request_class: str
+    response_class: str
+    request_header_version: int
+    response_header_version: int
+
+    @property
+    def request_type(self) -> Any:
+        return _load(self.module, self.request_class)
+
+    @property
+    def response_type(self) -> Any:
+        return _load(self.module, self.response_class)
+
+    @property
+    def request_header_type(self) -> Any:
+        return _load(HEADERS_MODULE, f"RequestHeaderV{self.request_header_version}")
+
+    @property
+    def response_header_type(self) -> Any:
+        return _load(HEADERS_MODULE, f"ResponseHeaderV{self.response_header_version}")
+
+    def read_request(self, buffer: BinaryIO) -> tuple[Any, Any]:
+        # A request frame without the size prefix: the header, then the body.
+        # Decode errors don't name the broken field,
+        # `field_spans.read_with_path` can find it.
+        header = self.request_header_type.read(buffer)
+        return header, self.request_type.read(buffer)
+
+    def read_response(self, buffer: BinaryIO) -> tuple[Any, Any]:
+        header = self.response_header_type.read(buffer)
+        return header, self.response_type.read(buffer)
+
+
+API_SPECS: Final = [
+    ApiSpec(
+        api_key=1,
+        api_version=0,
+        name="Fetch",
+        module="fetch_request_v0",
+        request_class="FetchRequestV0",
+        response_class="FetchResponseV0",
+        request_header_version=1,
+        response_header_version=0,
+    ),
+    ApiSpec(
+        api_key=3,
+        api_version=12,
+        name="Metadata",
+        module="metadata_v12",
+        request_class="MetadataRequestV12",
+        response_class="MetadataResponseV12",
+        request_header_version=2,
+        response_header_version=1,
+    ),
+    ApiSpec(
+        api_key=18,
+        api_version=0,
+        name="ApiVersions",
+        module="api_versions_v0",
+        request_class="ApiVersionsRequestV0",
+        response_class="ApiVersionsResponseV0",
+        request_header_version=1,
+        response_header_version=0,
+    ),
+    ApiSpec(
+        api_key=18,
+        api_version=3,
+        name="ApiVersions",
+        module="api_versions_v3",
+        request_class="ApiVersionsRequestV3",
+        response_class="ApiVersionsResponseV3",
+        request_header_version=2,
+        # ApiVersions responses always use header v0.
+        response_header_version=0,
+    ),
+]
+
+API_REGISTRY: Final = {(spec.api_key, spec.api_version): spec for spec in API_SPECS}
+
+
+def lookup(api_key: int, api_version: int) -> ApiSpec:
+    spec = API_REGISTRY.get((api_key, api_version))
+    if spec is None:
+        raise ValueError(f"Unsupported API key {api_key} version {api_version}")
+    return spec
+
+
+def supported_versions(api_key: int) -> list[int]:
+    return sorted(v for k, v in API_REGISTRY if k == api_key)
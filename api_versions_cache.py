@@ -0,0 +1,187 @@
+from __future__ import annotations
+
+import json
+import os
+import socket
+import time
+from dataclasses import dataclass
+from typing import Callable, Final, Mapping
+
+from api_versions_v3 import ApiVersionsResponseV3, send_request, read_response
+
+UNSUPPORTED_VERSION: Final = 35
+
+# The versions this client can speak: api_key -> (min_version, max_version).
+CLIENT_API_VERSIONS: Final[Mapping[int, tuple[int, int]]] = {
+    1: (0, 0),  # Fetch
+    3: (12, 12),  # Metadata
+    18: (0, 3),  # ApiVersions
+}
+
+BrokerAddress = tuple[str, int]
+
+
+def negotiate_versions(
+    response: ApiVersionsResponseV3,
+    client_versions: Mapping[int, tuple[int, int]] = CLIENT_API_VERSIONS,
+) -> dict[int, int]:
+    # For each API both sides know, pick the highest version
+    # that is inside both supported ranges.
+    result: dict[int, int] = {}
+    for api_key in response.api_keys:
+        client_range = client_versions.get(api_key.api_key)
+        if client_range is None:
+            continue
+        low = max(client_range[0], api_key.min_version)
+        high = min(client_range[1], api_key.max_version)
+        if low <= high:
+            result[api_key.api_key] = high
+    return result
+
+
+def fetch_api_versions(
+    sock: socket.socket, request_correlation_id: int
+) -> ApiVersionsResponseV3:
+    send_request(request_correlation_id, sock)
+    _, message = read_response(request_correlation_id, sock)
+    return message
+
+
+@dataclass
+class NegotiatedVersions:
+    versions: dict[int, int]
+    # Wall clock time, so entries stay meaningful across process restarts.
+    negotiated_at: float
+
+
+class ApiVersionsCache:
+    def __init__(
+        self,
+        ttl_s: float = 3600.0,
+        path: str | None = None,
+        client_versions: Mapping[int, tuple[int, int]] = CLIENT_API_VERSIONS,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self._ttl_s = ttl_s
+        self._path = path
+        self._client_versions = client_versions
+        self._clock = clock
+        self._entries: dict[tuple[BrokerAddress, str | None], NegotiatedVersions] = {}
+        if path is not None:
+            self._load(path)
+
+    def get(
+        self, address: BrokerAddress, cluster_id: str | None
+    ) -> dict[int, int] | None:
+        entry = self._entries.get((address, cluster_id))
+        if entry is None:
+            return None
+        if self._clock() - entry.negotiated_at >= self._ttl_s:
+            self.invalidate(address, cluster_id)
+            return None
+        return entry.versions
+
+    def version_for(
+        self, address: BrokerAddress, cluster_id: str | None, api_key: int
+    ) -> int | None:
+        versions = self.get(address, cluster_id)
+        if versions is None:
+            return None
+        return versions.get(api_key)
+
+    def put(
+        self,
+        address: BrokerAddress,
+        cluster_id: str | None,
+        response: ApiVersionsResponseV3,
+    ) -> dict[int, int]:
+        if response.error_code != 0:
+            raise ValueError(
+                f"ApiVersions failed with error code {response.error_code}"
+            )
+        versions = negotiate_versions(response, self._client_versions)
+        self._entries[(address, cluster_id)] = NegotiatedVersions(
+            versions=versions, negotiated_at=self._clock()
+        )
+        self._save()
+        return versions
+
+    def get_or_fetch(
+        self,
+        address: BrokerAddress,
+        cluster_id: str | None,
+        fetch: Callable[[], ApiVersionsResponseV3],
+    ) -> dict[int, int]:
+        versions = self.get(address, cluster_id)
+        if versions is None:
+            versions = self.put(address, cluster_id, fetch())
+        return versions
+
+    def invalidate(self, address: BrokerAddress, cluster_id: str | None) -> None:
+        if self._entries.pop((address, cluster_id), None) is not None:
+            self._save()
+
+    def handle_error(
+        self, address: BrokerAddress, cluster_id: str | None, error_code: int
+    ) -> bool:
+        # The broker may have been downgraded or restarted with a different
+        # configuration. Drop the entry, so the next `get_or_fetch` renegotiates.
+        if error_code == UNSUPPORTED_VERSION:
+            self.invalidate(address, cluster_id)
+            return True
+        return False
+
+    def _load(self, path: str) -> None:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError):
+            # A corrupt cache is not fatal, we just negotiate again.
+            return
+
+        if not isinstance(data, dict):
+            return
+        entries = data.get("entries", [])
+        if not isinstance(entries, list):
+            return
+        now = self._clock()
+        for entry in entries:
+            try:
+                negotiated_at = float(entry["negotiated_at"])
+                if now - negotiated_at >= self._ttl_s:
+                    continue
+                address = (str(entry["host"]), int(entry["port"]))
+                cluster_id = entry["cluster_id"]
+                if cluster_id is not None and not isinstance(cluster_id, str):
+                    continue
+                versions = {int(k): int(v) for k, v in entry["versions"].items()}
+            except (AttributeError, KeyError, TypeError, ValueError):
+                # An entry of the wrong shape is skipped, like an expired one.
+                continue
+            self._entries[(address, cluster_id)] = NegotiatedVersions(
+                versions=versions, negotiated_at=negotiated_at
+            )
+
+    def _save(self) -> None:
+        if self._path is None:
+            return
+        data = {
+            "entries": [
+                {
+                    "host": address[0],
+                    "port": address[1],
+                    "cluster_id": cluster_id,
+                    "negotiated_at": entry.negotiated_at,
+                    "versions": {str(k): v for k, v in entry.versions.items()},
+                }
+                for (address, cluster_id), entry in self._entries.items()
+            ]
+        }
+        # Write to a temporary file and rename it,
+        # so concurrent readers never see a partially written cache.
+        tmp_path = f"{self._path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self._path)
@@ -17,6 +17,10 @@ from request_response_headers import RequestHeaderV1, ResponseHeaderV0
 
 @dataclass
 class ApiVersionsRequestV0:
+    @classmethod
+    def read(cls, buffer: BinaryIO) -> ApiVersionsRequestV0:
+        return ApiVersionsRequestV0()
+
     def write(self, buffer: BinaryIO) -> None:
         pass
 
@@ -6,6 +6,7 @@ from io import BytesIO
 from pprint import pprint
 from typing import BinaryIO
 
+import instrumentation
 from raw_tagged_fields import (
     RawTaggedField,
     write_unknown_tagged_fields,
@@ -13,10 +14,13 @@ from raw_tagged_fields import (
 )
 from read_write import (
     read_int16,
+    write_int16,
     write_int32,
     read_int32,
+    read_string,
     write_string,
     read_array,
+    write_array,
 )
 from request_response_headers import RequestHeaderV2, ResponseHeaderV0
 
@@ -27,6 +31,14 @@ class ApiVersionsRequestV3:
     client_software_version: str
     _unknownTaggedFields: list[RawTaggedField]
 
+    @classmethod
+    def read(cls, buffer: BinaryIO) -> ApiVersionsRequestV3:
+        return ApiVersionsRequestV3(
+            client_software_name=read_string(buffer, True),
+            client_software_version=read_string(buffer, True),
+            _unknownTaggedFields=read_unknown_tagged_fields(buffer),
+        )
+
     def write(self, buffer: BinaryIO) -> None:
         write_string(self.client_software_name, buffer, True)
         write_string(self.client_software_version, buffer, True)
@@ -49,6 +61,12 @@ class ApiVersionsResponseApiKeyV3:
             _unknownTaggedFields=read_unknown_tagged_fields(buffer),
         )
 
+    def write(self, buffer: BinaryIO) -> None:
+        write_int16(self.api_key, buffer)
+        write_int16(self.min_version, buffer)
+        write_int16(self.max_version, buffer)
+        write_unknown_tagged_fields(self._unknownTaggedFields, buffer)
+
 
 @dataclass
 class ApiVersionsResponseV3:
@@ -66,6 +84,12 @@ class ApiVersionsResponseV3:
             _unknownTaggedFields=read_unknown_tagged_fields(buffer),
         )
 
+    def write(self, buffer: BinaryIO) -> None:
+        write_int16(self.error_code, buffer)
+        write_array(self.api_keys, ApiVersionsResponseApiKeyV3.write, buffer, True)
+        write_int32(self.throttle_time_ms, buffer)
+        write_unknown_tagged_fields(self._unknownTaggedFields, buffer)
+
 
 def send_request(request_correlation_id: int, sock: socket.socket) -> None:
     buffer = BytesIO()
@@ -96,20 +120,30 @@ def send_request(request_correlation_id: int, sock: socket.socket) -> None:
     buffer.seek(0)
     write_int32(request_message_size, buffer)
 
-    sock.sendall(buffer.getvalue())
+    instrumentation.send(sock, buffer.getvalue(), instrumentation.key(sock, 18, 3))
 
 
-def receive_response(request_correlation_id: int, sock: socket.socket) -> None:
-    # The first 4 bytes is the length.
-    message_size = read_int32(BytesIO(sock.recv(4)))
-    buffer = BytesIO(sock.recv(message_size))
+def read_response(
+    request_correlation_id: int, sock: socket.socket
+) -> tuple[ResponseHeaderV0, ApiVersionsResponseV3]:
+    key = instrumentation.key(sock, 18, 3)
+    buffer = BytesIO(instrumentation.receive(sock, key))
 
-    header = ResponseHeaderV0.read(buffer)
+    header = instrumentation.decode(
+        instrumentation.HEADER_DECODE, ResponseHeaderV0.read, buffer, key
+    )
     if header.correlation_id != request_correlation_id:
         raise ValueError()
-    pprint(header)
 
-    message = ApiVersionsResponseV3.read(buffer)
+    message = instrumentation.decode(
+        instrumentation.BODY_DECODE, ApiVersionsResponseV3.read, buffer, key
+    )
+    return header, message
+
+
+def receive_response(request_correlation_id: int, sock: socket.socket) -> None:
+    header, message = read_response(request_correlation_id, sock)
+    pprint(header)
     pprint(message)
 
 
@@ -0,0 +1,261 @@
+from __future__ import annotations
+
+import argparse
+import random
+import timeit
+from io import BytesIO
+from types import ModuleType
+from typing import Callable
+
+import instrumentation
+import read_write
+import read_write_unchecked
+from compiled import is_compiled, load_pure
+from corpus import RecordBatchShape, random_record_batch
+from framing import encode_frame
+from metadata_v12 import (
+    MetadataResponseBrokerV12,
+    MetadataResponsePartitionV12,
+    MetadataResponseTopicV12,
+    MetadataResponseV12,
+)
+from record_batch import read_batches
+from record_columns import read_columns
+from request_response_headers import ResponseHeaderV1
+
+# Compares the codec tiers on the primitives messages are built of.
+# Each case gets a fresh buffer and returns the operation to time.
+Case = Callable[[ModuleType], Callable[[], object]]
+
+
+def _write_int32(rw: ModuleType) -> Callable[[], object]:
+    buf, write = BytesIO(), rw.write_int32
+    return lambda: write(123456, buf)
+
+
+def _write_int64(rw: ModuleType) -> Callable[[], object]:
+    buf, write = BytesIO(), rw.write_int64
+    return lambda: write(1_700_000_000_000, buf)
+
+
+def _write_unsigned_varint(rw: ModuleType) -> Callable[[], object]:
+    buf, write = BytesIO(), rw.write_unsigned_varint
+    return lambda: write(42, buf)
+
+
+def _write_compact_string(rw: ModuleType) -> Callable[[], object]:
+    buf, write = BytesIO(), rw.write_string
+    return lambda: write("test-topic1", buf, True)
+
+
+def _write_int32_array(rw: ModuleType) -> Callable[[], object]:
+    buf, write_array, write_int32 = BytesIO(), rw.write_array, rw.write_int32
+    array = list(range(16))
+    return lambda: write_array(array, write_int32, buf, True)
+
+
+def _read_int32(rw: ModuleType) -> Callable[[], object]:
+    buf, read = BytesIO(b"\x00\x01\xe2\x40"), rw.read_int32
+
+    def run() -> object:
+        buf.seek(0)
+        return read(buf)
+
+    return run
+
+
+def _read_compact_string(rw: ModuleType) -> Callable[[], object]:
+    buf, read = BytesIO(b"\x0ctest-topic1"), rw.read_string
+
+    def run() -> object:
+        buf.seek(0)
+        return read(buf, True)
+
+    return run
+
+
+CASES: dict[str, Case] = {
+    "write_int32": _write_int32,
+    "write_int64": _write_int64,
+    "write_unsigned_varint": _write_unsigned_varint,
+    "write_string (compact)": _write_compact_string,
+    "write_array[int32] x16": _write_int32_array,
+    "read_int32": _read_int32,
+    "read_string (compact)": _read_compact_string,
+}
+
+
+def tiers() -> dict[str, ModuleType]:
+    # After `make mypyc`, the pure-Python modules are measured too.
+    result: dict[str, ModuleType] = {}
+    for name, module in (("strict", read_write), ("unchecked", read_write_unchecked)):
+        if is_compiled(module):
+            result[f"{name} (pure)"] = load_pure(module.__name__)
+            result[f"{name} (mypyc)"] = module
+        else:
+            result[name] = module
+    return result
+
+
+def measure(case: Case, rw: ModuleType, number: int) -> float:
+    # The best of several runs, in ns per operation.
+    op = case(rw)
+    return min(timeit.repeat(op, number=number, repeat=5)) / number * 1e9
+
+
+def _metadata_response(partitions: int) -> MetadataResponseV12:
+    return MetadataResponseV12(
+        throttle_time_ms=0,
+        brokers=[
+            MetadataResponseBrokerV12(
+                node_id=1,
+                host="localhost",
+                port=9092,
+                rack=None,
+                _unknownTaggedFields=[],
+            )
+        ],
+        cluster_id="cluster",
+        controller_id=1,
+        topics=[
+            MetadataResponseTopicV12(
+                error_code=0,
+                name="test-topic1",
+                topic_id=None,
+                is_internal=False,
+                partitions=[
+                    MetadataResponsePartitionV12(
+                        error_code=0,
+                        partition_index=p,
+                        leader_id=1,
+                        leader_epoch=0,
+                        replica_nodes=[1],
+                        isr_nodes=[1],
+                        offline_replicas=[],
+                        _unknownTaggedFields=[],
+                    )
+                    for p in range(partitions)
+                ],
+                topic_authorized_operations=-2147483648,
+                _unknownTaggedFields=[],
+            )
+        ],
+        _unknownTaggedFields=[],
+    )
+
+
+def _metadata_frame() -> bytes:
+    # A small response, so the overhead of the hooks isn't hidden
+    # behind a long decode.
+    # Without the size prefix.
+    return encode_frame(
+        ResponseHeaderV1(correlation_id=1, _unknownTaggedFields=[]),
+        _metadata_response(2),
+    )[4:]
+
+
+def _decode_without_hooks(frame: bytes) -> Callable[[], object]:
+    def run() -> object:
+        buffer = BytesIO(frame)
+        ResponseHeaderV1.read(buffer)
+        return MetadataResponseV12.read(buffer)
+
+    return run
+
+
+def _decode_with_hooks(frame: bytes) -> Callable[[], object]:
+    # What `read_response` does after receiving the frame.
+    def run() -> object:
+        key = None if instrumentation.metrics is None else (3, 12, "bench")
+        buffer = BytesIO(frame)
+        instrumentation.decode(
+            instrumentation.HEADER_DECODE, ResponseHeaderV1.read, buffer, key
+        )
+        return instrumentation.decode(
+            instrumentation.BODY_DECODE, MetadataResponseV12.read, buffer, key
+        )
+
+    return run
+
+
+def instrumentation_overhead(number: int) -> dict[str, float]:
+    # ns per decode of a whole Metadata response.
+    frame = _metadata_frame()
+
+    def best(op: Callable[[], object]) -> float:
+        return min(timeit.repeat(op, number=number, repeat=5)) / number * 1e9
+
+    result = {"no hooks": best(_decode_without_hooks(frame))}
+    result["hooks disabled"] = best(_decode_with_hooks(frame))
+    instrumentation.enable()
+    try:
+        result["hooks enabled"] = best(_decode_with_hooks(frame))
+    finally:
+        instrumentation.disable()
+    return result
+
+
+def records_export(number: int) -> dict[str, float]:
+    # ns per record of a partition with 10 batches of 100 records.
+    rng = random.Random(0)
+    shape = RecordBatchShape(records=(100, 100), value_size=(0, 200))
+    buffer = BytesIO()
+    for i in range(10):
+        random_record_batch(rng, i * 100, shape).write(buffer)
+    data = buffer.getvalue()
+
+    def best(op: Callable[[], object]) -> float:
+        return min(timeit.repeat(op, number=number, repeat=5)) / number / 1000 * 1e9
+
+    return {
+        "Record objects": best(lambda: list(read_batches(data))),
+        # `read_batches` doesn't verify CRCs.
+        "columns": best(lambda: read_columns(data, verify_crc=False)),
+        "columns, CRC verified": best(lambda: read_columns(data)),
+    }
+
+
+def metadata_write(number: int) -> dict[str, float]:
+    # ns per partition of a response with 1000 partitions.
+    response = _metadata_response(1000)
+
+    def best(op: Callable[[], object]) -> float:
+        return min(timeit.repeat(op, number=number, repeat=5)) / number / 1000 * 1e9
+
+    return {
+        "write": best(lambda: response.write(BytesIO())),
+        "write_unchecked": best(lambda: response.write_unchecked(BytesIO())),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the codec tiers")
+    parser.add_argument("--number", type=int, default=100_000)
+    args = parser.parse_args()
+
+    modules = tiers()
+    print(f"{'operation':<24}" + "".join(f"{t + ' ns':>22}" for t in modules))
+    for name, case in CASES.items():
+        results = [measure(case, rw, args.number) for rw in modules.values()]
+        print(f"{name:<24}" + "".join(f"{r:>22.1f}" for r in results))
+
+    print()
+    overhead = instrumentation_overhead(args.number // 10)
+    baseline = overhead["no hooks"]
+    print(f"{'Metadata decode':<24}{'ns':>22}{'overhead':>22}")
+    for name, ns in overhead.items():
+        print(f"{name:<24}{ns:>22.1f}{(ns / baseline - 1) * 100:>21.1f}%")
+
+    print()
+    print(f"{'Records decode':<24}{'ns per record':>22}")
+    for name, ns in records_export(max(1, args.number // 10_000)).items():
+        print(f"{name:<24}{ns:>22.1f}")
+
+    print()
+    print(f"{'Metadata encode':<24}{'ns per partition':>22}")
+    for name, ns in metadata_write(max(1, args.number // 10_000)).items():
+        print(f"{name:<24}{ns:>22.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+from __future__ import annotations
+
+import socket
+import threading
+import time
+import weakref
+from collections import deque
+from typing import BinaryIO, Final
+
+from framing import receive_into
+from memory_reader import memory_reader
+from read_write import read_int32
+
+# Reusable receive buffers shared by all connections, with a limit on the total
+# memory they take. Buffers come in power-of-two size classes; frames larger
+# than the largest class get a buffer of their own, which isn't reused.
+#
+# When the budget is exhausted, `receive_frame` waits after reading the size
+# of a frame and before reading its body, so the rest of the frame stays
+# in the socket and TCP flow control slows the broker down.
+#
+# A buffer goes back to the pool when its lease is released or garbage
+# collected, but only once no memoryviews over it remain, e.g. record batches
+# sliced out of a Fetch response. Until then it counts against the budget.
+
+MIN_CLASS_BYTES: Final = 4 * 1024
+MAX_CLASS_BYTES: Final = 16 * 1024 * 1024
+# How often a waiting `acquire` checks for released buffers:
+# finalizers don't always manage to wake it up, and buffers
+# whose views are dropped don't notify anyone.
+POLL_INTERVAL_S: Final = 0.01
+
+
+def _has_exports(buffer: bytearray) -> bool:
+    # A bytearray can't be resized while memoryviews over it exist.
+    # Shrinking by a byte and growing back stays within its allocation,
+    # growing first would reallocate it with room to spare.
+    try:
+        last = buffer.pop()
+    except BufferError:
+        return True
+    buffer.append(last)
+    return False
+
+
+class Lease:
+    def __init__(self, pool: BufferPool, buffer: bytearray, size: int) -> None:
+        self.size = size
+        self.capacity = len(buffer)
+        # The first `size` bytes of the buffer.
+        self.view = memoryview(buffer)[:size]
+        self._finalizer = weakref.finalize(self, pool._return, buffer)
+
+    def reader(self) -> BinaryIO:
+        return memory_reader(self.view)
+
+    def release(self) -> None:
+        # Views taken from `view` stay valid,
+        # the buffer isn't reused until they are dropped.
+        self.view = memoryview(b"")
+        self._finalizer()
+
+    @property
+    def released(self) -> bool:
+        return not self._finalizer.alive
+
+    def __enter__(self) -> Lease:
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        self.release()
+
+
+class BufferPool:
+    def __init__(
+        self,
+        budget_bytes: int = 256 * 1024 * 1024,
+        min_class_bytes: int = MIN_CLASS_BYTES,
+        max_class_bytes: int = MAX_CLASS_BYTES,
+    ) -> None:
+        self._budget_bytes = budget_bytes
+        self._min_class_bytes = min_class_bytes
+        self._max_class_bytes = max_class_bytes
+
+        self._cond = threading.Condition()
+        # All buffers of the pool: leased, idle and waiting for their views to go.
+        self._allocated_bytes = 0
+        self._idle: dict[int, list[bytearray]] = {}
+        self._idle_bytes = 0
+        # Released, but maybe still viewed.
+        self._pending: list[bytearray] = []
+        # Filled by finalizers, which may run in any thread and at any moment,
+        # so they don't take the lock.
+        self._returned: deque[bytearray] = deque()
+        # How many times `acquire` had to wait for memory.
+        self.waits = 0
+
+    @property
+    def allocated_bytes(self) -> int:
+        with self._cond:
+            self._collect()
+            return self._allocated_bytes
+
+    @property
+    def idle_bytes(self) -> int:
+        with self._cond:
+            self._collect()
+            return self._idle_bytes
+
+    def size_class(self, size: int) -> int:
+        if size > self._max_class_bytes:
+            return size
+        capacity = self._min_class_bytes
+        while capacity < size:
+            capacity *= 2
+        return capacity
+
+    def acquire(self, size: int, timeout_s: float | None = None) -> Lease:
+        capacity = self.size_class(size)
+        if capacity > self._budget_bytes:
+            raise ValueError(
+                f"Buffer of {size} bytes exceeds the pool budget "
+                f"of {self._budget_bytes} bytes"
+            )
+        deadline = None if timeout_s is None else time.monotonic() + timeout_s
+        with self._cond:
+            waited = False
+            while True:
+                self._collect()
+                buffer = self._take(capacity)
+                if buffer is not None:
+                    return Lease(self, buffer, size)
+
+                if not waited:
+                    self.waits += 1
+                    waited = True
+                wait_s = POLL_INTERVAL_S
+                if deadline is not None:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise TimeoutError(
+                            f"Timed out waiting for {capacity} bytes "
+                            f"of the receive buffer budget"
+                        )
+                    wait_s = min(wait_s, remaining)
+                self._cond.wait(wait_s)
+
+    def receive_frame(
+        self, sock: socket.socket, timeout_s: float | None = None
+    ) -> Lease:
+        # Like `framing.receive_frame`, but into a pooled buffer.
+        size_buffer = bytearray(4)
+        receive_into(sock, memoryview(size_buffer))
+        message_size = read_int32(memory_reader(size_buffer))
+        if message_size < 0:
+            raise ValueError(f"Invalid frame size {message_size}")
+        lease = self.acquire(message_size, timeout_s)
+        try:
+            receive_into(sock, lease.view)
+        except BaseException:
+            lease.release()
+            raise
+        return lease
+
+    def _take(self, capacity: int) -> bytearray | None:
+        idle = self._idle.get(capacity)
+        if idle:
+            self._idle_bytes -= capacity
+            return idle.pop()
+        # Idle buffers of other classes are dropped to make room.
+        while (
+            self._allocated_bytes + capacity > self._budget_bytes and self._idle_bytes
+        ):
+            largest = max(c for c, buffers in self._idle.items() if buffers)
+            self._idle[largest].pop()
+            self._idle_bytes -= largest
+            self._allocated_bytes -= largest
+        if self._allocated_bytes + capacity > self._budget_bytes:
+            return None
+        self._allocated_bytes += capacity
+        return bytearray(capacity)
+
+    def _collect(self) -> None:
+        while self._returned:
+            self._pending.append(self._returned.popleft())
+        still_viewed = []
+        for buffer in self._pending:
+            if _has_exports(buffer):
+                still_viewed.append(buffer)
+            elif len(buffer) > self._max_class_bytes:
+                self._allocated_bytes -= len(buffer)
+            else:
+                self._idle.setdefault(len(buffer), []).append(buffer)
+                self._idle_bytes += len(buffer)
+        self._pending = still_viewed
+
+    def _return(self, buffer: bytearray) -> None:
+        self._returned.append(buffer)
+        # Wakes up the waiting threads, unless the lock is taken,
+        # e.g. by this thread if the finalizer runs inside `acquire`.
+        if self._cond.acquire(blocking=False):
+            try:
+                self._cond.notify_all()
+            finally:
+                self._cond.release()
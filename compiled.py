@@ -0,0 +1,35 @@
+from __future__ import annotations
+
+import importlib.machinery
+import importlib.util
+import os
+import sys
+from types import ModuleType
+from typing import Final
+
+# Modules that `make mypyc` compiles into extension modules.
+# An extension module next to the `.py` file takes precedence on import,
+# without it the pure-Python module is used, nothing else changes.
+COMPILED_MODULES: Final = ["read_write", "raw_tagged_fields", "read_write_unchecked"]
+
+
+def is_compiled(module: ModuleType) -> bool:
+    return any(
+        (module.__file__ or "").endswith(suffix)
+        for suffix in importlib.machinery.EXTENSION_SUFFIXES
+    )
+
+
+def load_pure(name: str) -> ModuleType:
+    # Load the pure-Python version of a module even when the compiled one
+    # is available, e.g. to compare them. It's a separate module object,
+    # its own imports still resolve to whatever is importable normally.
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), f"{name}.py")
+    spec = importlib.util.spec_from_file_location(f"{name}_pure", path)
+    if spec is None or spec.loader is None:
+        raise ImportError(f"Can't load {path}")
+    module = importlib.util.module_from_spec(spec)
+    # Dataclasses look their module up while being created.
+    sys.modules[spec.name] = module
+    spec.loader.exec_module(module)
+    return module
@@ -0,0 +1,268 @@
+from __future__ import annotations
+
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Callable, Iterator, Mapping
+
+from api_versions_cache import (
+    ApiVersionsCache,
+    BrokerAddress,
+    fetch_api_versions,
+    negotiate_versions,
+)
+from api_versions_v3 import ApiVersionsResponseV3
+from buffer_pool import BufferPool, Lease
+from framing import receive_frame
+
+
+@dataclass
+class PoolConfig:
+    max_connections_per_broker: int = 4
+    tcp_nodelay: bool = True
+    # `None` keeps the OS defaults.
+    send_buffer_bytes: int | None = 1024 * 1024
+    receive_buffer_bytes: int | None = 1024 * 1024
+    connect_timeout_s: float = 10.0
+    request_timeout_s: float | None = 30.0
+    acquire_timeout_s: float = 30.0
+    reconnect_backoff_s: float = 0.05
+    reconnect_backoff_max_s: float = 10.0
+
+
+class BrokerUnavailableError(ConnectionError):
+    pass
+
+
+@dataclass
+class BrokerHealth:
+    consecutive_failures: int = 0
+    # In terms of the pool's clock.
+    next_attempt_at: float = 0.0
+    last_error: str | None = None
+
+
+class BrokerConnection:
+    def __init__(
+        self, node_id: int, address: BrokerAddress, sock: socket.socket
+    ) -> None:
+        self.node_id = node_id
+        self.address = address
+        self.sock = sock
+        # api_key -> negotiated version.
+        self.api_versions: dict[int, int] = {}
+        self._correlation_id = 0
+        self.closed = False
+
+    def next_correlation_id(self) -> int:
+        self._correlation_id = (self._correlation_id + 1) % 2**31
+        return self._correlation_id
+
+    def send(self, data: bytes) -> None:
+        self.sock.sendall(data)
+
+    def receive(self) -> bytes:
+        return receive_frame(self.sock)
+
+    def receive_pooled(self, buffer_pool: BufferPool) -> Lease:
+        return buffer_pool.receive_frame(self.sock)
+
+    def close(self) -> None:
+        if not self.closed:
+            self.closed = True
+            self.sock.close()
+
+
+class ConnectionPool:
+    def __init__(
+        self,
+        brokers: Mapping[int, BrokerAddress],
+        config: PoolConfig | None = None,
+        api_versions_cache: ApiVersionsCache | None = None,
+        cluster_id: str | None = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self._brokers = dict(brokers)
+        self._config = config if config is not None else PoolConfig()
+        self._api_versions_cache = api_versions_cache
+        self._cluster_id = cluster_id
+        self._clock = clock
+
+        self._cond = threading.Condition()
+        self._idle: dict[int, list[BrokerConnection]] = {}
+        self._open_count: dict[int, int] = {}
+        self._health: dict[int, BrokerHealth] = {}
+        self._closed = False
+
+    def update_brokers(self, brokers: Mapping[int, BrokerAddress]) -> None:
+        with self._cond:
+            for node_id, address in brokers.items():
+                if self._brokers.get(node_id) != address:
+                    # The broker has moved, the idle connections are useless.
+                    self._close_idle(node_id)
+            self._brokers.update(brokers)
+
+    def health(self, node_id: int) -> BrokerHealth:
+        with self._cond:
+            return self._health.setdefault(node_id, BrokerHealth())
+
+    def acquire(self, node_id: int) -> BrokerConnection:
+        deadline = time.monotonic() + self._config.acquire_timeout_s
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise BrokerUnavailableError("Connection pool is closed")
+                address = self._brokers.get(node_id)
+                if address is None:
+                    raise BrokerUnavailableError(f"Unknown broker {node_id}")
+
+                # Take the most recently used connection.
+                idle = self._idle.get(node_id)
+                if idle:
+                    return idle.pop()
+
+                open_count = self._open_count.get(node_id, 0)
+                if open_count < self._config.max_connections_per_broker:
+                    health = self._health.setdefault(node_id, BrokerHealth())
+                    if self._clock() < health.next_attempt_at:
+                        raise BrokerUnavailableError(
+                            f"Broker {node_id} is backing off after "
+                            f"{health.consecutive_failures} failures: {health.last_error}"
+                        )
+                    # Reserve the slot, connect without holding the lock.
+                    self._open_count[node_id] = open_count + 1
+                    break
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise BrokerUnavailableError(
+                        f"Timed out waiting for a connection to broker {node_id}"
+                    )
+                self._cond.wait(remaining)
+
+        try:
+            conn = self._connect(node_id, address)
+        except (OSError, ValueError) as e:
+            with self._cond:
+                self._open_count[node_id] -= 1
+                self._record_failure(node_id, e)
+                self._cond.notify()
+            raise BrokerUnavailableError(
+                f"Failed to connect to broker {node_id} at {address}: {e}"
+            ) from e
+
+        with self._cond:
+            self._health[node_id] = BrokerHealth()
+        return conn
+
+    def release(self, conn: BrokerConnection, failed: bool = False) -> None:
+        with self._cond:
+            if failed or conn.closed or self._closed:
+                conn.close()
+                self._open_count[conn.node_id] -= 1
+                if failed:
+                    self._record_failure(conn.node_id, None)
+            elif self._brokers.get(conn.node_id) != conn.address:
+                conn.close()
+                self._open_count[conn.node_id] -= 1
+            else:
+                self._idle.setdefault(conn.node_id, []).append(conn)
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self, node_id: int) -> Iterator[BrokerConnection]:
+        conn = self.acquire(node_id)
+        try:
+            yield conn
+        except (OSError, ValueError):
+            # The stream may be in an unknown state, e.g. a half-read response.
+            self.release(conn, failed=True)
+            raise
+        except BaseException:
+            self.release(conn)
+            raise
+        else:
+            self.release(conn)
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            for node_id in list(self._idle):
+                self._close_idle(node_id)
+            self._cond.notify_all()
+
+    def _close_idle(self, node_id: int) -> None:
+        for conn in self._idle.pop(node_id, []):
+            conn.close()
+            self._open_count[node_id] -= 1
+
+    def _record_failure(self, node_id: int, error: Exception | None) -> None:
+        health = self._health.setdefault(node_id, BrokerHealth())
+        health.consecutive_failures += 1
+        health.last_error = None if error is None else str(error)
+        backoff = min(
+            self._config.reconnect_backoff_max_s,
+            self._config.reconnect_backoff_s * 2 ** (health.consecutive_failures - 1),
+        )
+        health.next_attempt_at = self._clock() + backoff
+
+    def _connect(self, node_id: int, address: BrokerAddress) -> BrokerConnection:
+        sock = self._open_socket(address)
+        conn = BrokerConnection(node_id, address, sock)
+        try:
+            self._handshake(conn)
+        except BaseException:
+            conn.close()
+            raise
+        return conn
+
+    def _open_socket(self, address: BrokerAddress) -> socket.socket:
+        config = self._config
+        last_error: OSError | None = None
+        for family, type_, proto, _, sockaddr in socket.getaddrinfo(
+            address[0], address[1], type=socket.SOCK_STREAM
+        ):
+            sock = socket.socket(family, type_, proto)
+            try:
+                # Buffer sizes must be set before connecting
+                # to affect the TCP window scaling.
+                if config.send_buffer_bytes is not None:
+                    sock.setsockopt(
+                        socket.SOL_SOCKET, socket.SO_SNDBUF, config.send_buffer_bytes
+                    )
+                if config.receive_buffer_bytes is not None:
+                    sock.setsockopt(
+                        socket.SOL_SOCKET, socket.SO_RCVBUF, config.receive_buffer_bytes
+                    )
+                # Kafka requests are small and latency sensitive,
+                # don't let Nagle's algorithm hold them back.
+                if config.tcp_nodelay:
+                    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                sock.settimeout(config.connect_timeout_s)
+                sock.connect(sockaddr)
+                sock.settimeout(config.request_timeout_s)
+                return sock
+            except OSError as e:
+                sock.close()
+                last_error = e
+        if last_error is None:
+            raise OSError(f"Can't resolve {address}")
+        raise last_error
+
+    def _handshake(self, conn: BrokerConnection) -> None:
+        def fetch() -> ApiVersionsResponseV3:
+            return fetch_api_versions(conn.sock, conn.next_correlation_id())
+
+        if self._api_versions_cache is not None:
+            conn.api_versions = self._api_versions_cache.get_or_fetch(
+                conn.address, self._cluster_id, fetch
+            )
+        else:
+            response = fetch()
+            if response.error_code != 0:
+                raise ValueError(
+                    f"ApiVersions failed with error code {response.error_code}"
+                )
+            conn.api_versions = negotiate_versions(response)
@@ -0,0 +1,292 @@
+from __future__ import annotations
+
+import argparse
+import random
+from dataclasses import dataclass, field
+from io import BytesIO
+from typing import Final, Iterator
+
+from api_versions_v3 import ApiVersionsResponseApiKeyV3, ApiVersionsResponseV3
+from fetch_request_v0 import (
+    FetchResponseResponsePartitionV0,
+    FetchResponseResponseV0,
+    FetchResponseV0,
+)
+from raw_tagged_fields import RawTaggedField
+from read_write import write_array_length, write_string
+from record_batch import Record, RecordBatch, RecordHeader
+from request_response_headers import ResponseHeaderV0
+from wire_capture import RESPONSE, CaptureWriter
+
+# Generates large valid messages for benchmarks and stress tests.
+# Everything is built with the message classes and their `write` methods,
+# from a `random.Random`, so the same seed and shape give the same bytes.
+# Frames of a corpus are streamed to the capture one partition at a time,
+# a corpus may be many times larger than the memory.
+
+# Inclusive.
+Range = tuple[int, int]
+
+BASE_TIMESTAMP: Final = 1_700_000_000_000
+
+
+@dataclass
+class RecordBatchShape:
+    records: Range = (1, 10)
+    key_size: Range = (0, 16)
+    value_size: Range = (0, 1024)
+    headers: Range = (0, 2)
+    # The fraction of records with a null key.
+    null_keys: float = 0.1
+
+
+@dataclass
+class FetchShape:
+    topics: int = 1
+    # Per topic.
+    partitions: int = 10_000
+    # Per partition.
+    batches: Range = (0, 2)
+    batch: RecordBatchShape = field(default_factory=RecordBatchShape)
+
+
+@dataclass
+class ApiVersionsShape:
+    api_keys: int = 1000
+    # Per API key and for the whole response.
+    tagged_fields: Range = (0, 8)
+    tagged_field_size: Range = (0, 64)
+
+
+def _size(rng: random.Random, size: Range) -> int:
+    return rng.randint(size[0], size[1])
+
+
+def random_record_batch(
+    rng: random.Random, base_offset: int, shape: RecordBatchShape
+) -> RecordBatch:
+    count = _size(rng, shape.records)
+    records = [
+        Record(
+            attributes=0,
+            timestamp_delta=i,
+            offset_delta=i,
+            key=(
+                None
+                if rng.random() < shape.null_keys
+                else rng.randbytes(_size(rng, shape.key_size))
+            ),
+            value=rng.randbytes(_size(rng, shape.value_size)),
+            headers=[
+                RecordHeader(key=f"h{j}", value=rng.randbytes(_size(rng, (0, 16))))
+                for j in range(_size(rng, shape.headers))
+            ],
+        )
+        for i in range(count)
+    ]
+    return RecordBatch(
+        base_offset=base_offset,
+        partition_leader_epoch=0,
+        magic=2,
+        crc=0,
+        attributes=0,
+        last_offset_delta=count - 1,
+        base_timestamp=BASE_TIMESTAMP + base_offset,
+        max_timestamp=BASE_TIMESTAMP + base_offset + count - 1,
+        producer_id=-1,
+        producer_epoch=-1,
+        base_sequence=-1,
+        records=records,
+    )
+
+
+def random_fetch_partition(
+    rng: random.Random, partition: int, shape: FetchShape
+) -> FetchResponseResponsePartitionV0:
+    records = BytesIO()
+    offset = rng.randrange(1_000_000)
+    for _ in range(_size(rng, shape.batches)):
+        batch = random_record_batch(rng, offset, shape.batch)
+        batch.write(records)
+        offset = batch.last_offset + 1
+    return FetchResponseResponsePartitionV0(
+        partition_index=partition,
+        error_code=0,
+        high_watermark=offset,
+        records=records.getvalue(),
+    )
+
+
+def random_fetch_response_v0(rng: random.Random, shape: FetchShape) -> FetchResponseV0:
+    return FetchResponseV0(
+        responses=[
+            FetchResponseResponseV0(
+                topic=f"topic-{t}",
+                partitions=[
+                    random_fetch_partition(rng, p, shape)
+                    for p in range(shape.partitions)
+                ],
+            )
+            for t in range(shape.topics)
+        ]
+    )
+
+
+def fetch_response_v0_chunks(
+    rng: random.Random, shape: FetchShape, correlation_id: int
+) -> Iterator[bytes]:
+    # The same bytes as the header and `random_fetch_response_v0` written
+    # with the same generator state, but only one partition is held at a time.
+    buffer = BytesIO()
+    ResponseHeaderV0(correlation_id=correlation_id).write(buffer)
+    write_array_length(shape.topics, buffer, False)
+    for t in range(shape.topics):
+        write_string(f"topic-{t}", buffer, False)
+        write_array_length(shape.partitions, buffer, False)
+        for p in range(shape.partitions):
+            random_fetch_partition(rng, p, shape).write(buffer)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell() > 0:
+        yield buffer.getvalue()
+
+
+def _random_tagged_fields(
+    rng: random.Random, shape: ApiVersionsShape
+) -> list[RawTaggedField]:
+    tag = 0
+    fields = []
+    for _ in range(_size(rng, shape.tagged_fields)):
+        # Tags are unique and ascending.
+        tag += rng.randint(1, 100)
+        fields.append(
+            RawTaggedField(
+                tag=tag, data=rng.randbytes(_size(rng, shape.tagged_field_size))
+            )
+        )
+    return fields
+
+
+def random_api_versions_response_v3(
+    rng: random.Random, shape: ApiVersionsShape
+) -> ApiVersionsResponseV3:
+    api_keys = []
+    for api_key in range(shape.api_keys):
+        min_version = rng.randint(0, 10)
+        api_keys.append(
+            ApiVersionsResponseApiKeyV3(
+                api_key=api_key,
+                min_version=min_version,
+                max_version=min_version + rng.randint(0, 10),
+                _unknownTaggedFields=_random_tagged_fields(rng, shape),
+            )
+        )
+    return ApiVersionsResponseV3(
+        error_code=0,
+        api_keys=api_keys,
+        throttle_time_ms=rng.randint(0, 1000),
+        _unknownTaggedFields=_random_tagged_fields(rng, shape),
+    )
+
+
+def api_versions_response_v3_chunks(
+    rng: random.Random, shape: ApiVersionsShape, correlation_id: int
+) -> Iterator[bytes]:
+    buffer = BytesIO()
+    # ApiVersions responses always have header v0.
+    ResponseHeaderV0(correlation_id=correlation_id).write(buffer)
+    random_api_versions_response_v3(rng, shape).write(buffer)
+    yield buffer.getvalue()
+
+
+def write_fetch_corpus(
+    path: str, frames: int, seed: int, shape: FetchShape | None = None
+) -> int:
+    # Returns the number of bytes written.
+    rng = random.Random(seed)
+    shape = shape if shape is not None else FetchShape()
+    size = 0
+    with CaptureWriter(path) as writer:
+        for i in range(frames):
+            size += writer.append_chunks(
+                RESPONSE,
+                1,
+                0,
+                i,
+                fetch_response_v0_chunks(rng, shape, i),
+                timestamp_ns=i,
+            )
+    return size
+
+
+def write_api_versions_corpus(
+    path: str, frames: int, seed: int, shape: ApiVersionsShape | None = None
+) -> int:
+    rng = random.Random(seed)
+    shape = shape if shape is not None else ApiVersionsShape()
+    size = 0
+    with CaptureWriter(path) as writer:
+        for i in range(frames):
+            size += writer.append_chunks(
+                RESPONSE,
+                18,
+                3,
+                i,
+                api_versions_response_v3_chunks(rng, shape, i),
+                timestamp_ns=i,
+            )
+    return size
+
+
+def _range(value: str) -> Range:
+    low, _, high = value.partition(",")
+    return int(low), int(high or low)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Generate a capture with synthetic responses"
+    )
+    parser.add_argument("path")
+    parser.add_argument("kind", choices=["fetch", "api_versions"])
+    parser.add_argument("--frames", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--topics", type=int, default=1)
+    parser.add_argument("--partitions", type=int, default=10_000)
+    parser.add_argument("--batches", type=_range, default=(0, 2), help="min,max")
+    parser.add_argument("--records", type=_range, default=(1, 10), help="min,max")
+    parser.add_argument("--key-size", type=_range, default=(0, 16), help="min,max")
+    parser.add_argument("--value-size", type=_range, default=(0, 1024), help="min,max")
+    parser.add_argument("--api-keys", type=int, default=1000)
+    parser.add_argument("--tagged-fields", type=_range, default=(0, 8), help="min,max")
+    args = parser.parse_args()
+
+    if args.kind == "fetch":
+        size = write_fetch_corpus(
+            args.path,
+            args.frames,
+            args.seed,
+            FetchShape(
+                topics=args.topics,
+                partitions=args.partitions,
+                batches=args.batches,
+                batch=RecordBatchShape(
+                    records=args.records,
+                    key_size=args.key_size,
+                    value_size=args.value_size,
+                ),
+            ),
+        )
+    else:
+        size = write_api_versions_corpus(
+            args.path,
+            args.frames,
+            args.seed,
+            ApiVersionsShape(api_keys=args.api_keys, tagged_fields=args.tagged_fields),
+        )
+    print(f"{size / 1024 / 1024:.2f} MB written to {args.path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,246 @@
+from __future__ import annotations
+
+import time
+from dataclasses import dataclass, field
+from io import BytesIO
+from typing import Callable
+
+from fetch_request_v0 import (
+    FetchRequestV0,
+    FetchRequestTopicV0,
+    FetchRequestTopicPartitionV0,
+    FetchResponseV0,
+    FetchResponseResponsePartitionV0,
+)
+from framing import encode_frame
+from multiplexer import Multiplexer
+from request_response_headers import RequestHeaderV1, ResponseHeaderV0
+
+
+@dataclass(frozen=True)
+class FetchInterest:
+    topic: str
+    partition: int
+    fetch_offset: int
+    partition_max_bytes: int
+
+
+TopicPartition = tuple[str, int]
+FetchResult = dict[TopicPartition, FetchResponseResponsePartitionV0]
+FetchCallback = Callable[[FetchResult], None]
+ErrorCallback = Callable[[Exception], None]
+# Sends a Fetch request to the broker and calls back with the response.
+FetchSender = Callable[
+    [int, FetchRequestV0, Callable[[FetchResponseV0], None], ErrorCallback], None
+]
+
+
+@dataclass
+class _Caller:
+    interests: list[FetchInterest]
+    on_result: FetchCallback
+    on_error: ErrorCallback | None
+    result: FetchResult = field(default_factory=dict)
+    remaining: int = 0
+    # Got its result or an error: each caller is called back once,
+    # even if its partitions were fetched from several brokers.
+    done: bool = False
+
+
+@dataclass
+class _PendingRequest:
+    first_added_at: float
+    # (topic, partition, fetch_offset) -> max bytes and the callers waiting for it.
+    partitions: dict[tuple[str, int, int], tuple[int, list[_Caller]]] = field(
+        default_factory=dict
+    )
+    # The same partition at a different offset must wait for the next request.
+    deferred: list[tuple[FetchInterest, _Caller]] = field(default_factory=list)
+    offsets: dict[TopicPartition, int] = field(default_factory=dict)
+
+
+class FetchCoalescer:
+    # Merges fetch interests of independent callers into one Fetch request
+    # per broker, collected during a short batching window,
+    # and splits the response back per caller.
+
+    def __init__(
+        self,
+        leader_for: Callable[[str, int], int | None],
+        send: FetchSender,
+        batch_window_s: float = 0.005,
+        max_partitions_per_request: int = 1000,
+        max_wait_ms: int = 500,
+        min_bytes: int = 1,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self._leader_for = leader_for
+        self._send = send
+        self._batch_window_s = batch_window_s
+        self._max_partitions_per_request = max_partitions_per_request
+        self._max_wait_ms = max_wait_ms
+        self._min_bytes = min_bytes
+        self._clock = clock
+        self._pending: dict[int, _PendingRequest] = {}
+
+    def fetch(
+        self,
+        interests: list[FetchInterest],
+        on_result: FetchCallback,
+        on_error: ErrorCallback | None = None,
+    ) -> None:
+        caller = _Caller(
+            interests=interests,
+            on_result=on_result,
+            on_error=on_error,
+            remaining=len(interests),
+        )
+        by_broker: dict[int, list[FetchInterest]] = {}
+        for interest in interests:
+            node_id = self._leader_for(interest.topic, interest.partition)
+            if node_id is None:
+                raise ValueError(f"No leader for {interest.topic}-{interest.partition}")
+            by_broker.setdefault(node_id, []).append(interest)
+
+        for node_id, broker_interests in by_broker.items():
+            for interest in broker_interests:
+                self._add(node_id, interest, caller)
+                # A caller with many partitions is split across requests.
+                pending = self._pending.get(node_id)
+                if (
+                    pending is not None
+                    and len(pending.partitions) >= self._max_partitions_per_request
+                ):
+                    self._flush(node_id)
+
+    def time_until_flush(self) -> float | None:
+        # For plugging into an event loop: how long it can sleep.
+        if not self._pending:
+            return None
+        oldest = min(p.first_added_at for p in self._pending.values())
+        return max(0.0, oldest + self._batch_window_s - self._clock())
+
+    def flush_due(self) -> int:
+        now = self._clock()
+        due = [
+            node_id
+            for node_id, pending in self._pending.items()
+            if now - pending.first_added_at >= self._batch_window_s
+        ]
+        for node_id in due:
+            self._flush(node_id)
+        return len(due)
+
+    def flush(self) -> int:
+        node_ids = list(self._pending)
+        for node_id in node_ids:
+            self._flush(node_id)
+        return len(node_ids)
+
+    def _add(self, node_id: int, interest: FetchInterest, caller: _Caller) -> None:
+        pending = self._pending.get(node_id)
+        if pending is None:
+            pending = _PendingRequest(first_added_at=self._clock())
+            self._pending[node_id] = pending
+
+        tp = (interest.topic, interest.partition)
+        offset = pending.offsets.get(tp)
+        if offset is not None and offset != interest.fetch_offset:
+            pending.deferred.append((interest, caller))
+            return
+        pending.offsets[tp] = interest.fetch_offset
+
+        key = (interest.topic, interest.partition, interest.fetch_offset)
+        max_bytes, callers = pending.partitions.get(key, (0, []))
+        callers.append(caller)
+        pending.partitions[key] = (
+            max(max_bytes, interest.partition_max_bytes),
+            callers,
+        )
+
+    def _flush(self, node_id: int) -> None:
+        pending = self._pending.pop(node_id)
+
+        topics: dict[str, list[FetchRequestTopicPartitionV0]] = {}
+        for (topic, partition, fetch_offset), (
+            max_bytes,
+            _,
+        ) in pending.partitions.items():
+            topics.setdefault(topic, []).append(
+                FetchRequestTopicPartitionV0(
+                    partition=partition,
+                    fetch_offset=fetch_offset,
+                    partition_max_bytes=max_bytes,
+                )
+            )
+        request = FetchRequestV0(
+            replica_id=-1,
+            max_wait_ms=self._max_wait_ms,
+            min_bytes=self._min_bytes,
+            topics=[
+                FetchRequestTopicV0(topic=topic, partitions=partitions)
+                for topic, partitions in topics.items()
+            ],
+        )
+
+        waiting = {
+            (topic, partition): callers
+            for (topic, partition, _), (_, callers) in pending.partitions.items()
+        }
+
+        def on_response(response: FetchResponseV0) -> None:
+            for topic_response in response.responses:
+                for partition_response in topic_response.partitions:
+                    tp = (topic_response.topic, partition_response.partition_index)
+                    for caller in waiting.pop(tp, []):
+                        if caller.done:
+                            continue
+                        caller.result[tp] = partition_response
+                        caller.remaining -= 1
+                        if caller.remaining == 0:
+                            caller.done = True
+                            caller.on_result(caller.result)
+            if waiting:
+                missing = ", ".join(f"{t}-{p}" for t, p in waiting)
+                on_error(ValueError(f"No data for {missing} in Fetch response"))
+
+        def on_error(error: Exception) -> None:
+            for callers in waiting.values():
+                for caller in callers:
+                    if caller.done:
+                        continue
+                    caller.done = True
+                    if caller.on_error is not None:
+                        caller.on_error(error)
+            waiting.clear()
+
+        # The deferred interests start the next batch for this broker.
+        for interest, caller in pending.deferred:
+            self._add(node_id, interest, caller)
+
+        self._send(node_id, request, on_response, on_error)
+
+
+def multiplexer_sender(mux: Multiplexer, client_id: str = "test-client") -> FetchSender:
+    def send(
+        node_id: int,
+        request: FetchRequestV0,
+        on_response: Callable[[FetchResponseV0], None],
+        on_error: ErrorCallback,
+    ) -> None:
+        correlation_id = mux.next_correlation_id()
+        header = RequestHeaderV1(
+            request_api_key=1,  # Fetch
+            request_api_version=0,
+            correlation_id=correlation_id,
+            client_id=client_id,
+        )
+
+        def on_frame(frame: bytearray) -> None:
+            buffer = BytesIO(frame)
+            ResponseHeaderV0.read(buffer)
+            on_response(FetchResponseV0.read(buffer))
+
+        mux.send(node_id, encode_frame(header, request), on_frame, on_error)
+
+    return send
@@ -0,0 +1,196 @@
+from __future__ import annotations
+
+import math
+import time
+from dataclasses import dataclass
+from typing import Callable
+
+from fetch_request_v0 import (
+    FetchRequestTopicPartitionV0,
+    FetchRequestTopicV0,
+    FetchRequestV0,
+    FetchResponseV0,
+)
+from record_batch import BatchView, iter_batches
+
+TopicPartition = tuple[str, int]
+
+
+@dataclass
+class PlannerConfig:
+    # The sum of `partition_max_bytes` in one request never exceeds this,
+    # so it bounds the size of a response and the memory to hold it.
+    response_budget_bytes: int = 1024 * 1024
+    min_partition_bytes: int = 4 * 1024
+    max_partition_bytes: int = 1024 * 1024
+    # How long the broker may wait for `min_bytes` when all partitions are caught up.
+    max_wait_ms: int = 500
+    # How quickly the observed rates follow changes.
+    rate_half_life_s: float = 5.0
+
+
+@dataclass
+class PartitionStats:
+    fetch_offset: int
+    # Smoothed, of complete batches.
+    bytes_per_s: float = 0.0
+    bytes_per_offset: float = 0.0
+    # Offsets between the position and the high watermark, `None` until known.
+    lag: int | None = None
+    requested_bytes: int = 0
+    # The last response had records, but not a single complete batch.
+    stuck: bool = False
+    last_observed_at: float | None = None
+
+
+class FetchPlanner:
+    # Plans Fetch requests for a set of partitions, dividing the response budget
+    # between them by how much data each is expected to have:
+    # lagging partitions get enough for their backlog, caught up ones
+    # get what they produce in a round trip, and the request waits on the broker
+    # only when nobody is behind.
+
+    def __init__(
+        self,
+        config: PlannerConfig | None = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self._config = config if config is not None else PlannerConfig()
+        self._clock = clock
+        self._partitions: dict[TopicPartition, PartitionStats] = {}
+
+    def assign(self, topic: str, partition: int, fetch_offset: int) -> None:
+        self._partitions[(topic, partition)] = PartitionStats(fetch_offset=fetch_offset)
+
+    def unassign(self, topic: str, partition: int) -> None:
+        self._partitions.pop((topic, partition), None)
+
+    def stats(self, topic: str, partition: int) -> PartitionStats:
+        return self._partitions[(topic, partition)]
+
+    def plan(self) -> FetchRequestV0:
+        config = self._config
+        demands = {tp: self._demand(s) for tp, s in self._partitions.items()}
+        allocation = self._allocate(demands)
+
+        topics: dict[str, list[FetchRequestTopicPartitionV0]] = {}
+        for (topic, partition), max_bytes in allocation.items():
+            stats = self._partitions[(topic, partition)]
+            stats.requested_bytes = max_bytes
+            topics.setdefault(topic, []).append(
+                FetchRequestTopicPartitionV0(
+                    partition=partition,
+                    fetch_offset=stats.fetch_offset,
+                    partition_max_bytes=max_bytes,
+                )
+            )
+
+        if any(
+            s.lag is None or s.lag > 0 or s.stuck for s in self._partitions.values()
+        ):
+            # Data is already there, don't wait for more.
+            max_wait_ms, min_bytes = 0, 1
+        else:
+            # Let the broker accumulate about half of what arrives during the wait,
+            # instead of answering with a few bytes right away.
+            total_rate = sum(s.bytes_per_s for s in self._partitions.values())
+            max_wait_ms = config.max_wait_ms
+            min_bytes = int(total_rate * config.max_wait_ms / 1000 / 2)
+            min_bytes = max(1, min(min_bytes, sum(allocation.values()) // 2))
+
+        return FetchRequestV0(
+            replica_id=-1,
+            max_wait_ms=max_wait_ms,
+            min_bytes=min_bytes,
+            topics=[
+                FetchRequestTopicV0(topic=topic, partitions=partitions)
+                for topic, partitions in topics.items()
+            ],
+        )
+
+    def observe(
+        self, response: FetchResponseV0
+    ) -> dict[TopicPartition, list[BatchView]]:
+        # Moves the positions past the complete batches in the response
+        # and returns them. Partial batches at the end are fetched again.
+        now = self._clock()
+        result: dict[TopicPartition, list[BatchView]] = {}
+        for topic_response in response.responses:
+            for p in topic_response.partitions:
+                stats = self._partitions.get((topic_response.topic, p.partition_index))
+                if stats is None or p.error_code != 0:
+                    continue
+                records = p.records or b""
+                batches = list(iter_batches(records))
+                # A partial batch and nothing else: with Fetch v0,
+                # the batch is larger than `partition_max_bytes`.
+                stats.stuck = not batches and len(records) > 0
+                # The first batch may start before the requested offset.
+                batches = [b for b in batches if b.last_offset >= stats.fetch_offset]
+                result[(topic_response.topic, p.partition_index)] = batches
+                self._update(stats, p.high_watermark, batches, now)
+        return result
+
+    def _update(
+        self,
+        stats: PartitionStats,
+        high_watermark: int,
+        batches: list[BatchView],
+        now: float,
+    ) -> None:
+        received = sum(len(b.data) for b in batches)
+        if batches:
+            offsets = batches[-1].last_offset + 1 - stats.fetch_offset
+            stats.bytes_per_offset = self._smooth(
+                stats.bytes_per_offset, received / offsets, 0.5
+            )
+            stats.fetch_offset = batches[-1].last_offset + 1
+        stats.lag = max(0, high_watermark - stats.fetch_offset)
+
+        if stats.last_observed_at is not None and now > stats.last_observed_at:
+            elapsed = now - stats.last_observed_at
+            weight = 1 - 0.5 ** (elapsed / self._config.rate_half_life_s)
+            stats.bytes_per_s = self._smooth(
+                stats.bytes_per_s, received / elapsed, weight
+            )
+        stats.last_observed_at = now
+
+    @staticmethod
+    def _smooth(old: float, new: float, weight: float) -> float:
+        return new if old == 0 else old + (new - old) * weight
+
+    def _demand(self, stats: PartitionStats) -> int:
+        config = self._config
+        if stats.stuck:
+            # Double until the batch fits.
+            return min(config.response_budget_bytes, max(stats.requested_bytes * 2, 1))
+        if stats.lag is None:
+            # Nothing is known yet.
+            return config.max_partition_bytes
+        if stats.lag > 0:
+            backlog = stats.lag * stats.bytes_per_offset
+            if backlog == 0:
+                return config.max_partition_bytes
+            return min(config.max_partition_bytes, math.ceil(backlog))
+        # Caught up: what arrives during the wait, with some headroom.
+        return math.ceil(stats.bytes_per_s * config.max_wait_ms / 1000 * 2)
+
+    def _allocate(
+        self, demands: dict[TopicPartition, int]
+    ) -> dict[TopicPartition, int]:
+        config = self._config
+        if not demands:
+            return {}
+        floor = min(
+            config.min_partition_bytes, config.response_budget_bytes // len(demands)
+        )
+        wanted = {tp: max(floor, d) for tp, d in demands.items()}
+        total = sum(wanted.values())
+        if total <= config.response_budget_bytes:
+            return wanted
+        # Everyone keeps the floor, the rest is shared in proportion to the demand.
+        spare = config.response_budget_bytes - floor * len(wanted)
+        extra_total = total - floor * len(wanted)
+        return {
+            tp: floor + (w - floor) * spare // extra_total for tp, w in wanted.items()
+        }
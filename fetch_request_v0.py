@@ -6,6 +6,7 @@ from io import BytesIO
 from pprint import pprint
 from typing import BinaryIO
 
+import instrumentation
 from request_response_headers import RequestHeaderV1, ResponseHeaderV0
 from read_write import (
     write_int32,
@@ -18,6 +19,8 @@ from read_write import (
     read_int16,
     read_int64,
     read_nullable_bytes,
+    write_int16,
+    write_nullable_bytes,
 )
 
 
@@ -32,6 +35,14 @@ class FetchRequestTopicPartitionV0:
         write_int64(self.fetch_offset, buffer)
         write_int32(self.partition_max_bytes, buffer)
 
+    @classmethod
+    def read(cls, buffer: BinaryIO) -> FetchRequestTopicPartitionV0:
+        return FetchRequestTopicPartitionV0(
+            partition=read_int32(buffer),
+            fetch_offset=read_int64(buffer),
+            partition_max_bytes=read_int32(buffer),
+        )
+
 
 @dataclass
 class FetchRequestTopicV0:
@@ -42,6 +53,13 @@ class FetchRequestTopicV0:
         write_string(self.topic, buffer, False)
         write_array(self.partitions, FetchRequestTopicPartitionV0.write, buffer, False)
 
+    @classmethod
+    def read(cls, buffer: BinaryIO) -> FetchRequestTopicV0:
+        return FetchRequestTopicV0(
+            topic=read_string(buffer, False),
+            partitions=read_array(FetchRequestTopicPartitionV0.read, buffer, False),
+        )
+
 
 @dataclass
 class FetchRequestV0:
@@ -56,8 +74,21 @@ class FetchRequestV0:
         write_int32(self.min_bytes, buffer)
         write_array(self.topics, FetchRequestTopicV0.write, buffer, False)
 
+    @classmethod
+    def read(cls, buffer: BinaryIO) -> FetchRequestV0:
+        return FetchRequestV0(
+            replica_id=read_int32(buffer),
+            max_wait_ms=read_int32(buffer),
+            min_bytes=read_int32(buffer),
+            topics=read_array(FetchRequestTopicV0.read, buffer, False),
+        )
 
-def send_request(request_correlation_id: int, sock: socket.socket) -> None:
+
+def send_request(
+    request_correlation_id: int,
+    sock: socket.socket,
+    message: FetchRequestV0 | None = None,
+) -> None:
     buffer = BytesIO()
 
     # message_size
@@ -72,30 +103,32 @@ def send_request(request_correlation_id: int, sock: socket.socket) -> None:
     )
     header.write(buffer)
 
-    message = FetchRequestV0(
-        replica_id=-1,
-        max_wait_ms=3000,
-        min_bytes=1,
-        topics=[
-            FetchRequestTopicV0(
-                topic="test-topic1",
-                partitions=[
-                    FetchRequestTopicPartitionV0(
-                        partition=0,
-                        fetch_offset=0,
-                        partition_max_bytes=10_000,
-                    )
-                ],
-            )
-        ],
-    )
+    # E.g. planned by `fetch_planner.FetchPlanner`.
+    if message is None:
+        message = FetchRequestV0(
+            replica_id=-1,
+            max_wait_ms=3000,
+            min_bytes=1,
+            topics=[
+                FetchRequestTopicV0(
+                    topic="test-topic1",
+                    partitions=[
+                        FetchRequestTopicPartitionV0(
+                            partition=0,
+                            fetch_offset=0,
+                            partition_max_bytes=10_000,
+                        )
+                    ],
+                )
+            ],
+        )
     message.write(buffer)
 
     request_message_size = buffer.tell() - 4
     buffer.seek(0)
     write_int32(request_message_size, buffer)
 
-    sock.sendall(buffer.getvalue())
+    instrumentation.send(sock, buffer.getvalue(), instrumentation.key(sock, 1, 0))
 
 
 @dataclass
@@ -114,6 +147,12 @@ class FetchResponseResponsePartitionV0:
             records=read_nullable_bytes(buffer, False),
         )
 
+    def write(self, buffer: BinaryIO) -> None:
+        write_int32(self.partition_index, buffer)
+        write_int16(self.error_code, buffer)
+        write_int64(self.high_watermark, buffer)
+        write_nullable_bytes(self.records, buffer, False)
+
 
 @dataclass
 class FetchResponseResponseV0:
@@ -127,6 +166,12 @@ class FetchResponseResponseV0:
             partitions=read_array(FetchResponseResponsePartitionV0.read, buffer, False),
         )
 
+    def write(self, buffer: BinaryIO) -> None:
+        write_string(self.topic, buffer, False)
+        write_array(
+            self.partitions, FetchResponseResponsePartitionV0.write, buffer, False
+        )
+
 
 @dataclass
 class FetchResponseV0:
@@ -138,19 +183,31 @@ class FetchResponseV0:
             responses=read_array(FetchResponseResponseV0.read, buffer, False)
         )
 
+    def write(self, buffer: BinaryIO) -> None:
+        write_array(self.responses, FetchResponseResponseV0.write, buffer, False)
 
-def receive_response(request_correlation_id: int, sock: socket.socket) -> None:
-    message_size_buffer = BytesIO(sock.recv(4))
-    message_size = read_int32(message_size_buffer)
 
-    buffer = BytesIO(sock.recv(message_size))
+def read_response(
+    request_correlation_id: int, sock: socket.socket
+) -> tuple[ResponseHeaderV0, FetchResponseV0]:
+    key = instrumentation.key(sock, 1, 0)
+    buffer = BytesIO(instrumentation.receive(sock, key))
 
-    header = ResponseHeaderV0.read(buffer)
+    header = instrumentation.decode(
+        instrumentation.HEADER_DECODE, ResponseHeaderV0.read, buffer, key
+    )
     if header.correlation_id != request_correlation_id:
         raise ValueError()
-    pprint(header)
 
-    message = FetchResponseV0.read(buffer)
+    message = instrumentation.decode(
+        instrumentation.BODY_DECODE, FetchResponseV0.read, buffer, key
+    )
+    return header, message
+
+
+def receive_response(request_correlation_id: int, sock: socket.socket) -> None:
+    header, message = read_response(request_correlation_id, sock)
+    pprint(header)
     pprint(message)
 
 
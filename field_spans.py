@@ -0,0 +1,330 @@
+from __future__ import annotations
+
+import dataclasses
+import sys
+from array import array
+from io import BytesIO
+from types import FrameType
+from typing import Any, BinaryIO, Callable, Iterator, TypeVar
+
+import raw_tagged_fields
+import read_write
+from memory_reader import memory_reader
+
+# Records where each field of a message is in the buffer while it's decoded,
+# so a field can later be found, patched in place or re-decoded alone.
+#
+# The `read` classmethods aren't changed for this. Instead, the calls they make
+# are watched with `sys.setprofile`, relying on the convention all of them follow:
+# fields are read one call per field, in the order of declaration.
+# An array field gets a span per element, e.g. `responses[0].partitions[1].records`.
+# With the codecs compiled by mypyc, elements of arrays of primitives
+# aren't visible, only the whole arrays.
+#
+# The record batch codecs (`RecordBatch`, `Record`, `RecordHeader`,
+# `LegacyMessage`) don't follow the convention: they read undeclared
+# length prefixes, go through helpers and decompress. They can't be traced,
+# the `records` field of a Fetch response is one span; `record_batch.iter_batches`
+# gives the positions of the batches in it.
+#
+# `sys.setprofile` is used by profilers too, so nothing can be traced while
+# one is active, e.g. under cProfile.
+
+T = TypeVar("T")
+
+_FIELD_READERS: frozenset[Any] = frozenset(
+    [v for k, v in vars(read_write).items() if k.startswith("read_") and callable(v)]
+    + [raw_tagged_fields.read_unknown_tagged_fields]
+)
+_ARRAY_READERS: frozenset[Any] = frozenset(
+    [read_write.read_array, read_write.read_nullable_array]
+)
+_ARRAY_HELPER_CODES: frozenset[Any] = frozenset(
+    f.__code__
+    for f in [read_write.read_array_length, read_write.check_length]
+    if hasattr(f, "__code__")
+)
+_CODES: dict[Any, Any] = {
+    f.__code__: f for f in _FIELD_READERS if hasattr(f, "__code__")
+}
+
+
+class SpanTable:
+    # Spans in the order fields start, parents before children.
+    # Offsets are positions in the decoded buffer, ends are exclusive.
+
+    def __init__(self) -> None:
+        self.paths: list[str] = []
+        self.starts = array("q")
+        self.ends = array("q")
+        self._index: dict[str, int] | None = None
+
+    def add(self, path: str, start: int, end: int = -1) -> int:
+        self.paths.append(path)
+        self.starts.append(start)
+        self.ends.append(end)
+        self._index = None
+        return len(self.paths) - 1
+
+    def __len__(self) -> int:
+        return len(self.paths)
+
+    def __iter__(self) -> Iterator[tuple[str, int, int]]:
+        return zip(self.paths, self.starts, self.ends)
+
+    def span(self, path: str) -> tuple[int, int]:
+        if self._index is None:
+            self._index = {p: i for i, p in enumerate(self.paths)}
+        i = self._index.get(path)
+        if i is None:
+            raise ValueError(f"No field {path}")
+        return self.starts[i], self.ends[i]
+
+    def subtree(self, path: str) -> Iterator[tuple[str, int, int]]:
+        for span in self:
+            p = span[0]
+            if p == path or p.startswith(f"{path}.") or p.startswith(f"{path}["):
+                yield span
+
+
+class _Context:
+    # A frame whose calls read fields: a `read` classmethod or an array reader.
+
+    def __init__(
+        self, frame: FrameType, path: str, fields: list[str] | None, c_level: bool
+    ) -> None:
+        self.frame = frame
+        self.path = path
+        # `None` for arrays.
+        self.fields = fields
+        # Array readers compiled to C have no frame, they are represented
+        # by the frame that calls them.
+        self.c_level = c_level
+        self.next = 0
+
+
+class _Tracer:
+    def __init__(self, buffer: BinaryIO, root_parent: FrameType) -> None:
+        self.buffer = buffer
+        self.root_parent = root_parent
+        self.table = SpanTable()
+        self.contexts: list[_Context] = []
+        # Python frames being read: frame -> (span index, pushed a context).
+        self.pending: dict[FrameType, tuple[int, bool]] = {}
+        # Compiled functions being read: (caller, function, span index, pushed a context).
+        self.c_pending: list[tuple[FrameType, Any, int, bool]] = []
+        self.error: str | None = None
+        # The error is a message left partly read,
+        # which is expected while an exception propagates.
+        self.incomplete = False
+        self._fields: dict[type, list[str]] = {}
+
+    def profile(self, frame: FrameType, event: str, arg: Any) -> None:
+        if self.error is not None:
+            return
+        if event == "call":
+            self._on_call(frame)
+        elif event == "return":
+            self._on_return(frame)
+        elif event == "c_call":
+            self._on_c_call(frame, arg)
+        elif event in ("c_return", "c_exception"):
+            self._on_c_return(frame, arg)
+
+    def _message_fields(self, frame: FrameType) -> list[str] | None:
+        # The fields if this is a `read` classmethod of a message.
+        if frame.f_code.co_name != "read":
+            return None
+        cls = frame.f_locals.get("cls")
+        if not isinstance(cls, type) or not dataclasses.is_dataclass(cls):
+            return None
+        fields = self._fields.get(cls)
+        if fields is None:
+            fields = self._fields[cls] = [f.name for f in dataclasses.fields(cls)]
+        return fields
+
+    def _next_path(self, top: _Context) -> str | None:
+        if top.fields is None:
+            path = f"{top.path}[{top.next}]"
+        elif top.next < len(top.fields):
+            name = top.fields[top.next]
+            path = name if not top.path else f"{top.path}.{name}"
+        else:
+            self.error = (
+                f"{top.path or 'The message'} reads more fields than it declares, "
+                f"or reads them not in the declaration order"
+            )
+            return None
+        top.next += 1
+        return path
+
+    def _on_call(self, frame: FrameType) -> None:
+        parent = frame.f_back
+        if not self.contexts:
+            if parent is self.root_parent:
+                fields = self._message_fields(frame)
+                if fields is None:
+                    self.error = "Only `read` classmethods of messages can be traced"
+                    return
+                self.contexts.append(_Context(frame, "", fields, False))
+                self.pending[frame] = (-1, True)
+            return
+        top = self.contexts[-1]
+        if parent is not top.frame:
+            return
+        fields = self._message_fields(frame)
+        function = _CODES.get(frame.f_code)
+        if top.fields is None:
+            # Array readers read and check the length themselves.
+            if frame.f_code in _ARRAY_HELPER_CODES:
+                return
+            # `read_array` delegates to `read_nullable_array`.
+            if function in _ARRAY_READERS and top.next == 0:
+                top.frame = frame
+                return
+        elif fields is None and function is None:
+            # Not a field, e.g. the constructor.
+            return
+        path = self._next_path(top)
+        if path is None:
+            return
+        i = self.table.add(path, self.buffer.tell())
+        if fields is not None:
+            self.contexts.append(_Context(frame, path, fields, False))
+        elif function in _ARRAY_READERS:
+            self.contexts.append(_Context(frame, path, None, False))
+        self.pending[frame] = (i, fields is not None or function in _ARRAY_READERS)
+
+    def _on_return(self, frame: FrameType) -> None:
+        pending = self.pending.pop(frame, None)
+        if pending is None:
+            return
+        i, pushed = pending
+        if i >= 0:
+            self.table.ends[i] = self.buffer.tell()
+        if pushed:
+            self._pop_context()
+
+    def _on_c_call(self, frame: FrameType, function: Any) -> None:
+        if not self.contexts:
+            if frame is self.root_parent and function is not sys.setprofile:
+                self.error = "Only `read` classmethods of messages can be traced"
+            return
+        if frame is not self.contexts[-1].frame:
+            return
+        try:
+            if function not in _FIELD_READERS:
+                return
+        except TypeError:
+            # Unhashable.
+            return
+        top = self.contexts[-1]
+        path = self._next_path(top)
+        if path is None:
+            return
+        i = self.table.add(path, self.buffer.tell())
+        is_array = function in _ARRAY_READERS
+        if is_array:
+            self.contexts.append(_Context(frame, path, None, True))
+        self.c_pending.append((frame, function, i, is_array))
+
+    def _on_c_return(self, frame: FrameType, function: Any) -> None:
+        if not self.c_pending:
+            return
+        caller, pending_function, i, pushed = self.c_pending[-1]
+        if caller is not frame or pending_function is not function:
+            return
+        self.c_pending.pop()
+        self.table.ends[i] = self.buffer.tell()
+        if pushed:
+            self._pop_context()
+
+    def _pop_context(self) -> None:
+        context = self.contexts.pop()
+        if context.fields is not None and context.next != len(context.fields):
+            self.incomplete = True
+            self.error = (
+                f"{context.path or 'The message'} read {context.next} fields "
+                f"of {len(context.fields)}"
+            )
+
+
+def trace_read(read: Callable[[BinaryIO], T], buffer: BinaryIO) -> tuple[T, SpanTable]:
+    # `read` is a `read` classmethod of a message, e.g. `FetchResponseV0.read`.
+    # Tracing is much slower than decoding, it's for tools, not for the hot path.
+    if sys.getprofile() is not None:
+        raise ValueError("Can't trace while a profiler is active")
+    tracer = _Tracer(buffer, sys._getframe())
+    sys.setprofile(tracer.profile)
+    try:
+        result = read(buffer)
+    except read_write.DecodeError as e:
+        # Fields are read one after another, so the last one started
+        # is the innermost one being read when the input ran out or broke.
+        if (
+            e.path is None
+            and (tracer.error is None or tracer.incomplete)
+            and len(tracer.table)
+        ):
+            e.path = tracer.table.paths[-1]
+        raise
+    finally:
+        sys.setprofile(None)
+    if tracer.error is not None:
+        raise ValueError(tracer.error)
+    return result, tracer.table
+
+
+def read_with_path(read: Callable[[BinaryIO], T], buffer: BinaryIO) -> T:
+    # Decodes at full speed. Only when the input turns out to be corrupt,
+    # decodes it once more with tracing to put the field path in the error.
+    start = buffer.tell()
+    try:
+        return read(buffer)
+    except read_write.DecodeError as e:
+        if e.path is None:
+            buffer.seek(start)
+            try:
+                trace_read(read, buffer)
+            except read_write.DecodeError as traced:
+                e.path = traced.path
+            except ValueError:
+                # Can't be traced.
+                pass
+        raise
+
+
+def read_field(
+    data: bytes | bytearray | memoryview,
+    spans: SpanTable,
+    path: str,
+    read: Callable[[BinaryIO], T],
+) -> T:
+    # Re-decodes one field or subtree without touching the rest.
+    start, end = spans.span(path)
+    buffer = memory_reader(memoryview(data)[start:end])
+    result = read(buffer)
+    if buffer.tell() != end - start:
+        raise ValueError(f"{path} was not read to its end")
+    return result
+
+
+def patch_field(
+    data: bytearray | memoryview,
+    spans: SpanTable,
+    path: str,
+    write: Callable[[T, BinaryIO], None],
+    value: T,
+) -> None:
+    # Overwrites a field in the original buffer. Only same-size values
+    # can be written in place, e.g. any `throttle_time_ms` or offset,
+    # but not a longer string.
+    start, end = spans.span(path)
+    encoded = BytesIO()
+    write(value, encoded)
+    if len(encoded.getbuffer()) != end - start:
+        raise ValueError(
+            f"{path} takes {end - start} bytes, "
+            f"the new value takes {len(encoded.getbuffer())}"
+        )
+    data[start:end] = encoded.getbuffer()
@@ -0,0 +1,96 @@
+from __future__ import annotations
+
+import socket
+from io import BytesIO
+from typing import BinaryIO, Protocol
+
+from read_write import read_int32, write_int32
+
+
+class Writable(Protocol):
+    def write(self, buffer: BinaryIO) -> None: ...
+
+
+def receive_exact(sock: socket.socket, num_bytes: int) -> bytes:
+    result = bytearray(num_bytes)
+    receive_into(sock, memoryview(result))
+    return bytes(result)
+
+
+def receive_into(sock: socket.socket, view: memoryview) -> None:
+    # `recv` may return less than asked for,
+    # e.g. when a large response arrives in several TCP segments.
+    received = 0
+    while received < len(view):
+        n = sock.recv_into(view[received:], len(view) - received)
+        if n == 0:
+            raise ConnectionError(
+                f"Connection closed: expected {len(view)} bytes, got {received}"
+            )
+        received += n
+
+
+def receive_frame(sock: socket.socket) -> bytes:
+    # The first 4 bytes is the length.
+    message_size = read_int32(BytesIO(receive_exact(sock, 4)))
+    return receive_exact(sock, message_size)
+
+
+def encode_frame(header: Writable, message: Writable) -> bytes:
+    buffer = BytesIO()
+
+    # message_size
+    # will be filled later
+    write_int32(0, buffer)
+
+    header.write(buffer)
+    message.write(buffer)
+
+    # Now we know the message size.
+    # Return to the beginning of the buffer and put it there.
+    message_size = buffer.tell() - 4
+    buffer.seek(0)
+    write_int32(message_size, buffer)
+
+    return buffer.getvalue()
+
+
+class FrameAssembler:
+    # Cuts a byte stream arriving in arbitrary chunks into size-prefixed frames.
+    # Frame bodies are copied once, straight into their final buffers.
+
+    def __init__(self, max_frame_size: int = 2**31 - 1) -> None:
+        self._max_frame_size = max_frame_size
+        self._size_buffer = bytearray()
+        self._frame: bytearray | None = None
+        self._filled = 0
+
+    def feed(self, data: bytes | bytearray | memoryview) -> list[bytearray]:
+        frames: list[bytearray] = []
+        view = memoryview(data)
+        pos = 0
+        while pos < len(view):
+            if self._frame is None:
+                need = 4 - len(self._size_buffer)
+                chunk = view[pos : pos + need]
+                self._size_buffer += chunk
+                pos += len(chunk)
+                if len(self._size_buffer) < 4:
+                    break
+                size = read_int32(BytesIO(self._size_buffer))
+                self._size_buffer.clear()
+                if size < 0 or size > self._max_frame_size:
+                    raise ValueError(f"Invalid frame size {size}")
+                self._frame = bytearray(size)
+                self._filled = 0
+                if size > 0:
+                    continue
+            else:
+                n = min(len(self._frame) - self._filled, len(view) - pos)
+                self._frame[self._filled : self._filled + n] = view[pos : pos + n]
+                self._filled += n
+                pos += n
+            if self._filled == len(self._frame):
+                frames.append(self._frame)
+                self._frame = None
+        return frames
@@ -0,0 +1,206 @@
+from __future__ import annotations
+
+import json
+import socket
+import time
+from typing import BinaryIO, Callable, Final, TypeVar
+
+from framing import receive_frame
+
+# Opt-in timing of requests. Until `enable` is called, `metrics` is `None`
+# and every hook returns right after checking it.
+#
+# Durations are in nanoseconds and go into histograms keyed by
+# (stage, api_key, api_version, broker). The broker is a node id
+# where it's known, otherwise the peer address of the socket.
+
+SEND: Final = "send"
+RECEIVE: Final = "receive"
+HEADER_DECODE: Final = "header_decode"
+BODY_DECODE: Final = "body_decode"
+# From sending a request to receiving its response.
+LATENCY: Final = "latency"
+
+Broker = int | str | None
+# api_key, api_version, broker
+Key = tuple[int, int, Broker]
+
+T = TypeVar("T")
+
+
+class Histogram:
+    # Log-linear buckets: each power of two is split into 2**sub_bucket_bits
+    # equal buckets, so the relative error is at most 1 / 2**sub_bucket_bits
+    # while the number of buckets is fixed (488 for 3 bits) for any int64 value.
+
+    def __init__(self, sub_bucket_bits: int = 3) -> None:
+        self._sub_bucket_bits = sub_bucket_bits
+        self._sub_buckets = 1 << sub_bucket_bits
+        self.counts = [0] * ((64 - sub_bucket_bits) * self._sub_buckets)
+        self.count = 0
+        self.sum = 0
+        self.min = 0
+        self.max = 0
+
+    def bucket(self, value: int) -> int:
+        if value < self._sub_buckets:
+            return value
+        shift = value.bit_length() - 1 - self._sub_bucket_bits
+        return (shift + 1) * self._sub_buckets + (value >> shift) - self._sub_buckets
+
+    def bucket_bounds(self, i: int) -> tuple[int, int]:
+        # The lowest and the highest value in the bucket.
+        if i < self._sub_buckets:
+            return i, i
+        shift = i // self._sub_buckets - 1
+        mantissa = i % self._sub_buckets + self._sub_buckets
+        return mantissa << shift, ((mantissa + 1) << shift) - 1
+
+    def record(self, value: int) -> None:
+        if value < 0:
+            value = 0
+        self.counts[self.bucket(value)] += 1
+        if self.count == 0 or value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+        self.count += 1
+        self.sum += value
+
+    def percentile(self, q: float) -> int:
+        # The upper bound of the bucket that contains the q-th percentile.
+        if self.count == 0:
+            return 0
+        rank = max(1, round(self.count * q / 100))
+        seen = 0
+        for i, c in enumerate(self.counts):
+            seen += c
+            if seen >= rank:
+                return min(self.bucket_bounds(i)[1], self.max)
+        return self.max
+
+    def to_dict(self) -> dict[str, object]:
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "min": self.min,
+            "max": self.max,
+            "p50": self.percentile(50),
+            "p90": self.percentile(90),
+            "p99": self.percentile(99),
+            # Only non-empty buckets, by their upper bound.
+            "buckets": {
+                str(self.bucket_bounds(i)[1]): c for i, c in enumerate(self.counts) if c
+            },
+        }
+
+
+class Metrics:
+    def __init__(self, sub_bucket_bits: int = 3) -> None:
+        self._sub_bucket_bits = sub_bucket_bits
+        self.histograms: dict[tuple[str, int, int, Broker], Histogram] = {}
+        self.bytes_out: dict[Key, int] = {}
+        self.bytes_in: dict[Key, int] = {}
+
+    def record(self, stage: str, key: Key, duration_ns: int) -> None:
+        hkey = (stage, *key)
+        histogram = self.histograms.get(hkey)
+        if histogram is None:
+            histogram = self.histograms[hkey] = Histogram(self._sub_bucket_bits)
+        histogram.record(duration_ns)
+
+    def count_out(self, key: Key, num_bytes: int) -> None:
+        self.bytes_out[key] = self.bytes_out.get(key, 0) + num_bytes
+
+    def count_in(self, key: Key, num_bytes: int) -> None:
+        self.bytes_in[key] = self.bytes_in.get(key, 0) + num_bytes
+
+    def snapshot(self) -> dict[str, object]:
+        def key_dict(
+            api_key: int, api_version: int, broker: Broker
+        ) -> dict[str, object]:
+            return {"api_key": api_key, "api_version": api_version, "broker": broker}
+
+        return {
+            "histograms": [
+                {
+                    "stage": stage,
+                    **key_dict(api_key, api_version, broker),
+                    **h.to_dict(),
+                }
+                for (stage, api_key, api_version, broker), h in self.histograms.items()
+            ],
+            "bytes": [
+                {
+                    **key_dict(*key),
+                    "out": self.bytes_out.get(key, 0),
+                    "in": self.bytes_in.get(key, 0),
+                }
+                for key in {**self.bytes_out, **self.bytes_in}
+            ],
+        }
+
+    def to_json(self) -> str:
+        return json.dumps(self.snapshot(), indent=2)
+
+
+metrics: Metrics | None = None
+
+
+def enable(new_metrics: Metrics | None = None) -> Metrics:
+    global metrics
+    metrics = new_metrics if new_metrics is not None else Metrics()
+    return metrics
+
+
+def disable() -> Metrics | None:
+    global metrics
+    previous, metrics = metrics, None
+    return previous
+
+
+# The hooks. They take the key from `key()`,
+# which is `None` when instrumentation is disabled.
+
+
+def key(sock: socket.socket, api_key: int, api_version: int) -> Key | None:
+    if metrics is None:
+        return None
+    try:
+        host, port = sock.getpeername()[:2]
+        broker: Broker = f"{host}:{port}"
+    except (OSError, ValueError):
+        broker = None
+    return api_key, api_version, broker
+
+
+def send(sock: socket.socket, data: bytes, key: Key | None) -> None:
+    if key is None or metrics is None:
+        sock.sendall(data)
+        return
+    start = time.perf_counter_ns()
+    sock.sendall(data)
+    metrics.record(SEND, key, time.perf_counter_ns() - start)
+    metrics.count_out(key, len(data))
+
+
+def receive(sock: socket.socket, key: Key | None) -> bytes:
+    if key is None or metrics is None:
+        return receive_frame(sock)
+    start = time.perf_counter_ns()
+    frame = receive_frame(sock)
+    metrics.record(RECEIVE, key, time.perf_counter_ns() - start)
+    # Plus the size prefix.
+    metrics.count_in(key, 4 + len(frame))
+    return frame
+
+
+def decode(
+    stage: str, read: Callable[[BinaryIO], T], buffer: BinaryIO, key: Key | None
+) -> T:
+    if key is None or metrics is None:
+        return read(buffer)
+    start = time.perf_counter_ns()
+    result = read(buffer)
+    metrics.record(stage, key, time.perf_counter_ns() - start)
+    return result
@@ -0,0 +1,170 @@
+from __future__ import annotations
+
+import mmap
+import os
+import struct
+from typing import Final, Iterator
+
+from record_batch import BatchView, LegacyMessage, RecordBatch, iter_batches
+
+# Offset index entry: offset relative to the segment base offset,
+# position of the batch in the `.log` file.
+OFFSET_INDEX_ENTRY: Final = struct.Struct(">ii")
+# Time index entry: timestamp, offset relative to the segment base offset.
+TIME_INDEX_ENTRY: Final = struct.Struct(">qi")
+
+
+def _map_file(path: str) -> mmap.mmap | None:
+    # Empty files can't be mapped.
+    if os.path.getsize(path) == 0:
+        return None
+    with open(path, "rb") as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+class _SparseIndex:
+    def __init__(self, path: str, entry: struct.Struct, offset_field: int) -> None:
+        self._entry = entry
+        # Which field of an entry is the relative offset.
+        self._offset_field = offset_field
+        self._data = _map_file(path)
+        self._count = self._valid_entries()
+
+    def __len__(self) -> int:
+        return self._count
+
+    def entry(self, i: int) -> tuple[int, int]:
+        assert self._data is not None
+        a, b = self._entry.unpack_from(self._data, i * self._entry.size)
+        return a, b
+
+    def _valid_entries(self) -> int:
+        # The index of the active segment is preallocated and filled with zeros.
+        # Relative offsets grow, so the first zero one after the beginning
+        # marks the end. Find it with a binary search.
+        if self._data is None:
+            return 0
+        lo, hi = 1, len(self._data) // self._entry.size
+        if hi == 0:
+            return 0
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.entry(mid)[self._offset_field] > 0:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def _search(self, target: int, key_index: int) -> int:
+        # The last entry whose key is <= target, or -1.
+        lo, hi = 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.entry(mid)[key_index] <= target:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo - 1
+
+    def close(self) -> None:
+        if self._data is not None:
+            self._data.close()
+
+
+class OffsetIndex(_SparseIndex):
+    def __init__(self, path: str) -> None:
+        super().__init__(path, OFFSET_INDEX_ENTRY, 0)
+
+    def lookup(self, relative_offset: int) -> int:
+        # The position of the batch to start scanning from
+        # to find the given offset.
+        i = self._search(relative_offset, 0)
+        return 0 if i < 0 else self.entry(i)[1]
+
+
+class TimeIndex(_SparseIndex):
+    def __init__(self, path: str) -> None:
+        super().__init__(path, TIME_INDEX_ENTRY, 1)
+
+    def lookup(self, timestamp: int) -> int:
+        # The relative offset to start scanning from
+        # to find the first record with a timestamp >= the given one.
+        i = self._search(timestamp - 1, 0)
+        return 0 if i < 0 else self.entry(i)[1]
+
+
+class LogSegment:
+    # Reads a segment straight from a broker's data directory, e.g.
+    # `/var/lib/kafka/data/topic-0/00000000000000001000.log` with
+    # the `.index` and `.timeindex` files next to it.
+    # The files are memory mapped, batches are handed out as slices of the map.
+
+    def __init__(self, log_path: str) -> None:
+        stem, ext = os.path.splitext(log_path)
+        if ext != ".log":
+            raise ValueError(f"{log_path} is not a .log file")
+        self.base_offset = int(os.path.basename(stem))
+        self._data = _map_file(log_path)
+        self._view = (
+            memoryview(self._data) if self._data is not None else memoryview(b"")
+        )
+
+        index_path = f"{stem}.index"
+        self._offset_index = (
+            OffsetIndex(index_path) if os.path.exists(index_path) else None
+        )
+        time_index_path = f"{stem}.timeindex"
+        self._time_index = (
+            TimeIndex(time_index_path) if os.path.exists(time_index_path) else None
+        )
+
+    @property
+    def size(self) -> int:
+        return len(self._view)
+
+    def batch_views(self, start_offset: int | None = None) -> Iterator[BatchView]:
+        position = 0
+        if start_offset is not None and self._offset_index is not None:
+            position = self._offset_index.lookup(start_offset - self.base_offset)
+        for batch in iter_batches(self._view, position):
+            # The index is sparse, skip the batches before the wanted offset.
+            if start_offset is not None and batch.last_offset < start_offset:
+                continue
+            yield batch
+
+    def batches(
+        self, start_offset: int | None = None
+    ) -> Iterator[RecordBatch | LegacyMessage]:
+        for batch in self.batch_views(start_offset):
+            yield batch.decode()
+
+    def offset_for_timestamp(self, timestamp: int) -> int | None:
+        # The first offset of the first batch that may contain records
+        # with timestamps >= the given one.
+        start_offset = None
+        if self._time_index is not None:
+            start_offset = self.base_offset + self._time_index.lookup(timestamp)
+        for batch in self.batch_views(start_offset):
+            max_timestamp = batch.max_timestamp
+            if max_timestamp is not None and max_timestamp >= timestamp:
+                return batch.base_offset
+        return None
+
+    def close(self) -> None:
+        self._view.release()
+        for index in (self._offset_index, self._time_index):
+            if index is not None:
+                index.close()
+        if self._data is not None:
+            try:
+                self._data.close()
+            except BufferError:
+                # Some batches are still referenced,
+                # the file gets unmapped when the last of them is dropped.
+                pass
+
+    def __enter__(self) -> LogSegment:
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        self.close()
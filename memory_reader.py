@@ -0,0 +1,59 @@
+from __future__ import annotations
+
+import io
+from typing import BinaryIO, cast
+
+
+class MemoryReader(io.BufferedIOBase):
+    # A read-only stream over a memoryview, e.g. a slice of an mmap'ed file.
+    # Unlike `BytesIO(view)`, creating it doesn't copy the underlying bytes,
+    # only the individual reads do.
+
+    def __init__(self, view: memoryview) -> None:
+        super().__init__()
+        self._view = view.cast("B") if view.format != "B" else view
+        self._pos = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def read(self, size: int | None = -1) -> bytes:
+        if size is None or size < 0:
+            end = len(self._view)
+        else:
+            end = min(self._pos + size, len(self._view))
+        result = self._view[self._pos : end].tobytes()
+        self._pos = end
+        return result
+
+    def read1(self, size: int = -1) -> bytes:
+        return self.read(size)
+
+    def tell(self) -> int:
+        return self._pos
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_SET:
+            pos = offset
+        elif whence == io.SEEK_CUR:
+            pos = self._pos + offset
+        elif whence == io.SEEK_END:
+            pos = len(self._view) + offset
+        else:
+            raise ValueError(f"Invalid whence {whence}")
+        if pos < 0:
+            raise ValueError(f"Negative seek position {pos}")
+        self._pos = pos
+        return pos
+
+    def getbuffer(self) -> memoryview:
+        return self._view
+
+
+def memory_reader(view: bytes | bytearray | memoryview) -> BinaryIO:
+    # `BufferedIOBase` and `BinaryIO` are incompatible for type checkers,
+    # but the codecs only need `read`, `tell` and `seek`.
+    return cast(BinaryIO, MemoryReader(memoryview(view)))
@@ -0,0 +1,225 @@
+from __future__ import annotations
+
+import time
+from dataclasses import dataclass
+from typing import Callable, Final
+from uuid import UUID
+
+from metadata_v12 import (
+    MetadataRequestV12,
+    MetadataRequestTopicV12,
+    MetadataResponseV12,
+    MetadataResponseTopicV12,
+)
+
+# Metadata v12 is the only version there are codecs for: the cache builds
+# v12 requests and takes v12 responses. Older brokers aren't supported.
+METADATA_API_VERSION: Final = 12
+
+UNKNOWN_TOPIC_OR_PARTITION: Final = 3
+LEADER_NOT_AVAILABLE: Final = 5
+NOT_LEADER_OR_FOLLOWER: Final = 6
+FENCED_LEADER_EPOCH: Final = 74
+UNKNOWN_LEADER_EPOCH: Final = 75
+UNKNOWN_TOPIC_ID: Final = 100
+
+# Errors in Fetch, Produce, etc. meaning our view of the topic is outdated.
+STALE_METADATA_ERRORS: Final = frozenset(
+    {
+        UNKNOWN_TOPIC_OR_PARTITION,
+        LEADER_NOT_AVAILABLE,
+        NOT_LEADER_OR_FOLLOWER,
+        FENCED_LEADER_EPOCH,
+        UNKNOWN_LEADER_EPOCH,
+        UNKNOWN_TOPIC_ID,
+    }
+)
+
+
+@dataclass(frozen=True)
+class BrokerInfo:
+    node_id: int
+    host: str
+    port: int
+    rack: str | None
+
+
+@dataclass(frozen=True)
+class PartitionLeader:
+    leader_id: int
+    leader_epoch: int
+
+
+# The part of a topic's metadata that routing depends on,
+# used to detect if a topic has changed between two responses.
+TopicSnapshot = tuple[UUID | None, tuple[tuple[int, int, int], ...]]
+
+
+class MetadataCache:
+    def __init__(
+        self, ttl_s: float = 300.0, clock: Callable[[], float] = time.monotonic
+    ) -> None:
+        self._ttl_s = ttl_s
+        self._clock = clock
+        self._updated_at: float | None = None
+
+        self.cluster_id: str | None = None
+        self.controller_id: int = -1
+        self._brokers: dict[int, BrokerInfo] = {}
+        self._leaders: dict[tuple[str, int], PartitionLeader] = {}
+        self._partitions: dict[str, list[int]] = {}
+        self._snapshots: dict[str, TopicSnapshot] = {}
+        self._topic_names: dict[UUID, str] = {}
+        self._topic_ids: dict[str, UUID] = {}
+        self._stale_topics: set[str] = set()
+
+    def broker(self, node_id: int) -> BrokerInfo | None:
+        return self._brokers.get(node_id)
+
+    def brokers(self) -> list[BrokerInfo]:
+        return list(self._brokers.values())
+
+    def leader(self, topic: str, partition: int) -> PartitionLeader | None:
+        return self._leaders.get((topic, partition))
+
+    def leader_broker(self, topic: str, partition: int) -> BrokerInfo | None:
+        leader = self._leaders.get((topic, partition))
+        if leader is None:
+            return None
+        return self._brokers.get(leader.leader_id)
+
+    def partitions(self, topic: str) -> list[int]:
+        return self._partitions.get(topic, [])
+
+    def topic_name(self, topic_id: UUID) -> str | None:
+        return self._topic_names.get(topic_id)
+
+    def topic_id(self, topic: str) -> UUID | None:
+        return self._topic_ids.get(topic)
+
+    def needs_refresh(self) -> bool:
+        if self._updated_at is None or self._stale_topics:
+            return True
+        return self._clock() - self._updated_at >= self._ttl_s
+
+    def stale_topics(self) -> set[str]:
+        return set(self._stale_topics)
+
+    def mark_stale(self, topic: str) -> None:
+        self._stale_topics.add(topic)
+
+    def handle_error(self, topic: str, error_code: int) -> bool:
+        if error_code in STALE_METADATA_ERRORS:
+            self.mark_stale(topic)
+            return True
+        return False
+
+    def build_refresh_request(self) -> MetadataRequestV12:
+        # When only some topics are known to be outdated and the TTL hasn't
+        # expired, ask only for them. Otherwise, ask for everything we know.
+        topics: list[str]
+        if (
+            self._stale_topics
+            and self._updated_at is not None
+            and self._clock() - self._updated_at < self._ttl_s
+        ):
+            topics = sorted(self._stale_topics)
+        else:
+            topics = sorted(self._partitions.keys() | self._stale_topics)
+        return MetadataRequestV12(
+            topics=[
+                MetadataRequestTopicV12(
+                    topic_id=None, name=topic, _unknownTaggedFields=[]
+                )
+                for topic in topics
+            ],
+            allow_auto_topic_creation=False,
+            include_topic_authorized_operations=False,
+            _unknownTaggedFields=[],
+        )
+
+    def update(self, response: MetadataResponseV12, full: bool = False) -> set[str]:
+        # Returns the names of topics whose routing has changed.
+        # With `full`, the response is expected to describe all topics
+        # in the cluster, so the topics missing from it are dropped.
+        self.cluster_id = response.cluster_id
+        self.controller_id = response.controller_id
+        self._brokers = {
+            b.node_id: BrokerInfo(
+                node_id=b.node_id, host=b.host, port=b.port, rack=b.rack
+            )
+            for b in response.brokers
+        }
+
+        changed: set[str] = set()
+        seen: set[str] = set()
+        for topic in response.topics:
+            name = topic.name
+            if name is None and topic.topic_id is not None:
+                name = self._topic_names.get(topic.topic_id)
+            if name is None:
+                continue
+            seen.add(name)
+            self._stale_topics.discard(name)
+
+            if topic.error_code != 0:
+                if name in self._snapshots:
+                    self._remove_topic(name)
+                    changed.add(name)
+                if topic.error_code == LEADER_NOT_AVAILABLE:
+                    self._stale_topics.add(name)
+                continue
+
+            snapshot = self._snapshot(topic)
+            if self._snapshots.get(name) == snapshot:
+                if any(leader_id < 0 for _, leader_id, _ in snapshot[1]):
+                    self._stale_topics.add(name)
+                continue
+            self._remove_topic(name)
+            self._add_topic(name, topic, snapshot)
+            changed.add(name)
+
+        if full:
+            for name in self._snapshots.keys() - seen:
+                self._remove_topic(name)
+                changed.add(name)
+
+        self._updated_at = self._clock()
+        return changed
+
+    @staticmethod
+    def _snapshot(topic: MetadataResponseTopicV12) -> TopicSnapshot:
+        return (
+            topic.topic_id,
+            tuple(
+                sorted(
+                    (p.partition_index, p.leader_id, p.leader_epoch)
+                    for p in topic.partitions
+                )
+            ),
+        )
+
+    def _add_topic(
+        self, name: str, topic: MetadataResponseTopicV12, snapshot: TopicSnapshot
+    ) -> None:
+        self._snapshots[name] = snapshot
+        self._partitions[name] = [p for p, _, _ in snapshot[1]]
+        for partition_index, leader_id, leader_epoch in snapshot[1]:
+            # Partitions without a leader are not routable.
+            if leader_id >= 0:
+                self._leaders[(name, partition_index)] = PartitionLeader(
+                    leader_id=leader_id, leader_epoch=leader_epoch
+                )
+            else:
+                self._stale_topics.add(name)
+        if topic.topic_id is not None:
+            self._topic_ids[name] = topic.topic_id
+            self._topic_names[topic.topic_id] = name
+
+    def _remove_topic(self, name: str) -> None:
+        self._snapshots.pop(name, None)
+        for partition in self._partitions.pop(name, []):
+            self._leaders.pop((name, partition), None)
+        topic_id = self._topic_ids.pop(name, None)
+        if topic_id is not None:
+            self._topic_names.pop(topic_id, None)
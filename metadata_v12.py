@@ -0,0 +1,397 @@
+from __future__ import annotations
+
+import socket
+from dataclasses import dataclass
+from io import BytesIO
+from itertools import chain
+from pprint import pprint
+from typing import Any, BinaryIO, Callable, ClassVar, Generic, TypeVar
+from uuid import UUID
+
+import instrumentation
+import read_write_unchecked as unchecked
+from raw_tagged_fields import (
+    RawTaggedField,
+    write_unknown_tagged_fields,
+    read_unknown_tagged_fields,
+)
+from read_write import (
+    read_int16,
+    read_int32,
+    read_boolean,
+    read_uuid,
+    read_uuid_bytes,
+    read_string,
+    read_nullable_string,
+    read_array,
+    read_nullable_array,
+    write_int16,
+    write_int32,
+    write_boolean,
+    write_uuid,
+    write_uuid_bytes,
+    write_string,
+    write_nullable_string,
+    write_array,
+    write_nullable_array,
+)
+from request_response_headers import RequestHeaderV2, ResponseHeaderV1
+
+
+@dataclass
+class MetadataRequestTopicV12:
+    topic_id: UUID | None
+    name: str | None
+    _unknownTaggedFields: list[RawTaggedField]
+
+    @classmethod
+    def read(cls, buffer: BinaryIO) -> MetadataRequestTopicV12:
+        return MetadataRequestTopicV12(
+            topic_id=read_uuid(buffer),
+            name=read_nullable_string(buffer, True),
+            _unknownTaggedFields=read_unknown_tagged_fields(buffer),
+        )
+
+    def write(self, buffer: BinaryIO) -> None:
+        write_uuid(self.topic_id, buffer)
+        write_nullable_string(self.name, buffer, True)
+        write_unknown_tagged_fields(self._unknownTaggedFields, buffer)
+
+
+@dataclass
+class MetadataRequestV12:
+    # `None` means all topics.
+    topics: list[MetadataRequestTopicV12] | None
+    allow_auto_topic_creation: bool
+    include_topic_authorized_operations: bool
+    _unknownTaggedFields: list[RawTaggedField]
+
+    @classmethod
+    def read(cls, buffer: BinaryIO) -> MetadataRequestV12:
+        return MetadataRequestV12(
+            topics=read_nullable_array(MetadataRequestTopicV12.read, buffer, True),
+            allow_auto_topic_creation=read_boolean(buffer),
+            include_topic_authorized_operations=read_boolean(buffer),
+            _unknownTaggedFields=read_unknown_tagged_fields(buffer),
+        )
+
+    def write(self, buffer: BinaryIO) -> None:
+        write_nullable_array(self.topics, MetadataRequestTopicV12.write, buffer, True)
+        write_boolean(self.allow_auto_topic_creation, buffer)
+        write_boolean(self.include_topic_authorized_operations, buffer)
+        write_unknown_tagged_fields(self._unknownTaggedFields, buffer)
+
+
+@dataclass
+class MetadataResponseBrokerV12:
+    node_id: int
+    host: str
+    port: int
+    rack: str | None
+    _unknownTaggedFields: list[RawTaggedField]
+
+    @classmethod
+    def read(cls, buffer: BinaryIO) -> MetadataResponseBrokerV12:
+        return MetadataResponseBrokerV12(
+            node_id=read_int32(buffer),
+            host=read_string(buffer, True),
+            port=read_int32(buffer),
+            rack=read_nullable_string(buffer, True),
+            _unknownTaggedFields=read_unknown_tagged_fields(buffer),
+        )
+
+    def write(self, buffer: BinaryIO) -> None:
+        write_int32(self.node_id, buffer)
+        write_string(self.host, buffer, True)
+        write_int32(self.port, buffer)
+        write_nullable_string(self.rack, buffer, True)
+        write_unknown_tagged_fields(self._unknownTaggedFields, buffer)
+
+    def _write_unchecked(self, buffer: BinaryIO) -> None:
+        unchecked.write_int32(self.node_id, buffer)
+        unchecked.write_string(self.host, buffer, True)
+        unchecked.write_int32(self.port, buffer)
+        unchecked.write_nullable_string(self.rack, buffer, True)
+        write_unknown_tagged_fields(self._unknownTaggedFields, buffer)
+
+
+@dataclass
+class MetadataResponsePartitionV12:
+    error_code: int
+    partition_index: int
+    leader_id: int
+    leader_epoch: int
+    replica_nodes: list[int]
+    isr_nodes: list[int]
+    offline_replicas: list[int]
+    _unknownTaggedFields: list[RawTaggedField]
+
+    @classmethod
+    def read(cls, buffer: BinaryIO) -> MetadataResponsePartitionV12:
+        return MetadataResponsePartitionV12(
+            error_code=read_int16(buffer),
+            partition_index=read_int32(buffer),
+            leader_id=read_int32(buffer),
+            leader_epoch=read_int32(buffer),
+            replica_nodes=read_array(read_int32, buffer, True),
+            isr_nodes=read_array(read_int32, buffer, True),
+            offline_replicas=read_array(read_int32, buffer, True),
+            _unknownTaggedFields=read_unknown_tagged_fields(buffer),
+        )
+
+    def write(self, buffer: BinaryIO) -> None:
+        write_int16(self.error_code, buffer)
+        write_int32(self.partition_index, buffer)
+        write_int32(self.leader_id, buffer)
+        write_int32(self.leader_epoch, buffer)
+        write_array(self.replica_nodes, write_int32, buffer, True)
+        write_array(self.isr_nodes, write_int32, buffer, True)
+        write_array(self.offline_replicas, write_int32, buffer, True)
+        write_unknown_tagged_fields(self._unknownTaggedFields, buffer)
+
+    def _write_unchecked(self, buffer: BinaryIO) -> None:
+        unchecked.write_int16(self.error_code, buffer)
+        unchecked.write_int32(self.partition_index, buffer)
+        unchecked.write_int32(self.leader_id, buffer)
+        unchecked.write_int32(self.leader_epoch, buffer)
+        unchecked.write_int32_array(self.replica_nodes, buffer, True)
+        unchecked.write_int32_array(self.isr_nodes, buffer, True)
+        unchecked.write_int32_array(self.offline_replicas, buffer, True)
+        write_unknown_tagged_fields(self._unknownTaggedFields, buffer)
+
+
+# Topic IDs are `UUID` objects in `MetadataResponseV12`, and the raw 16 bytes
+# in `MetadataResponseRawIdV12`, e.g. to look them up in
+# `topic_id_cache.TopicIdCache`. Everything else is shared.
+
+TopicIdT = TypeVar("TopicIdT")
+TopicT = TypeVar("TopicT", bound="_MetadataResponseTopicV12[Any]")
+ResponseT = TypeVar("ResponseT", bound="_MetadataResponseV12[Any]")
+
+
+@dataclass
+class _MetadataResponseTopicV12(Generic[TopicIdT]):
+    error_code: int
+    name: str | None
+    topic_id: TopicIdT | None
+    is_internal: bool
+    partitions: list[MetadataResponsePartitionV12]
+    topic_authorized_operations: int
+    _unknownTaggedFields: list[RawTaggedField]
+
+    _read_topic_id: ClassVar[Callable[[BinaryIO], Any]]
+    _write_topic_id: ClassVar[Callable[[Any, BinaryIO], None]]
+
+    @classmethod
+    def read(cls: type[TopicT], buffer: BinaryIO) -> TopicT:
+        return cls(
+            error_code=read_int16(buffer),
+            name=read_nullable_string(buffer, True),
+            topic_id=cls._read_topic_id(buffer),
+            is_internal=read_boolean(buffer),
+            partitions=read_array(MetadataResponsePartitionV12.read, buffer, True),
+            topic_authorized_operations=read_int32(buffer),
+            _unknownTaggedFields=read_unknown_tagged_fields(buffer),
+        )
+
+    def write(self, buffer: BinaryIO) -> None:
+        write_int16(self.error_code, buffer)
+        write_nullable_string(self.name, buffer, True)
+        type(self)._write_topic_id(self.topic_id, buffer)
+        write_boolean(self.is_internal, buffer)
+        write_array(self.partitions, MetadataResponsePartitionV12.write, buffer, True)
+        write_int32(self.topic_authorized_operations, buffer)
+        write_unknown_tagged_fields(self._unknownTaggedFields, buffer)
+
+    def _write_unchecked(self, buffer: BinaryIO) -> None:
+        unchecked.write_int16(self.error_code, buffer)
+        unchecked.write_nullable_string(self.name, buffer, True)
+        type(self)._write_topic_id(self.topic_id, buffer)
+        unchecked.write_boolean(self.is_internal, buffer)
+        unchecked.write_array_length(len(self.partitions), buffer, True)
+        for partition in self.partitions:
+            partition._write_unchecked(buffer)
+        unchecked.write_int32(self.topic_authorized_operations, buffer)
+        write_unknown_tagged_fields(self._unknownTaggedFields, buffer)
+
+
+@dataclass
+class MetadataResponseTopicV12(_MetadataResponseTopicV12[UUID]):
+    _read_topic_id = staticmethod(read_uuid)
+    _write_topic_id = staticmethod(write_uuid)
+
+
+@dataclass
+class MetadataResponseTopicRawIdV12(_MetadataResponseTopicV12[bytes]):
+    _read_topic_id = staticmethod(read_uuid_bytes)
+    _write_topic_id = staticmethod(write_uuid_bytes)
+
+
+@dataclass
+class _MetadataResponseV12(Generic[TopicT]):
+    throttle_time_ms: int
+    brokers: list[MetadataResponseBrokerV12]
+    cluster_id: str | None
+    controller_id: int
+    topics: list[TopicT]
+    _unknownTaggedFields: list[RawTaggedField]
+
+    _topic_type: ClassVar[type[_MetadataResponseTopicV12[Any]]]
+
+    @classmethod
+    def read(cls: type[ResponseT], buffer: BinaryIO) -> ResponseT:
+        return cls(
+            throttle_time_ms=read_int32(buffer),
+            brokers=read_array(MetadataResponseBrokerV12.read, buffer, True),
+            cluster_id=read_nullable_string(buffer, True),
+            controller_id=read_int32(buffer),
+            topics=read_array(cls._topic_type.read, buffer, True),
+            _unknownTaggedFields=read_unknown_tagged_fields(buffer),
+        )
+
+    def write(self, buffer: BinaryIO) -> None:
+        write_int32(self.throttle_time_ms, buffer)
+        write_array(self.brokers, MetadataResponseBrokerV12.write, buffer, True)
+        write_nullable_string(self.cluster_id, buffer, True)
+        write_int32(self.controller_id, buffer)
+        write_array(self.topics, type(self)._topic_type.write, buffer, True)
+        write_unknown_tagged_fields(self._unknownTaggedFields, buffer)
+
+    def write_unchecked(self, buffer: BinaryIO) -> None:
+        # The same bytes as `write`, but the values are checked up front,
+        # in bulk, and then written with `read_write_unchecked`,
+        # e.g. when re-encoding responses with many partitions.
+        self.check()
+        unchecked.write_int32(self.throttle_time_ms, buffer)
+        unchecked.write_array_length(len(self.brokers), buffer, True)
+        for broker in self.brokers:
+            broker._write_unchecked(buffer)
+        unchecked.write_nullable_string(self.cluster_id, buffer, True)
+        unchecked.write_int32(self.controller_id, buffer)
+        unchecked.write_array_length(len(self.topics), buffer, True)
+        for topic in self.topics:
+            topic._write_unchecked(buffer)
+        write_unknown_tagged_fields(self._unknownTaggedFields, buffer)
+
+    def check(self) -> None:
+        # Raises `ValueError` for anything `write` would refuse.
+        # The values are collected into two lists, which are checked in C.
+        int16s = []
+        int32s = [self.throttle_time_ms, self.controller_id]
+        for broker in self.brokers:
+            int32s += (broker.node_id, broker.port)
+        for topic in self.topics:
+            int16s.append(topic.error_code)
+            int32s.append(topic.topic_authorized_operations)
+            for p in topic.partitions:
+                int16s.append(p.error_code)
+                int32s += (p.partition_index, p.leader_id, p.leader_epoch)
+                int32s += p.replica_nodes
+                int32s += p.isr_nodes
+                int32s += p.offline_replicas
+        unchecked.check_range(int16s, unchecked.INT16_RANGE, "INT16")
+        unchecked.check_range(int32s, unchecked.INT32_RANGE, "INT32")
+        unchecked.check_string_lengths(
+            chain(
+                (self.cluster_id,),
+                (b.host for b in self.brokers),
+                (b.rack for b in self.brokers),
+                (t.name for t in self.topics),
+            )
+        )
+
+
+@dataclass
+class MetadataResponseV12(_MetadataResponseV12[MetadataResponseTopicV12]):
+    _topic_type = MetadataResponseTopicV12
+
+
+@dataclass
+class MetadataResponseRawIdV12(_MetadataResponseV12[MetadataResponseTopicRawIdV12]):
+    _topic_type = MetadataResponseTopicRawIdV12
+
+
+def send_request(
+    request_correlation_id: int,
+    sock: socket.socket,
+    topics: list[str] | None = None,
+) -> None:
+    buffer = BytesIO()
+
+    # message_size
+    # will be filled later
+    write_int32(0, buffer)
+
+    header = RequestHeaderV2(
+        request_api_key=3,  # Metadata
+        request_api_version=12,
+        correlation_id=request_correlation_id,
+        client_id="test-client",
+        _unknownTaggedFields=[],
+    )
+    header.write(buffer)
+
+    message = MetadataRequestV12(
+        topics=(
+            None
+            if topics is None
+            else [
+                MetadataRequestTopicV12(
+                    topic_id=None, name=topic, _unknownTaggedFields=[]
+                )
+                for topic in topics
+            ]
+        ),
+        allow_auto_topic_creation=False,
+        include_topic_authorized_operations=False,
+        _unknownTaggedFields=[],
+    )
+    message.write(buffer)
+
+    # Now we know the message size.
+    # Return to the beginning of the buffer and put it there.
+    request_message_size = buffer.tell() - 4
+    buffer.seek(0)
+    write_int32(request_message_size, buffer)
+
+    instrumentation.send(sock, buffer.getvalue(), instrumentation.key(sock, 3, 12))
+
+
+def read_response(
+    request_correlation_id: int, sock: socket.socket
+) -> tuple[ResponseHeaderV1, MetadataResponseV12]:
+    key = instrumentation.key(sock, 3, 12)
+    buffer = BytesIO(instrumentation.receive(sock, key))
+
+    header = instrumentation.decode(
+        instrumentation.HEADER_DECODE, ResponseHeaderV1.read, buffer, key
+    )
+    if header.correlation_id != request_correlation_id:
+        raise ValueError()
+
+    message = instrumentation.decode(
+        instrumentation.BODY_DECODE, MetadataResponseV12.read, buffer, key
+    )
+    return header, message
+
+
+def receive_response(request_correlation_id: int, sock: socket.socket) -> None:
+    header, message = read_response(request_correlation_id, sock)
+    pprint(header)
+    pprint(message)
+
+
+def main() -> None:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.connect(("127.0.0.1", 9092))
+
+    request_correlation_id = 123
+    send_request(request_correlation_id, sock, ["test-topic1"])
+
+    receive_response(request_correlation_id, sock)
+
+    sock.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+from __future__ import annotations
+
+import socket
+import socketserver
+import threading
+from dataclasses import dataclass
+from io import BytesIO
+from typing import Callable
+
+from api_versions_v3 import ApiVersionsResponseV3, ApiVersionsResponseApiKeyV3
+from framing import Writable, receive_frame, encode_frame
+from read_write import read_int16, read_int32
+from request_response_headers import ResponseHeaderV0
+
+
+# A tiny in-process stand-in for a broker, for tests and local experiments.
+# It understands only the common prefix of request headers and answers
+# with whatever the handler for the request's api_key returns.
+
+
+@dataclass
+class MockRequest:
+    api_key: int
+    api_version: int
+    correlation_id: int
+    # The whole request, without the size prefix.
+    frame: bytes
+
+
+# Returns the response header and message, or `None` to not respond.
+MockHandler = Callable[[MockRequest], "tuple[Writable, Writable] | None"]
+
+
+def default_api_versions_response() -> ApiVersionsResponseV3:
+    return ApiVersionsResponseV3(
+        error_code=0,
+        api_keys=[
+            ApiVersionsResponseApiKeyV3(
+                api_key=api_key,
+                min_version=min_version,
+                max_version=max_version,
+                _unknownTaggedFields=[],
+            )
+            for api_key, min_version, max_version in [
+                (1, 0, 16),  # Fetch
+                (3, 0, 12),  # Metadata
+                (18, 0, 3),  # ApiVersions
+            ]
+        ],
+        throttle_time_ms=0,
+        _unknownTaggedFields=[],
+    )
+
+
+def handle_api_versions(request: MockRequest) -> tuple[Writable, Writable]:
+    # ApiVersions responses always use header v0,
+    # so clients that don't know the broker yet can parse them.
+    return (
+        ResponseHeaderV0(correlation_id=request.correlation_id),
+        default_api_versions_response(),
+    )
+
+
+class MockBroker:
+    def __init__(self, handlers: dict[int, MockHandler] | None = None) -> None:
+        self.handlers: dict[int, MockHandler] = {18: handle_api_versions}
+        if handlers is not None:
+            self.handlers.update(handlers)
+        self.requests: list[MockRequest] = []
+        self.accepted_connections = 0
+        self._lock = threading.Lock()
+
+        broker = self
+
+        class Handler(socketserver.BaseRequestHandler):
+            def handle(self) -> None:
+                broker._serve(self.request)
+
+        self._server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def address(self) -> tuple[str, int]:
+        host, port = self._server.server_address[:2]
+        return str(host), int(port)
+
+    def start(self) -> MockBroker:
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+
+    def __enter__(self) -> MockBroker:
+        return self.start()
+
+    def __exit__(self, *args: object) -> None:
+        self.stop()
+
+    def _serve(self, sock: socket.socket) -> None:
+        with self._lock:
+            self.accepted_connections += 1
+        while True:
+            try:
+                frame = receive_frame(sock)
+            except (ConnectionError, OSError):
+                return
+
+            # All request header versions start with these fields.
+            buffer = BytesIO(frame)
+            request = MockRequest(
+                api_key=read_int16(buffer),
+                api_version=read_int16(buffer),
+                correlation_id=read_int32(buffer),
+                frame=frame,
+            )
+            with self._lock:
+                self.requests.append(request)
+
+            handler = self.handlers.get(request.api_key)
+            if handler is None:
+                # Real brokers close the connection on requests they can't handle.
+                return
+            response = handler(request)
+            if response is not None:
+                header, message = response
+                sock.sendall(encode_frame(header, message))
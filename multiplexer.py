@@ -0,0 +1,228 @@
+from __future__ import annotations
+
+import errno
+import selectors
+import socket
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from io import BytesIO
+from typing import Callable, Mapping
+
+import instrumentation
+from api_versions_cache import BrokerAddress
+from framing import FrameAssembler
+from read_write import read_int16, read_int32
+from request_response_headers import read_response_correlation_id
+
+# Gets the whole response frame (header and body) without the size prefix.
+ResponseCallback = Callable[[bytearray], None]
+ErrorCallback = Callable[[Exception], None]
+
+RECEIVE_CHUNK_SIZE = 256 * 1024
+
+
+@dataclass
+class _InFlight:
+    on_response: ResponseCallback
+    on_error: ErrorCallback | None
+    # Set only when instrumentation is enabled.
+    key: instrumentation.Key | None = None
+    queued_at_ns: int = 0
+
+
+@dataclass
+class _Channel:
+    node_id: int
+    sock: socket.socket
+    connected: bool = False
+    outgoing: deque[memoryview] = field(default_factory=deque)
+    assembler: FrameAssembler = field(default_factory=FrameAssembler)
+    # Responses come in the order of requests on one connection,
+    # but we still dispatch by correlation id and verify it.
+    in_flight: dict[int, _InFlight] = field(default_factory=dict)
+
+
+class Multiplexer:
+    # Drives non-blocking connections to many brokers from one thread.
+    # Nothing blocks except `poll`, which waits for socket readiness.
+
+    def __init__(self, brokers: Mapping[int, BrokerAddress]) -> None:
+        self._brokers = dict(brokers)
+        self._selector = selectors.DefaultSelector()
+        self._channels: dict[int, _Channel] = {}
+        self._receive_buffer = bytearray(RECEIVE_CHUNK_SIZE)
+        self._correlation_id = 0
+        # Raised by response callbacks without an error callback,
+        # re-raised from `poll` once all received frames are dispatched.
+        self._callback_errors: list[Exception] = []
+
+    def next_correlation_id(self) -> int:
+        self._correlation_id = (self._correlation_id + 1) % 2**31
+        return self._correlation_id
+
+    @property
+    def in_flight(self) -> int:
+        return sum(len(ch.in_flight) for ch in self._channels.values())
+
+    def send(
+        self,
+        node_id: int,
+        frame: bytes,
+        on_response: ResponseCallback,
+        on_error: ErrorCallback | None = None,
+    ) -> None:
+        # `frame` is a complete request with the size prefix,
+        # the correlation id follows the size, api_key and api_version.
+        correlation_id = read_int32(BytesIO(frame[8:12]))
+        channel = self._channels.get(node_id)
+        if channel is None:
+            channel = self._open(node_id)
+        if correlation_id in channel.in_flight:
+            raise ValueError(f"Correlation id {correlation_id} is already in flight")
+        in_flight = _InFlight(on_response, on_error)
+        metrics = instrumentation.metrics
+        if metrics is not None:
+            header = BytesIO(frame[4:8])
+            in_flight.key = (read_int16(header), read_int16(header), node_id)
+            # The latency includes the time in the outgoing queue.
+            in_flight.queued_at_ns = time.perf_counter_ns()
+            metrics.count_out(in_flight.key, len(frame))
+        channel.in_flight[correlation_id] = in_flight
+        channel.outgoing.append(memoryview(frame))
+        if channel.connected:
+            self._update_interest(channel)
+
+    def poll(self, timeout: float | None = None) -> int:
+        # Returns the number of dispatched responses.
+        dispatched = 0
+        for key, events in self._selector.select(timeout):
+            channel: _Channel = key.data
+            try:
+                if events & selectors.EVENT_WRITE:
+                    if not channel.connected:
+                        self._finish_connect(channel)
+                    self._write(channel)
+                if events & selectors.EVENT_READ:
+                    dispatched += self._read(channel)
+            except (OSError, ValueError) as e:
+                self._fail(channel, e)
+        if self._callback_errors:
+            error = self._callback_errors[0]
+            self._callback_errors.clear()
+            raise error
+        return dispatched
+
+    def run_until_idle(self, timeout: float | None = None) -> bool:
+        # Returns `False` if the timeout expired before all responses arrived.
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.in_flight > 0:
+            remaining = None
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+            self.poll(remaining)
+        return True
+
+    def close(self) -> None:
+        for channel in list(self._channels.values()):
+            self._fail(channel, ConnectionError("Multiplexer is closed"))
+        self._selector.close()
+
+    def _open(self, node_id: int) -> _Channel:
+        address = self._brokers.get(node_id)
+        if address is None:
+            raise ValueError(f"Unknown broker {node_id}")
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        sock.setblocking(False)
+        channel = _Channel(node_id=node_id, sock=sock)
+        result = sock.connect_ex(address)
+        if result not in (0, errno.EINPROGRESS, errno.EWOULDBLOCK):
+            sock.close()
+            raise ConnectionError(
+                f"Failed to connect to broker {node_id} at {address}: "
+                f"{errno.errorcode.get(result, result)}"
+            )
+        # Writability signals that the connection is established.
+        self._selector.register(sock, selectors.EVENT_WRITE, channel)
+        self._channels[node_id] = channel
+        return channel
+
+    def _finish_connect(self, channel: _Channel) -> None:
+        error = channel.sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+        if error != 0:
+            raise ConnectionError(
+                f"Failed to connect to broker {channel.node_id}: "
+                f"{errno.errorcode.get(error, error)}"
+            )
+        channel.connected = True
+
+    def _update_interest(self, channel: _Channel) -> None:
+        events = selectors.EVENT_READ
+        if channel.outgoing:
+            events |= selectors.EVENT_WRITE
+        self._selector.modify(channel.sock, events, channel)
+
+    def _write(self, channel: _Channel) -> None:
+        while channel.outgoing:
+            chunk = channel.outgoing[0]
+            try:
+                sent = channel.sock.send(chunk)
+            except BlockingIOError:
+                break
+            if sent < len(chunk):
+                # A partial write, the kernel buffer is full.
+                channel.outgoing[0] = chunk[sent:]
+                break
+            channel.outgoing.popleft()
+        self._update_interest(channel)
+
+    def _read(self, channel: _Channel) -> int:
+        dispatched = 0
+        view = memoryview(self._receive_buffer)
+        while True:
+            try:
+                n = channel.sock.recv_into(view)
+            except BlockingIOError:
+                break
+            if n == 0:
+                raise ConnectionError(f"Broker {channel.node_id} closed the connection")
+            for frame in channel.assembler.feed(view[:n]):
+                correlation_id = read_response_correlation_id(BytesIO(frame[:4]))
+                in_flight = channel.in_flight.pop(correlation_id, None)
+                if in_flight is None:
+                    raise ValueError(
+                        f"Unexpected correlation id {correlation_id} "
+                        f"from broker {channel.node_id}"
+                    )
+                metrics = instrumentation.metrics
+                if in_flight.key is not None and metrics is not None:
+                    metrics.record(
+                        instrumentation.LATENCY,
+                        in_flight.key,
+                        time.perf_counter_ns() - in_flight.queued_at_ns,
+                    )
+                    metrics.count_in(in_flight.key, 4 + len(frame))
+                # A failing callback fails only its own request,
+                # not the connection and the other requests on it.
+                try:
+                    in_flight.on_response(frame)
+                except Exception as e:
+                    if in_flight.on_error is not None:
+                        in_flight.on_error(e)
+                    else:
+                        self._callback_errors.append(e)
+                dispatched += 1
+            if n < len(view):
+                break
+        return dispatched
+
+    def _fail(self, channel: _Channel, error: Exception) -> None:
+        self._selector.unregister(channel.sock)
+        channel.sock.close()
+        del self._channels[channel.node_id]
+        for in_flight in channel.in_flight.values():
+            if in_flight.on_error is not None:
+                in_flight.on_error(error)
@@ -0,0 +1,280 @@
+from __future__ import annotations
+
+import socket
+import socketserver
+import threading
+from dataclasses import dataclass
+from typing import Any, Callable, Hashable, Iterable
+
+from api_registry import API_REGISTRY
+from api_versions_cache import BrokerAddress
+from field_spans import read_with_path
+from framing import receive_into
+from memory_reader import memory_reader
+from read_write import read_int32
+from request_response_headers import (
+    RequestHeaderV0,
+    RequestHeaderV1,
+    read_response_correlation_id,
+)
+
+# A protocol-aware proxy that doesn't decode the messages it forwards.
+# Only the request header is read, to learn the API, the correlation id
+# and the client id. Requests of all clients are sent over one upstream
+# connection, so their correlation ids are replaced with unique ones
+# and restored in the responses. The rest of a frame is forwarded as is,
+# from the buffer it was received into.
+#
+# Requests and responses of the API keys in `decode_api_keys` are also decoded,
+# if `api_registry` knows their versions, e.g. for auditing. Messages
+# that fail to decode are still forwarded.
+#
+# Produce requests with acks=0 get no response, they aren't supported.
+
+# Frames include the size prefix: they are forwarded whole.
+SIZE_PREFIX = 4
+# The offsets of correlation ids in request and response frames.
+REQUEST_CORRELATION_ID_OFFSET = SIZE_PREFIX + 4
+RESPONSE_CORRELATION_ID_OFFSET = SIZE_PREFIX
+
+
+@dataclass
+class ProxiedRequest:
+    # Where the request came from, e.g. the address of the client connection.
+    client: Hashable
+    api_key: int
+    api_version: int
+    # The client's.
+    correlation_id: int
+    upstream_correlation_id: int
+    client_id: str | None
+    # Decoded messages, only for `decode_api_keys`.
+    request: Any = None
+    response: Any = None
+    # Why `request` or `response` couldn't be decoded. The frame is forwarded anyway.
+    decode_error: ValueError | None = None
+
+
+RequestObserver = Callable[[ProxiedRequest], None]
+
+
+def _read_request_header(frame: memoryview) -> RequestHeaderV0 | RequestHeaderV1:
+    # Request headers v1 and v2 start the same way, tagged fields of v2
+    # aren't needed to forward the frame.
+    buffer = memory_reader(frame[SIZE_PREFIX:])
+    header = RequestHeaderV0.read(buffer)
+    # Only ControlledShutdown v0 uses request header v0, without the client id.
+    if header.request_api_key == 7 and header.request_api_version == 0:
+        return header
+    buffer.seek(0)
+    return RequestHeaderV1.read(buffer)
+
+
+def _read_body(header_type: Any, body_type: Any, frame: bytearray) -> Any:
+    # Decode errors name the broken field: the body is decoded once more
+    # with tracing when it fails, only then.
+    buffer = memory_reader(memoryview(frame)[SIZE_PREFIX:])
+    header_type.read(buffer)
+    return read_with_path(body_type.read, buffer)
+
+
+def _set_correlation_id(frame: bytearray, offset: int, correlation_id: int) -> None:
+    frame[offset : offset + 4] = correlation_id.to_bytes(4, "big", signed=True)
+
+
+def receive_frame_with_size(sock: socket.socket) -> bytearray:
+    # Like `framing.receive_frame`, but keeps the size prefix,
+    # so the frame can be forwarded without copying.
+    size_buffer = bytearray(SIZE_PREFIX)
+    receive_into(sock, memoryview(size_buffer))
+    message_size = read_int32(memory_reader(memoryview(size_buffer)))
+    if message_size < 0:
+        raise ValueError(f"Invalid frame size {message_size}")
+    frame = bytearray(SIZE_PREFIX + message_size)
+    frame[:SIZE_PREFIX] = size_buffer
+    receive_into(sock, memoryview(frame)[SIZE_PREFIX:])
+    return frame
+
+
+class ProxyEngine:
+    # Tracks requests in flight upstream. Doesn't touch sockets,
+    # frames are rewritten in place.
+
+    def __init__(self, decode_api_keys: Iterable[int] = ()) -> None:
+        self.decode_api_keys = frozenset(decode_api_keys)
+        self._lock = threading.Lock()
+        self._in_flight: dict[int, ProxiedRequest] = {}
+        self._correlation_id = 0
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._in_flight)
+
+    def request(self, client: Hashable, frame: bytearray) -> ProxiedRequest:
+        header = _read_request_header(memoryview(frame))
+        proxied = ProxiedRequest(
+            client=client,
+            api_key=header.request_api_key,
+            api_version=header.request_api_version,
+            correlation_id=header.correlation_id,
+            upstream_correlation_id=0,
+            client_id=getattr(header, "client_id", None),
+        )
+        spec = self._spec(proxied)
+        if spec is not None:
+            try:
+                proxied.request = _read_body(
+                    spec.request_header_type, spec.request_type, frame
+                )
+            except ValueError as e:
+                proxied.decode_error = e
+        with self._lock:
+            while True:
+                self._correlation_id = (self._correlation_id + 1) % 2**31
+                if self._correlation_id not in self._in_flight:
+                    break
+            proxied.upstream_correlation_id = self._correlation_id
+            self._in_flight[self._correlation_id] = proxied
+        _set_correlation_id(
+            frame, REQUEST_CORRELATION_ID_OFFSET, proxied.upstream_correlation_id
+        )
+        return proxied
+
+    def response(self, frame: bytearray) -> ProxiedRequest:
+        correlation_id = read_response_correlation_id(
+            memory_reader(memoryview(frame)[SIZE_PREFIX:])
+        )
+        with self._lock:
+            proxied = self._in_flight.pop(correlation_id, None)
+        if proxied is None:
+            raise ValueError(f"Unexpected correlation id {correlation_id}")
+        _set_correlation_id(
+            frame, RESPONSE_CORRELATION_ID_OFFSET, proxied.correlation_id
+        )
+        spec = self._spec(proxied)
+        if spec is not None:
+            # E.g. brokers answer ApiVersions requests of versions they don't
+            # support with an error in the v0 format.
+            try:
+                proxied.response = _read_body(
+                    spec.response_header_type, spec.response_type, frame
+                )
+            except ValueError as e:
+                proxied.decode_error = e
+        return proxied
+
+    def _spec(self, proxied: ProxiedRequest) -> Any:
+        if proxied.api_key not in self.decode_api_keys:
+            return None
+        return API_REGISTRY.get((proxied.api_key, proxied.api_version))
+
+
+class Proxy:
+    # Listens on a local port and forwards to one broker.
+    # Each client connection is served by its own thread,
+    # responses are read from upstream by one more.
+
+    def __init__(
+        self,
+        upstream: BrokerAddress,
+        decode_api_keys: Iterable[int] = (),
+        on_request: RequestObserver | None = None,
+        on_response: RequestObserver | None = None,
+    ) -> None:
+        self.upstream = upstream
+        self.engine = ProxyEngine(decode_api_keys)
+        self.on_request = on_request
+        self.on_response = on_response
+        self._upstream_sock: socket.socket | None = None
+        self._upstream_lock = threading.Lock()
+        self._clients: dict[Hashable, socket.socket] = {}
+        self._clients_lock = threading.Lock()
+
+        proxy = self
+
+        class Handler(socketserver.BaseRequestHandler):
+            def handle(self) -> None:
+                proxy._serve(self.request, self.client_address)
+
+        self._server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._upstream_thread = threading.Thread(
+            target=self._serve_upstream, daemon=True
+        )
+
+    @property
+    def address(self) -> tuple[str, int]:
+        host, port = self._server.server_address[:2]
+        return str(host), int(port)
+
+    def start(self) -> Proxy:
+        sock = socket.create_connection(self.upstream)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._upstream_sock = sock
+        self._upstream_thread.start()
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+        if self._upstream_sock is not None:
+            self._upstream_sock.shutdown(socket.SHUT_RDWR)
+            self._upstream_sock.close()
+            self._upstream_thread.join()
+
+    def __enter__(self) -> Proxy:
+        return self.start()
+
+    def __exit__(self, *args: object) -> None:
+        self.stop()
+
+    def _serve(self, sock: socket.socket, client: Hashable) -> None:
+        assert self._upstream_sock is not None
+        with self._clients_lock:
+            self._clients[client] = sock
+        try:
+            while True:
+                try:
+                    frame = receive_frame_with_size(sock)
+                    proxied = self.engine.request(client, frame)
+                except (ConnectionError, OSError, ValueError):
+                    # Like brokers, close the connection on garbage.
+                    return
+                if self.on_request is not None:
+                    self.on_request(proxied)
+                with self._upstream_lock:
+                    self._upstream_sock.sendall(frame)
+        finally:
+            # Responses to its requests still in flight are dropped when they come.
+            with self._clients_lock:
+                del self._clients[client]
+
+    def _serve_upstream(self) -> None:
+        assert self._upstream_sock is not None
+        try:
+            while True:
+                frame = receive_frame_with_size(self._upstream_sock)
+                proxied = self.engine.response(frame)
+                if self.on_response is not None:
+                    self.on_response(proxied)
+                with self._clients_lock:
+                    sock = self._clients.get(proxied.client)
+                if sock is None:
+                    continue
+                try:
+                    sock.sendall(frame)
+                except OSError:
+                    # The client went away, its handler cleans up.
+                    pass
+        except (ConnectionError, OSError, ValueError):
+            # Without the broker, clients can't be served.
+            with self._clients_lock:
+                clients = list(self._clients.values())
+            for sock in clients:
+                try:
+                    sock.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
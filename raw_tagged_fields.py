@@ -3,6 +3,7 @@ from dataclasses import dataclass
 from typing import BinaryIO
 
 from read_write import (
+    check_length,
     read_unsigned_varint,
     read_exact,
     write_unsigned_varint,
@@ -20,6 +21,7 @@ class RawTaggedField:
     def read(cls, buffer: BinaryIO) -> RawTaggedField:
         tag = read_unsigned_varint(buffer)
         size = read_unsigned_varint(buffer)
+        check_length(size, buffer, 1, "tagged field")
         data = read_exact(buffer, size)
         return RawTaggedField(tag=tag, data=data)
 
@@ -34,6 +36,8 @@ def read_unknown_tagged_fields(buffer: BinaryIO) -> list[RawTaggedField]:
     # we need to compensate the length shift that
     # `read_array_length` applies in the compact mode.
     size = read_array_length(buffer, True) + 1
+    # The tag and the size take at least a byte each.
+    check_length(size, buffer, 2, "tagged fields")
     result = []
     for _ in range(size):
         result.append(RawTaggedField.read(buffer))
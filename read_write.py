@@ -1,21 +1,63 @@
 from __future__ import annotations
 
+import io
 import struct
-from typing import BinaryIO, Callable, TypeVar, Final
+from typing import Any, BinaryIO, Callable, TypeVar, Final
 from uuid import UUID
 
 UUID_ZERO: Final = UUID(int=0)
+UUID_ZERO_BYTES: Final = bytes(16)
 
 T = TypeVar("T")
 
 
+class DecodeError(ValueError):
+    # Corrupt or truncated input. `path` is the field being decoded,
+    # e.g. `topics[2].partitions`, when known: the codecs don't track it,
+    # `field_spans.read_with_path` finds it after the fact.
+
+    def __init__(self, message: str, path: str | None = None) -> None:
+        super().__init__(message)
+        self.message = message
+        self.path = path
+
+    def __str__(self) -> str:
+        if self.path is None:
+            return self.message
+        return f"{self.path}: {self.message}"
+
+
 def read_exact(buffer: BinaryIO, num_bytes: int) -> bytes:
     value = buffer.read(num_bytes)
     if len(value) != num_bytes:
-        raise ValueError(f"Buffer underflow: expected {num_bytes}, got {len(value)}")
+        raise DecodeError(f"Buffer underflow: expected {num_bytes}, got {len(value)}")
     return value
 
 
+def remaining(buffer: BinaryIO) -> int | None:
+    # Bytes left in a seekable buffer (`BytesIO`, `memory_reader`),
+    # `None` for streams of unknown length.
+    # Not with `getbuffer`: a `BytesIO` made of `bytes` would copy them.
+    try:
+        pos = buffer.tell()
+        end = buffer.seek(0, io.SEEK_END)
+    except OSError:
+        return None
+    buffer.seek(pos)
+    return end - pos
+
+
+def check_length(length: int, buffer: BinaryIO, min_size: int, what: str) -> None:
+    # Before reading `length` elements of at least `min_size` bytes each,
+    # makes sure the buffer can have them, so that a corrupt length
+    # fails at once instead of after a long loop or a large allocation.
+    left = remaining(buffer)
+    if left is not None and length * min_size > left:
+        raise DecodeError(
+            f"{what} of length {length} doesn't fit in the remaining {left} bytes"
+        )
+
+
 def read_int8(buffer: BinaryIO) -> int:
     return int.from_bytes(read_exact(buffer, 1), byteorder="big", signed=True)
 
@@ -79,6 +121,17 @@ def write_uint16(value: int, buffer: BinaryIO) -> None:
         raise ValueError(f"Value {value} is out of range for UINT16")
 
 
+def read_uint32(buffer: BinaryIO) -> int:
+    return int.from_bytes(read_exact(buffer, 4), byteorder="big", signed=False)
+
+
+def write_uint32(value: int, buffer: BinaryIO) -> None:
+    if 0 <= value <= 2**32 - 1:
+        buffer.write(value.to_bytes(4, byteorder="big", signed=False))
+    else:
+        raise ValueError(f"Value {value} is out of range for UINT32")
+
+
 def read_float64(buffer: BinaryIO) -> float:
     return struct.unpack(">d", read_exact(buffer, 8))[0]
 
@@ -101,7 +154,7 @@ def read_unsigned_varint(buffer: BinaryIO) -> int:
         if byte & 0b1000_0000 == 0:
             return result
     else:
-        raise ValueError("Varint is too long, most significant bit in 5th byte is set")
+        raise DecodeError("Varint is too long, most significant bit in 5th byte is set")
 
 
 def write_unsigned_varint(value: int, buffer: BinaryIO) -> None:
@@ -119,9 +172,63 @@ def write_unsigned_varint(value: int, buffer: BinaryIO) -> None:
         written = True
 
 
+def _read_unsigned_varlong(buffer: BinaryIO, max_bytes: int) -> int:
+    result = 0
+    for i in range(max_bytes):
+        byte = int.from_bytes(read_exact(buffer, 1), byteorder="big", signed=False)
+        result |= (byte & 0b111_1111) << (7 * i)
+        if byte & 0b1000_0000 == 0:
+            return result
+    raise DecodeError(
+        f"Varint is too long, most significant bit in byte {max_bytes} is set"
+    )
+
+
+def _write_unsigned_varlong(value: int, buffer: BinaryIO) -> None:
+    while True:
+        byte_to_write = value & 0b111_1111
+        value >>= 7
+        if value == 0:
+            buffer.write(byte_to_write.to_bytes(1, byteorder="big", signed=False))
+            return
+        buffer.write(
+            (byte_to_write | 0b1000_0000).to_bytes(1, byteorder="big", signed=False)
+        )
+
+
+# Signed varints (used in records) are zigzag-encoded,
+# so small negative numbers take few bytes too: 0, -1, 1, -2, 2... -> 0, 1, 2, 3, 4...
+
+
+def read_varint(buffer: BinaryIO) -> int:
+    value = _read_unsigned_varlong(buffer, 5)
+    return (value >> 1) ^ -(value & 1)
+
+
+def write_varint(value: int, buffer: BinaryIO) -> None:
+    if -(2**31) <= value <= 2**31 - 1:
+        _write_unsigned_varlong(((value << 1) ^ (value >> 31)) & 0xFFFF_FFFF, buffer)
+    else:
+        raise ValueError(f"Value {value} is out of range for VARINT")
+
+
+def read_varlong(buffer: BinaryIO) -> int:
+    value = _read_unsigned_varlong(buffer, 10)
+    return (value >> 1) ^ -(value & 1)
+
+
+def write_varlong(value: int, buffer: BinaryIO) -> None:
+    if -(2**63) <= value <= 2**63 - 1:
+        _write_unsigned_varlong(
+            ((value << 1) ^ (value >> 63)) & 0xFFFF_FFFF_FFFF_FFFF, buffer
+        )
+    else:
+        raise ValueError(f"Value {value} is out of range for VARLONG")
+
+
 def read_uuid(buffer: BinaryIO) -> UUID | None:
     byte_value: bytes = read_exact(buffer, 16)
-    if byte_value == UUID_ZERO.bytes:
+    if byte_value == UUID_ZERO_BYTES:
         return None
     else:
         return UUID(bytes=byte_value)
@@ -129,15 +236,53 @@ def read_uuid(buffer: BinaryIO) -> UUID | None:
 
 def write_uuid(value: UUID | None, buffer: BinaryIO) -> None:
     if value is None:
-        buffer.write(UUID_ZERO.bytes)
+        buffer.write(UUID_ZERO_BYTES)
     else:
         buffer.write(value.bytes)
 
 
+# UUIDs as the raw 16 bytes or as 128-bit ints, without creating `UUID` objects.
+# Both are hashable and can be used as keys, e.g. for topic IDs.
+
+
+def read_uuid_bytes(buffer: BinaryIO) -> bytes | None:
+    byte_value: bytes = read_exact(buffer, 16)
+    if byte_value == UUID_ZERO_BYTES:
+        return None
+    else:
+        return byte_value
+
+
+def write_uuid_bytes(value: bytes | None, buffer: BinaryIO) -> None:
+    if value is None:
+        buffer.write(UUID_ZERO_BYTES)
+    elif len(value) == 16:
+        buffer.write(value)
+    else:
+        raise ValueError(f"UUID must be 16 bytes, got {len(value)}")
+
+
+def read_uuid_int(buffer: BinaryIO) -> int | None:
+    value = int.from_bytes(read_exact(buffer, 16), byteorder="big")
+    if value == 0:
+        return None
+    else:
+        return value
+
+
+def write_uuid_int(value: int | None, buffer: BinaryIO) -> None:
+    if value is None:
+        buffer.write(UUID_ZERO_BYTES)
+    elif 0 <= value < 2**128:
+        buffer.write(value.to_bytes(16, byteorder="big"))
+    else:
+        raise ValueError(f"Value {value} is out of range for UUID")
+
+
 def read_string(buffer: BinaryIO, compact: bool) -> str:
     result = read_nullable_string(buffer, compact)
     if result is None:
-        raise ValueError("Non-nullable field was serialized as null")
+        raise DecodeError("Non-nullable field was serialized as null")
     return result
 
 
@@ -158,7 +303,7 @@ def read_string_length(buffer: BinaryIO, compact: bool) -> int:
     else:
         length = read_int16(buffer)
     if length < -1 or length > 2**15 - 1:
-        raise ValueError(f"string has invalid length {length}")
+        raise DecodeError(f"string has invalid length {length}")
     return length
 
 
@@ -190,18 +335,19 @@ def write_string_length(length: int, buffer: BinaryIO, compact: bool) -> None:
 def read_bytes(buffer: BinaryIO, compact: bool) -> bytes:
     result = read_nullable_bytes(buffer, compact)
     if result is None:
-        raise ValueError("Non-nullable field was serialized as null")
+        raise DecodeError("Non-nullable field was serialized as null")
     return result
 
 
 def read_nullable_bytes(buffer: BinaryIO, compact: bool) -> bytes | None:
     length = read_array_length(buffer, compact)
     if length < -1 or length > 2**31 - 1:
-        raise ValueError(f"bytes has invalid length {length}")
+        raise DecodeError(f"bytes has invalid length {length}")
 
     if length == -1:
         return None
     else:
+        check_length(length, buffer, 1, "bytes")
         return read_exact(buffer, length)
 
 
@@ -243,7 +389,7 @@ def read_array(
 ) -> list[T]:
     result = read_nullable_array(read_element, buffer, compact)
     if result is None:
-        raise ValueError("Non-nullable field was serialized as null")
+        raise DecodeError("Non-nullable field was serialized as null")
     return result
 
 
@@ -253,7 +399,10 @@ def read_nullable_array(
     length = read_array_length(buffer, compact)
     if length == -1:
         return None
+    elif length < -1:
+        raise DecodeError(f"array has invalid length {length}")
     else:
+        check_length(length, buffer, MIN_SIZES.get(read_element, 1), "array")
         array = []
         for _ in range(length):
             array.append(read_element(buffer))
@@ -281,3 +430,20 @@ def write_nullable_array(
         write_array_length(len(array), buffer, compact)
         for el in array:
             write_element(el, buffer)
+
+
+# The smallest encoded size of array elements. Anything else,
+# e.g. a message, is assumed to take at least 1 byte.
+MIN_SIZES: Final[dict[Callable[[BinaryIO], Any], int]] = {
+    read_int8: 1,
+    read_boolean: 1,
+    read_int16: 2,
+    read_uint16: 2,
+    read_int32: 4,
+    read_uint32: 4,
+    read_int64: 8,
+    read_float64: 8,
+    read_uuid: 16,
+    read_uuid_bytes: 16,
+    read_uuid_int: 16,
+}
@@ -0,0 +1,351 @@
+from __future__ import annotations
+
+import struct
+from typing import BinaryIO, Callable, Final, Iterable, TypeVar
+from uuid import UUID
+
+from read_write import UUID_ZERO_BYTES
+
+# The "trusted" tier of `read_write`: the same functions with the same
+# signatures and byte-identical output, but without the per-call range and
+# length checks. Meant for values that are already known to be valid,
+# e.g. when re-encoding a message decoded by the strict tier.
+# Validate once per message or array with `check_range` and
+# `check_string_lengths` instead, as `MetadataResponseV12.write_unchecked` does.
+#
+# Not everything invalid is caught. Fixed-size numbers are still refused by
+# `struct` when out of range or cut short, with `struct.error` instead of
+# `ValueError`. But varints are masked to their width, strings and bytes
+# cut short are returned truncated, and lengths aren't checked at all.
+# Decode untrusted input with `read_write`.
+
+T = TypeVar("T")
+
+_INT8: Final = struct.Struct(">b")
+_INT16: Final = struct.Struct(">h")
+_INT32: Final = struct.Struct(">i")
+_INT64: Final = struct.Struct(">q")
+_UINT16: Final = struct.Struct(">H")
+_UINT32: Final = struct.Struct(">I")
+_FLOAT64: Final = struct.Struct(">d")
+
+# Most varints in the protocol (lengths, counts, tags) fit in a single byte.
+_SMALL_VARINTS: Final = [bytes([i]) for i in range(128)]
+
+INT8_RANGE: Final = (-(2**7), 2**7 - 1)
+INT16_RANGE: Final = (-(2**15), 2**15 - 1)
+INT32_RANGE: Final = (-(2**31), 2**31 - 1)
+INT64_RANGE: Final = (-(2**63), 2**63 - 1)
+UINT16_RANGE: Final = (0, 2**16 - 1)
+UINT32_RANGE: Final = (0, 2**32 - 1)
+UNSIGNED_VARINT_RANGE: Final = (0, 2**31 - 1)
+MAX_STRING_LENGTH: Final = 2**15 - 1
+
+
+def check_range(values: Iterable[int], value_range: tuple[int, int], name: str) -> None:
+    # One pass of `min`/`max` in C instead of a comparison per value in Python.
+    values = values if isinstance(values, (list, tuple)) else list(values)
+    if not values:
+        return
+    low, high = min(values), max(values)
+    if low < value_range[0]:
+        raise ValueError(f"Value {low} is out of range for {name}")
+    if high > value_range[1]:
+        raise ValueError(f"Value {high} is out of range for {name}")
+
+
+def check_string_lengths(values: Iterable[str | None]) -> None:
+    # A character takes at most 4 bytes in UTF-8,
+    # so only long strings have to be encoded to be checked.
+    for value in values:
+        if value is not None and len(value) > MAX_STRING_LENGTH // 4:
+            length = len(value.encode(encoding="utf-8"))
+            if length > MAX_STRING_LENGTH:
+                raise ValueError(f"string has invalid length {length}")
+
+
+def read_exact(buffer: BinaryIO, num_bytes: int) -> bytes:
+    return buffer.read(num_bytes)
+
+
+def read_int8(buffer: BinaryIO) -> int:
+    return int(_INT8.unpack(buffer.read(1))[0])
+
+
+def write_int8(value: int, buffer: BinaryIO) -> None:
+    buffer.write(_INT8.pack(value))
+
+
+def read_boolean(buffer: BinaryIO) -> bool:
+    return buffer.read(1) != b"\x00"
+
+
+def write_boolean(value: bool, buffer: BinaryIO) -> None:
+    buffer.write(b"\x01" if value is True else b"\x00")
+
+
+def read_int16(buffer: BinaryIO) -> int:
+    return int(_INT16.unpack(buffer.read(2))[0])
+
+
+def write_int16(value: int, buffer: BinaryIO) -> None:
+    buffer.write(_INT16.pack(value))
+
+
+def read_int32(buffer: BinaryIO) -> int:
+    return int(_INT32.unpack(buffer.read(4))[0])
+
+
+def write_int32(value: int, buffer: BinaryIO) -> None:
+    buffer.write(_INT32.pack(value))
+
+
+def read_int64(buffer: BinaryIO) -> int:
+    return int(_INT64.unpack(buffer.read(8))[0])
+
+
+def write_int64(value: int, buffer: BinaryIO) -> None:
+    buffer.write(_INT64.pack(value))
+
+
+def read_uint16(buffer: BinaryIO) -> int:
+    return int(_UINT16.unpack(buffer.read(2))[0])
+
+
+def write_uint16(value: int, buffer: BinaryIO) -> None:
+    buffer.write(_UINT16.pack(value))
+
+
+def read_uint32(buffer: BinaryIO) -> int:
+    return int(_UINT32.unpack(buffer.read(4))[0])
+
+
+def write_uint32(value: int, buffer: BinaryIO) -> None:
+    buffer.write(_UINT32.pack(value))
+
+
+def read_float64(buffer: BinaryIO) -> float:
+    return float(_FLOAT64.unpack(buffer.read(8))[0])
+
+
+def write_float64(value: float, buffer: BinaryIO) -> None:
+    buffer.write(_FLOAT64.pack(value))
+
+
+def read_unsigned_varint(buffer: BinaryIO) -> int:
+    byte = buffer.read(1)[0]
+    if byte < 0b1000_0000:
+        return byte
+    result = byte & 0b111_1111
+    shift = 7
+    while True:
+        byte = buffer.read(1)[0]
+        result |= (byte & 0b111_1111) << shift
+        if byte < 0b1000_0000:
+            return result
+        shift += 7
+
+
+def write_unsigned_varint(value: int, buffer: BinaryIO) -> None:
+    # Negative values fail in `bytearray.append`.
+    if 0 <= value < 0b1000_0000:
+        buffer.write(_SMALL_VARINTS[value])
+        return
+    result = bytearray()
+    while value >= 0b1000_0000:
+        result.append((value & 0b111_1111) | 0b1000_0000)
+        value >>= 7
+    result.append(value)
+    buffer.write(result)
+
+
+def read_varint(buffer: BinaryIO) -> int:
+    value = read_unsigned_varint(buffer)
+    return (value >> 1) ^ -(value & 1)
+
+
+def write_varint(value: int, buffer: BinaryIO) -> None:
+    write_unsigned_varint(((value << 1) ^ (value >> 31)) & 0xFFFF_FFFF, buffer)
+
+
+def read_varlong(buffer: BinaryIO) -> int:
+    value = read_unsigned_varint(buffer)
+    return (value >> 1) ^ -(value & 1)
+
+
+def write_varlong(value: int, buffer: BinaryIO) -> None:
+    write_unsigned_varint(
+        ((value << 1) ^ (value >> 63)) & 0xFFFF_FFFF_FFFF_FFFF, buffer
+    )
+
+
+def read_uuid(buffer: BinaryIO) -> UUID | None:
+    byte_value = buffer.read(16)
+    if byte_value == UUID_ZERO_BYTES:
+        return None
+    return UUID(bytes=byte_value)
+
+
+def write_uuid(value: UUID | None, buffer: BinaryIO) -> None:
+    buffer.write(UUID_ZERO_BYTES if value is None else value.bytes)
+
+
+def read_uuid_bytes(buffer: BinaryIO) -> bytes | None:
+    byte_value = buffer.read(16)
+    if byte_value == UUID_ZERO_BYTES:
+        return None
+    return byte_value
+
+
+def write_uuid_bytes(value: bytes | None, buffer: BinaryIO) -> None:
+    buffer.write(UUID_ZERO_BYTES if value is None else value)
+
+
+def read_uuid_int(buffer: BinaryIO) -> int | None:
+    return int.from_bytes(buffer.read(16), byteorder="big") or None
+
+
+def write_uuid_int(value: int | None, buffer: BinaryIO) -> None:
+    buffer.write(value.to_bytes(16, byteorder="big") if value else UUID_ZERO_BYTES)
+
+
+def read_string_length(buffer: BinaryIO, compact: bool) -> int:
+    if compact:
+        return read_unsigned_varint(buffer) - 1
+    return read_int16(buffer)
+
+
+def read_string(buffer: BinaryIO, compact: bool) -> str:
+    return buffer.read(read_string_length(buffer, compact)).decode(encoding="utf-8")
+
+
+def read_nullable_string(buffer: BinaryIO, compact: bool) -> str | None:
+    length = read_string_length(buffer, compact)
+    if length == -1:
+        return None
+    return buffer.read(length).decode(encoding="utf-8")
+
+
+def write_string_length(length: int, buffer: BinaryIO, compact: bool) -> None:
+    if compact:
+        write_unsigned_varint(length + 1, buffer)
+    else:
+        buffer.write(_INT16.pack(length))
+
+
+def write_string(value: str, buffer: BinaryIO, compact: bool) -> None:
+    value_b = value.encode(encoding="utf-8")
+    write_string_length(len(value_b), buffer, compact)
+    buffer.write(value_b)
+
+
+def write_nullable_string(value: str | None, buffer: BinaryIO, compact: bool) -> None:
+    if value is None:
+        write_string_length(-1, buffer, compact)
+    else:
+        write_string(value, buffer, compact)
+
+
+def read_array_length(buffer: BinaryIO, compact: bool) -> int:
+    if compact:
+        return read_unsigned_varint(buffer) - 1
+    return read_int32(buffer)
+
+
+def read_bytes(buffer: BinaryIO, compact: bool) -> bytes:
+    return buffer.read(read_array_length(buffer, compact))
+
+
+def read_nullable_bytes(buffer: BinaryIO, compact: bool) -> bytes | None:
+    length = read_array_length(buffer, compact)
+    if length == -1:
+        return None
+    return buffer.read(length)
+
+
+def write_array_length(length: int, buffer: BinaryIO, compact: bool) -> None:
+    if compact:
+        write_unsigned_varint(length + 1, buffer)
+    else:
+        buffer.write(_INT32.pack(length))
+
+
+def write_bytes(value: bytes, buffer: BinaryIO, compact: bool) -> None:
+    write_array_length(len(value), buffer, compact)
+    buffer.write(value)
+
+
+def write_nullable_bytes(value: bytes | None, buffer: BinaryIO, compact: bool) -> None:
+    if value is None:
+        write_array_length(-1, buffer, compact)
+    else:
+        write_bytes(value, buffer, compact)
+
+
+def read_array(
+    read_element: Callable[[BinaryIO], T], buffer: BinaryIO, compact: bool
+) -> list[T]:
+    return [read_element(buffer) for _ in range(read_array_length(buffer, compact))]
+
+
+def read_nullable_array(
+    read_element: Callable[[BinaryIO], T], buffer: BinaryIO, compact: bool
+) -> list[T] | None:
+    length = read_array_length(buffer, compact)
+    if length == -1:
+        return None
+    return [read_element(buffer) for _ in range(length)]
+
+
+def write_array(
+    array: list[T],
+    write_element: Callable[[T, BinaryIO], None],
+    buffer: BinaryIO,
+    compact: bool,
+) -> None:
+    write_array_length(len(array), buffer, compact)
+    for el in array:
+        write_element(el, buffer)
+
+
+def write_nullable_array(
+    array: list[T] | None,
+    write_element: Callable[[T, BinaryIO], None],
+    buffer: BinaryIO,
+    compact: bool,
+) -> None:
+    if array is None:
+        write_array_length(-1, buffer, compact)
+    else:
+        write_array(array, write_element, buffer, compact)
+
+
+# Arrays of fixed-size numbers (e.g. replica node ids) are packed
+# and unpacked with one `struct` call for the whole array.
+
+# Short arrays are the common case, their formats are prepared once.
+_INT32_ARRAYS: Final = [struct.Struct(f">{n}i") for n in range(17)]
+
+
+def read_int32_array(buffer: BinaryIO, compact: bool) -> list[int]:
+    length = read_array_length(buffer, compact)
+    return list(struct.unpack(f">{length}i", buffer.read(4 * length)))
+
+
+def write_int32_array(array: list[int], buffer: BinaryIO, compact: bool) -> None:
+    length = len(array)
+    write_array_length(length, buffer, compact)
+    if length < len(_INT32_ARRAYS):
+        buffer.write(_INT32_ARRAYS[length].pack(*array))
+    else:
+        buffer.write(struct.pack(f">{length}i", *array))
+
+
+def read_int64_array(buffer: BinaryIO, compact: bool) -> list[int]:
+    length = read_array_length(buffer, compact)
+    return list(struct.unpack(f">{length}q", buffer.read(8 * length)))
+
+
+def write_int64_array(array: list[int], buffer: BinaryIO, compact: bool) -> None:
+    write_array_length(len(array), buffer, compact)
+    buffer.write(struct.pack(f">{len(array)}q", *array))
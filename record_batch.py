@@ -0,0 +1,390 @@
+from __future__ import annotations
+
+import gzip
+import struct
+from dataclasses import dataclass
+from io import BytesIO
+from typing import BinaryIO, Final, Iterator
+
+from memory_reader import memory_reader
+from read_write import (
+    DecodeError,
+    check_length,
+    read_exact,
+    read_int8,
+    read_int16,
+    read_int32,
+    read_int64,
+    read_uint32,
+    read_varint,
+    read_varlong,
+    write_int8,
+    write_int16,
+    write_int32,
+    write_int64,
+    write_uint32,
+    write_varint,
+    write_varlong,
+)
+
+# The `records` field of Fetch responses and the `.log` segment files
+# contain the same thing: a sequence of record batches (magic 2)
+# or, in older formats, of messages (magic 0 and 1).
+# Both start with the offset, the size of the rest and 4 more bytes
+# (partition leader epoch or CRC), then comes the magic byte.
+BATCH_PREFIX: Final = struct.Struct(">qi")
+LOG_OVERHEAD: Final = BATCH_PREFIX.size
+MAGIC_OFFSET: Final = 16
+# The offset of `last_offset_delta` in a v2 batch.
+LAST_OFFSET_DELTA_OFFSET: Final = 23
+# The offset of the first byte covered by the CRC in a v2 batch.
+CRC_START_OFFSET: Final = 21
+# The offset of `max_timestamp` in a v2 batch.
+MAX_TIMESTAMP_OFFSET: Final = 35
+# The offset of `timestamp` in a v1 message.
+LEGACY_TIMESTAMP_OFFSET: Final = 18
+
+COMPRESSION_CODEC_MASK: Final = 0x07
+COMPRESSION_NONE: Final = 0
+COMPRESSION_GZIP: Final = 1
+TIMESTAMP_TYPE_MASK: Final = 0x08
+TRANSACTIONAL_FLAG_MASK: Final = 0x10
+CONTROL_FLAG_MASK: Final = 0x20
+# The length, attributes, timestamp and offset deltas, key and value lengths
+# and headers count, each at least a byte.
+MIN_RECORD_SIZE: Final = 7
+
+try:
+    from crc32c import crc32c as _crc32c_native  # type: ignore[import-not-found]
+except ImportError:
+    _crc32c_native = None
+
+
+def _make_crc32c_table() -> list[int]:
+    table = []
+    for i in range(256):
+        crc = i
+        for _ in range(8):
+            crc = (crc >> 1) ^ 0x82F63B78 if crc & 1 else crc >> 1
+        table.append(crc)
+    return table
+
+
+_CRC32C_TABLE: Final = _make_crc32c_table()
+
+
+def crc32c(data: bytes | bytearray | memoryview) -> int:
+    # Record batches use CRC-32C (Castagnoli), which is not in the standard library.
+    # The `crc32c` package is used when installed, it's much faster.
+    if _crc32c_native is not None:
+        return int(_crc32c_native(data))
+    crc = 0xFFFFFFFF
+    table = _CRC32C_TABLE
+    for b in bytes(data):
+        crc = table[(crc ^ b) & 0xFF] ^ (crc >> 8)
+    return crc ^ 0xFFFFFFFF
+
+
+@dataclass
+class RecordHeader:
+    key: str
+    value: bytes | None
+
+    @classmethod
+    def read(cls, buffer: BinaryIO) -> RecordHeader:
+        key_length = read_varint(buffer)
+        # Header keys can't be null.
+        if key_length < 0:
+            raise DecodeError(f"record header key has invalid length {key_length}")
+        key = read_exact(buffer, key_length).decode(encoding="utf-8")
+        value_length = read_varint(buffer)
+        value = None if value_length < 0 else read_exact(buffer, value_length)
+        return RecordHeader(key=key, value=value)
+
+    def write(self, buffer: BinaryIO) -> None:
+        key_b = self.key.encode(encoding="utf-8")
+        write_varint(len(key_b), buffer)
+        buffer.write(key_b)
+        _write_varint_bytes(self.value, buffer)
+
+
+@dataclass
+class Record:
+    attributes: int
+    timestamp_delta: int
+    offset_delta: int
+    key: bytes | None
+    value: bytes | None
+    headers: list[RecordHeader]
+
+    @classmethod
+    def read(cls, buffer: BinaryIO) -> Record:
+        # The length is implied by the fields.
+        read_varint(buffer)
+        return Record(
+            attributes=read_int8(buffer),
+            timestamp_delta=read_varlong(buffer),
+            offset_delta=read_varint(buffer),
+            key=_read_varint_bytes(buffer),
+            value=_read_varint_bytes(buffer),
+            headers=_read_headers(buffer),
+        )
+
+    def write(self, buffer: BinaryIO) -> None:
+        body = BytesIO()
+        write_int8(self.attributes, body)
+        write_varlong(self.timestamp_delta, body)
+        write_varint(self.offset_delta, body)
+        _write_varint_bytes(self.key, body)
+        _write_varint_bytes(self.value, body)
+        write_varint(len(self.headers), body)
+        for header in self.headers:
+            header.write(body)
+        write_varint(body.tell(), buffer)
+        buffer.write(body.getbuffer())
+
+
+def _read_headers(buffer: BinaryIO) -> list[RecordHeader]:
+    count = read_varint(buffer)
+    # The key and value lengths take at least a byte each.
+    check_length(count, buffer, 2, "record headers")
+    return [RecordHeader.read(buffer) for _ in range(count)]
+
+
+def _read_varint_bytes(buffer: BinaryIO) -> bytes | None:
+    length = read_varint(buffer)
+    if length < 0:
+        return None
+    return read_exact(buffer, length)
+
+
+def _write_varint_bytes(value: bytes | None, buffer: BinaryIO) -> None:
+    if value is None:
+        write_varint(-1, buffer)
+    else:
+        write_varint(len(value), buffer)
+        buffer.write(value)
+
+
+@dataclass
+class RecordBatch:
+    base_offset: int
+    partition_leader_epoch: int
+    magic: int
+    crc: int
+    attributes: int
+    last_offset_delta: int
+    base_timestamp: int
+    max_timestamp: int
+    producer_id: int
+    producer_epoch: int
+    base_sequence: int
+    records: list[Record]
+
+    @property
+    def last_offset(self) -> int:
+        return self.base_offset + self.last_offset_delta
+
+    @property
+    def compression(self) -> int:
+        return self.attributes & COMPRESSION_CODEC_MASK
+
+    @property
+    def is_control(self) -> bool:
+        return self.attributes & CONTROL_FLAG_MASK != 0
+
+    @classmethod
+    def read(cls, buffer: BinaryIO) -> RecordBatch:
+        base_offset = read_int64(buffer)
+        batch_length = read_int32(buffer)
+        # Everything after the length.
+        start = buffer.tell()
+        partition_leader_epoch = read_int32(buffer)
+        magic = read_int8(buffer)
+        if magic != 2:
+            raise ValueError(f"Unsupported record batch magic {magic}")
+        crc = read_uint32(buffer)
+        attributes = read_int16(buffer)
+        last_offset_delta = read_int32(buffer)
+        base_timestamp = read_int64(buffer)
+        max_timestamp = read_int64(buffer)
+        producer_id = read_int64(buffer)
+        producer_epoch = read_int16(buffer)
+        base_sequence = read_int32(buffer)
+        records_count = read_int32(buffer)
+
+        records_buffer = buffer
+        compression = attributes & COMPRESSION_CODEC_MASK
+        if compression == COMPRESSION_GZIP:
+            compressed = read_exact(buffer, start + batch_length - buffer.tell())
+            records_buffer = BytesIO(gzip.decompress(compressed))
+        elif compression != COMPRESSION_NONE:
+            raise ValueError(f"Unsupported compression codec {compression}")
+
+        check_length(records_count, records_buffer, MIN_RECORD_SIZE, "records")
+        records = [Record.read(records_buffer) for _ in range(records_count)]
+        if buffer.tell() != start + batch_length:
+            raise DecodeError(
+                f"Record batch length {batch_length} doesn't match its content"
+            )
+        return RecordBatch(
+            base_offset=base_offset,
+            partition_leader_epoch=partition_leader_epoch,
+            magic=magic,
+            crc=crc,
+            attributes=attributes,
+            last_offset_delta=last_offset_delta,
+            base_timestamp=base_timestamp,
+            max_timestamp=max_timestamp,
+            producer_id=producer_id,
+            producer_epoch=producer_epoch,
+            base_sequence=base_sequence,
+            records=records,
+        )
+
+    def write(self, buffer: BinaryIO) -> None:
+        # Everything starting from `attributes` is covered by the CRC,
+        # so it's built first. `self.crc` is ignored and recomputed.
+        body = BytesIO()
+        write_int16(self.attributes, body)
+        write_int32(self.last_offset_delta, body)
+        write_int64(self.base_timestamp, body)
+        write_int64(self.max_timestamp, body)
+        write_int64(self.producer_id, body)
+        write_int16(self.producer_epoch, body)
+        write_int32(self.base_sequence, body)
+        write_int32(len(self.records), body)
+        records = BytesIO()
+        for record in self.records:
+            record.write(records)
+        compression = self.attributes & COMPRESSION_CODEC_MASK
+        if compression == COMPRESSION_GZIP:
+            body.write(gzip.compress(records.getbuffer()))
+        elif compression == COMPRESSION_NONE:
+            body.write(records.getbuffer())
+        else:
+            raise ValueError(f"Unsupported compression codec {compression}")
+
+        body_view = body.getbuffer()
+        write_int64(self.base_offset, buffer)
+        # partition_leader_epoch + magic + crc + body
+        write_int32(4 + 1 + 4 + len(body_view), buffer)
+        write_int32(self.partition_leader_epoch, buffer)
+        write_int8(self.magic, buffer)
+        write_uint32(crc32c(body_view), buffer)
+        buffer.write(body_view)
+
+
+@dataclass
+class LegacyMessage:
+    # A message in the format before KIP-98, magic 0 or 1.
+    offset: int
+    crc: int
+    magic: int
+    attributes: int
+    # Only in magic 1.
+    timestamp: int | None
+    key: bytes | None
+    value: bytes | None
+
+    @property
+    def last_offset(self) -> int:
+        return self.offset
+
+    @classmethod
+    def read(cls, buffer: BinaryIO) -> LegacyMessage:
+        offset = read_int64(buffer)
+        read_int32(buffer)  # message_size
+        crc = read_uint32(buffer)
+        magic = read_int8(buffer)
+        if magic not in (0, 1):
+            raise ValueError(f"Unsupported message magic {magic}")
+        attributes = read_int8(buffer)
+        if attributes & COMPRESSION_CODEC_MASK != COMPRESSION_NONE:
+            raise ValueError("Compressed legacy messages are not supported")
+        timestamp = read_int64(buffer) if magic == 1 else None
+        return LegacyMessage(
+            offset=offset,
+            crc=crc,
+            magic=magic,
+            attributes=attributes,
+            timestamp=timestamp,
+            key=_read_int32_bytes(buffer),
+            value=_read_int32_bytes(buffer),
+        )
+
+
+def _read_int32_bytes(buffer: BinaryIO) -> bytes | None:
+    length = read_int32(buffer)
+    if length < 0:
+        return None
+    return read_exact(buffer, length)
+
+
+@dataclass
+class BatchView:
+    # A batch as a slice of the source buffer, nothing is decoded or copied.
+    position: int
+    base_offset: int
+    magic: int
+    data: memoryview
+
+    @property
+    def last_offset(self) -> int:
+        if self.magic < 2:
+            return self.base_offset
+        return self.base_offset + int.from_bytes(
+            self.data[LAST_OFFSET_DELTA_OFFSET : LAST_OFFSET_DELTA_OFFSET + 4],
+            byteorder="big",
+            signed=True,
+        )
+
+    @property
+    def max_timestamp(self) -> int | None:
+        if self.magic == 0:
+            return None
+        position = MAX_TIMESTAMP_OFFSET if self.magic >= 2 else LEGACY_TIMESTAMP_OFFSET
+        return int.from_bytes(
+            self.data[position : position + 8], byteorder="big", signed=True
+        )
+
+    def verify_crc(self) -> bool:
+        if self.magic < 2:
+            raise ValueError("Only magic 2 batches are supported")
+        expected = int.from_bytes(
+            self.data[CRC_START_OFFSET - 4 : CRC_START_OFFSET], byteorder="big"
+        )
+        return crc32c(self.data[CRC_START_OFFSET:]) == expected
+
+    def decode(self) -> RecordBatch | LegacyMessage:
+        if self.magic < 2:
+            return LegacyMessage.read(memory_reader(self.data))
+        return RecordBatch.read(memory_reader(self.data))
+
+
+def iter_batches(
+    data: bytes | bytearray | memoryview, position: int = 0, end: int | None = None
+) -> Iterator[BatchView]:
+    # Fetch responses may cut the last batch short, such a batch is skipped.
+    view = memoryview(data)
+    if end is None:
+        end = len(view)
+    while position + MAGIC_OFFSET + 1 <= end:
+        base_offset, size = BATCH_PREFIX.unpack_from(view, position)
+        batch_end = position + LOG_OVERHEAD + size
+        if size < 0 or batch_end > end:
+            return
+        yield BatchView(
+            position=position,
+            base_offset=base_offset,
+            magic=view[position + MAGIC_OFFSET],
+            data=view[position:batch_end],
+        )
+        position = batch_end
+
+
+def read_batches(
+    data: bytes | bytearray | memoryview,
+) -> Iterator[RecordBatch | LegacyMessage]:
+    for batch in iter_batches(data):
+        yield batch.decode()
@@ -0,0 +1,202 @@
+from __future__ import annotations
+
+import struct
+from array import array
+from dataclasses import dataclass, field, fields
+from typing import Any, Final
+
+from read_write import DecodeError
+from record_batch import (
+    COMPRESSION_CODEC_MASK,
+    COMPRESSION_NONE,
+    TIMESTAMP_TYPE_MASK,
+    iter_batches,
+)
+
+try:
+    import numpy  # type: ignore[import-not-found]
+except ImportError:
+    numpy = None
+
+# Decodes record batches into parallel arrays, one element per record,
+# instead of `Record` objects. Keys and values aren't copied, only their
+# positions in the source buffer are recorded, so they can be sliced out later
+# for the records that pass filtering.
+
+# attributes, last_offset_delta, base_timestamp, max_timestamp,
+# producer_id, producer_epoch, base_sequence, records count
+_BATCH_HEADER: Final = struct.Struct(">hiqqqhii")
+_BATCH_HEADER_OFFSET: Final = 21
+_RECORDS_OFFSET: Final = _BATCH_HEADER_OFFSET + _BATCH_HEADER.size
+
+
+def _int64s() -> array[int]:
+    return array("q")
+
+
+def _int32s() -> array[int]:
+    return array("i")
+
+
+@dataclass
+class RecordColumns:
+    offsets: array[int] = field(default_factory=_int64s)
+    timestamps: array[int] = field(default_factory=_int64s)
+    # Positions in the source buffer. Null keys and values have -1 in both.
+    key_starts: array[int] = field(default_factory=_int32s)
+    key_lengths: array[int] = field(default_factory=_int32s)
+    value_starts: array[int] = field(default_factory=_int32s)
+    value_lengths: array[int] = field(default_factory=_int32s)
+    header_counts: array[int] = field(default_factory=_int32s)
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    def key(self, data: bytes | bytearray | memoryview, i: int) -> memoryview | None:
+        return _slice(data, self.key_starts[i], self.key_lengths[i])
+
+    def value(self, data: bytes | bytearray | memoryview, i: int) -> memoryview | None:
+        return _slice(data, self.value_starts[i], self.value_lengths[i])
+
+    def as_numpy(self) -> dict[str, Any]:
+        # The arrays share memory with the columns.
+        if numpy is None:
+            raise ImportError("numpy is not installed")
+        return {
+            f.name: numpy.frombuffer(
+                getattr(self, f.name),
+                dtype=(
+                    numpy.int64
+                    if getattr(self, f.name).typecode == "q"
+                    else numpy.int32
+                ),
+            )
+            for f in fields(self)
+        }
+
+
+def _slice(
+    data: bytes | bytearray | memoryview, start: int, length: int
+) -> memoryview | None:
+    if length < 0:
+        return None
+    return memoryview(data)[start : start + length]
+
+
+def _read_varint(data: memoryview, pos: int, end: int) -> tuple[int, int]:
+    # Zigzag-encoded, returns the value and the position after it.
+    # Up to 5 bytes, within the record ending at `end`.
+    value = 0
+    for shift in range(0, 35, 7):
+        if pos >= end:
+            raise DecodeError("Varint goes past the end of its record")
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return (value >> 1) ^ -(value & 1), pos
+    raise DecodeError("Varint is too long, most significant bit in 5th byte is set")
+
+
+def read_columns(
+    data: bytes | bytearray | memoryview, verify_crc: bool = True
+) -> RecordColumns:
+    # `data` is the `records` field of a Fetch response or a part of a log segment.
+    # A batch cut short at the end is skipped. Corrupted batches raise `DecodeError`;
+    # without `verify_crc`, only the ones that don't parse.
+    view = memoryview(data).cast("B")
+    columns = RecordColumns()
+    offsets = columns.offsets
+    timestamps = columns.timestamps
+    key_starts = columns.key_starts
+    key_lengths = columns.key_lengths
+    value_starts = columns.value_starts
+    value_lengths = columns.value_lengths
+    header_counts = columns.header_counts
+
+    for batch in iter_batches(view):
+        if batch.magic != 2:
+            raise ValueError(f"Unsupported record batch magic {batch.magic}")
+        base_offset = batch.base_offset
+        if verify_crc and not batch.verify_crc():
+            raise DecodeError(f"Record batch at offset {base_offset} has a wrong CRC")
+        (
+            attributes,
+            _,
+            base_timestamp,
+            max_timestamp,
+            _,
+            _,
+            _,
+            count,
+        ) = _BATCH_HEADER.unpack_from(view, batch.position + _BATCH_HEADER_OFFSET)
+        if attributes & COMPRESSION_CODEC_MASK != COMPRESSION_NONE:
+            raise ValueError(
+                f"Compressed batch at offset {base_offset} can't be exported"
+            )
+        # With LogAppendTime, all records have the time the broker appended the batch.
+        log_append_time = attributes & TIMESTAMP_TYPE_MASK != 0
+        records_before = len(offsets)
+
+        pos = batch.position + _RECORDS_OFFSET
+        batch_end = batch.position + len(batch.data)
+        for _ in range(count):
+            if pos >= batch_end:
+                break
+            length, pos = _read_varint(view, pos, batch_end)
+            end = pos + length
+            # At least the attributes byte.
+            if length < 1 or end > batch_end:
+                raise DecodeError(
+                    f"Record in batch at offset {base_offset} has invalid length "
+                    f"{length}"
+                )
+            # attributes
+            pos += 1
+            timestamp_delta, pos = _read_varint(view, pos, end)
+            offset_delta, pos = _read_varint(view, pos, end)
+            key_length, pos = _read_varint(view, pos, end)
+            if key_length < 0:
+                key_starts.append(-1)
+                key_lengths.append(-1)
+            else:
+                key_starts.append(pos)
+                key_lengths.append(key_length)
+                pos += key_length
+                if pos > end:
+                    raise DecodeError(
+                        f"Record key in batch at offset {base_offset} goes past "
+                        f"the end of the record"
+                    )
+            value_length, pos = _read_varint(view, pos, end)
+            if value_length < 0:
+                value_starts.append(-1)
+                value_lengths.append(-1)
+            else:
+                value_starts.append(pos)
+                value_lengths.append(value_length)
+                pos += value_length
+                if pos > end:
+                    raise DecodeError(
+                        f"Record value in batch at offset {base_offset} goes past "
+                        f"the end of the record"
+                    )
+            header_count, pos = _read_varint(view, pos, end)
+            if header_count < 0:
+                raise DecodeError(
+                    f"Record in batch at offset {base_offset} has invalid headers "
+                    f"count {header_count}"
+                )
+            header_counts.append(header_count)
+            offsets.append(base_offset + offset_delta)
+            timestamps.append(
+                max_timestamp if log_append_time else base_timestamp + timestamp_delta
+            )
+            # Headers are skipped.
+            pos = end
+        if pos != batch_end or len(offsets) != records_before + count:
+            raise DecodeError(
+                f"Record batch at offset {base_offset} doesn't match its length "
+                f"and records count"
+            )
+    return columns
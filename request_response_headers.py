@@ -8,7 +8,14 @@ from raw_tagged_fields import (
     write_unknown_tagged_fields,
     read_unknown_tagged_fields,
 )
-from read_write import write_int16, write_int32, write_nullable_string, read_int32
+from read_write import (
+    write_int16,
+    write_int32,
+    write_nullable_string,
+    read_int16,
+    read_int32,
+    read_nullable_string,
+)
 
 
 @dataclass
@@ -22,13 +29,21 @@ class RequestHeaderV0:
         write_int16(self.request_api_version, buffer)
         write_int32(self.correlation_id, buffer)
 
+    @classmethod
+    def read(cls, buffer: BinaryIO) -> RequestHeaderV0:
+        return RequestHeaderV0(
+            request_api_key=read_int16(buffer),
+            request_api_version=read_int16(buffer),
+            correlation_id=read_int32(buffer),
+        )
+
 
 @dataclass
 class RequestHeaderV1:
     request_api_key: int
     request_api_version: int
     correlation_id: int
-    client_id: str
+    client_id: str | None
 
     def write(self, buffer: BinaryIO) -> None:
         write_int16(self.request_api_key, buffer)
@@ -36,13 +51,22 @@ class RequestHeaderV1:
         write_int32(self.correlation_id, buffer)
         write_nullable_string(self.client_id, buffer, False)
 
+    @classmethod
+    def read(cls, buffer: BinaryIO) -> RequestHeaderV1:
+        return RequestHeaderV1(
+            request_api_key=read_int16(buffer),
+            request_api_version=read_int16(buffer),
+            correlation_id=read_int32(buffer),
+            client_id=read_nullable_string(buffer, False),
+        )
+
 
 @dataclass
 class RequestHeaderV2:
     request_api_key: int
     request_api_version: int
     correlation_id: int
-    client_id: str
+    client_id: str | None
     _unknownTaggedFields: list[RawTaggedField]
 
     def write(self, buffer: BinaryIO) -> None:
@@ -52,6 +76,16 @@ class RequestHeaderV2:
         write_nullable_string(self.client_id, buffer, False)
         write_unknown_tagged_fields(self._unknownTaggedFields, buffer)
 
+    @classmethod
+    def read(cls, buffer: BinaryIO) -> RequestHeaderV2:
+        return RequestHeaderV2(
+            request_api_key=read_int16(buffer),
+            request_api_version=read_int16(buffer),
+            correlation_id=read_int32(buffer),
+            client_id=read_nullable_string(buffer, False),
+            _unknownTaggedFields=read_unknown_tagged_fields(buffer),
+        )
+
 
 @dataclass
 class ResponseHeaderV0:
@@ -61,6 +95,9 @@ class ResponseHeaderV0:
     def read(cls, buffer: BinaryIO) -> ResponseHeaderV0:
         return ResponseHeaderV0(correlation_id=read_int32(buffer))
 
+    def write(self, buffer: BinaryIO) -> None:
+        write_int32(self.correlation_id, buffer)
+
 
 @dataclass
 class ResponseHeaderV1:
@@ -73,3 +110,13 @@ class ResponseHeaderV1:
             correlation_id=read_int32(buffer),
             _unknownTaggedFields=read_unknown_tagged_fields(buffer),
         )
+
+    def write(self, buffer: BinaryIO) -> None:
+        write_int32(self.correlation_id, buffer)
+        write_unknown_tagged_fields(self._unknownTaggedFields, buffer)
+
+
+def read_response_correlation_id(buffer: BinaryIO) -> int:
+    # All response header versions start with the correlation id,
+    # so responses can be matched to requests before the API is known.
+    return read_int32(buffer)
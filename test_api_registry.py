@@ -0,0 +1,108 @@
+import os
+import subprocess
+import sys
+from io import BytesIO
+
+import pytest
+
+from api_registry import API_SPECS, ApiSpec, lookup, supported_versions
+from api_versions_v3 import ApiVersionsRequestV3
+from framing import Writable, encode_frame
+from metadata_v12 import MetadataRequestTopicV12, MetadataRequestV12
+from mock_broker import default_api_versions_response
+from request_response_headers import RequestHeaderV2, ResponseHeaderV0
+
+
+@pytest.mark.parametrize("spec", API_SPECS, ids=lambda s: f"{s.name}v{s.api_version}")
+def test_classes_resolve(spec: ApiSpec) -> None:
+    assert spec.request_type.__name__ == spec.request_class
+    assert spec.response_type.__name__ == spec.response_class
+    assert spec.request_type.__module__ == spec.module
+    assert hasattr(spec.request_type, "read")
+    assert hasattr(spec.response_type, "read")
+    assert spec.request_header_type.__name__.endswith(f"V{spec.request_header_version}")
+    assert spec.response_header_type.__name__.endswith(
+        f"V{spec.response_header_version}"
+    )
+
+
+def test_lookup() -> None:
+    spec = lookup(18, 3)
+    assert spec.request_header_type is RequestHeaderV2
+    assert spec.response_header_type is ResponseHeaderV0
+    assert supported_versions(18) == [0, 3]
+    assert supported_versions(1000) == []
+    with pytest.raises(ValueError, match="Unsupported API key 18 version 2"):
+        lookup(18, 2)
+
+
+def _request_header(api_key: int, api_version: int) -> RequestHeaderV2:
+    return RequestHeaderV2(
+        request_api_key=api_key,
+        request_api_version=api_version,
+        correlation_id=5,
+        client_id="test-client",
+        _unknownTaggedFields=[],
+    )
+
+
+@pytest.mark.parametrize(
+    ("api_key", "api_version", "message"),
+    [
+        (
+            18,
+            3,
+            ApiVersionsRequestV3(
+                client_software_name="test-client",
+                client_software_version="1",
+                _unknownTaggedFields=[],
+            ),
+        ),
+        (
+            3,
+            12,
+            MetadataRequestV12(
+                topics=[
+                    MetadataRequestTopicV12(
+                        topic_id=None, name="test-topic1", _unknownTaggedFields=[]
+                    )
+                ],
+                allow_auto_topic_creation=False,
+                include_topic_authorized_operations=True,
+                _unknownTaggedFields=[],
+            ),
+        ),
+    ],
+)
+def test_read_request(api_key: int, api_version: int, message: Writable) -> None:
+    header = _request_header(api_key, api_version)
+    frame = encode_frame(header, message)
+    assert lookup(api_key, api_version).read_request(BytesIO(frame[4:])) == (
+        header,
+        message,
+    )
+
+
+def test_read_response() -> None:
+    header = ResponseHeaderV0(correlation_id=5)
+    frame = encode_frame(header, default_api_versions_response())
+    assert lookup(18, 3).read_response(BytesIO(frame[4:])) == (
+        header,
+        default_api_versions_response(),
+    )
+
+
+def test_lazy_import() -> None:
+    code = (
+        "import sys, api_registry\n"
+        "assert 'metadata_v12' not in sys.modules\n"
+        "assert 'request_response_headers' not in sys.modules\n"
+        "api_registry.lookup(3, 12).response_type\n"
+        "assert 'metadata_v12' in sys.modules\n"
+        "assert 'fetch_request_v0' not in sys.modules\n"
+    )
+    subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        check=True,
+    )
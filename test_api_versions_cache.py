@@ -0,0 +1,136 @@
+from pathlib import Path
+
+import pytest
+
+from api_versions_cache import ApiVersionsCache, negotiate_versions
+from api_versions_v3 import ApiVersionsResponseV3, ApiVersionsResponseApiKeyV3
+
+ADDRESS = ("127.0.0.1", 9092)
+
+
+def make_response(*ranges: tuple[int, int, int]) -> ApiVersionsResponseV3:
+    return ApiVersionsResponseV3(
+        error_code=0,
+        api_keys=[
+            ApiVersionsResponseApiKeyV3(
+                api_key=api_key,
+                min_version=min_version,
+                max_version=max_version,
+                _unknownTaggedFields=[],
+            )
+            for api_key, min_version, max_version in ranges
+        ],
+        throttle_time_ms=0,
+        _unknownTaggedFields=[],
+    )
+
+
+class FakeClock:
+    # For the `clock` argument of the caches and the coalescer.
+    def __init__(self, now: float = 0.0) -> None:
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_negotiate_versions() -> None:
+    response = make_response((1, 0, 16), (18, 0, 2), (3, 0, 12), (2, 5, 8))
+    client_versions = {1: (0, 0), 18: (0, 3), 2: (0, 4)}
+    assert negotiate_versions(response, client_versions) == {1: 0, 18: 2}
+
+
+def test_ttl() -> None:
+    clock = FakeClock()
+    cache = ApiVersionsCache(ttl_s=10, clock=clock)
+    assert cache.get(ADDRESS, "cluster") is None
+
+    cache.put(ADDRESS, "cluster", make_response((18, 0, 3)))
+    assert cache.get(ADDRESS, "cluster") == {18: 3}
+    assert cache.get(ADDRESS, "other-cluster") is None
+
+    clock.now += 10
+    assert cache.get(ADDRESS, "cluster") is None
+
+
+def test_get_or_fetch_refreshes_lazily_on_unsupported_version() -> None:
+    responses = [make_response((18, 0, 3)), make_response((18, 0, 1))]
+    cache = ApiVersionsCache()
+
+    assert cache.get_or_fetch(ADDRESS, None, lambda: responses.pop(0)) == {18: 3}
+    assert cache.get_or_fetch(ADDRESS, None, lambda: responses.pop(0)) == {18: 3}
+    assert len(responses) == 1
+
+    assert not cache.handle_error(ADDRESS, None, 0)
+    assert cache.version_for(ADDRESS, None, 18) == 3
+    assert cache.handle_error(ADDRESS, None, 35)
+    assert cache.get_or_fetch(ADDRESS, None, lambda: responses.pop(0)) == {18: 1}
+
+
+def test_error_response_is_not_cached() -> None:
+    response = make_response((18, 0, 3))
+    response.error_code = 35
+    cache = ApiVersionsCache()
+    with pytest.raises(ValueError, match="error code 35"):
+        cache.put(ADDRESS, None, response)
+    assert cache.get(ADDRESS, None) is None
+
+
+def test_persistence(tmp_path: Path) -> None:
+    path = str(tmp_path / "api_versions.json")
+    clock = FakeClock()
+
+    cache = ApiVersionsCache(ttl_s=10, path=path, clock=clock)
+    cache.put(ADDRESS, "cluster", make_response((1, 0, 16), (18, 0, 3)))
+    cache.put(("127.0.0.1", 9093), None, make_response((18, 0, 3)))
+
+    restored = ApiVersionsCache(ttl_s=10, path=path, clock=clock)
+    assert restored.get(ADDRESS, "cluster") == {1: 0, 18: 3}
+    assert restored.get(("127.0.0.1", 9093), None) == {18: 3}
+
+    clock.now += 10
+    expired = ApiVersionsCache(ttl_s=10, path=path, clock=clock)
+    assert expired.get(ADDRESS, "cluster") is None
+
+
+def test_corrupt_persisted_cache(tmp_path: Path) -> None:
+    path = tmp_path / "api_versions.json"
+    path.write_text("{not json")
+    cache = ApiVersionsCache(path=str(path))
+    assert cache.get(ADDRESS, None) is None
+
+
+VALID_ENTRY = (
+    '{"host": "127.0.0.1", "port": 9092, "cluster_id": "cluster",'
+    ' "negotiated_at": 1000, "versions": {"18": 3}}'
+)
+
+
+@pytest.mark.parametrize(
+    "content",
+    [
+        "[]",
+        "null",
+        '{"entries": {}}',
+        '{"entries": [[]]}',
+        '{"entries": [{"host": "127.0.0.1", "port": 9092}]}',
+        '{"entries": [{"host": "127.0.0.1", "port": "x", "cluster_id": null,'
+        ' "negotiated_at": 1000, "versions": {}}]}',
+        '{"entries": [{"host": "127.0.0.1", "port": 9092, "cluster_id": [],'
+        ' "negotiated_at": 1000, "versions": {}}]}',
+        '{"entries": [{"host": "127.0.0.1", "port": 9092, "cluster_id": null,'
+        ' "negotiated_at": 1000, "versions": []}]}',
+    ],
+)
+def test_wrong_shape_persisted_cache(tmp_path: Path, content: str) -> None:
+    path = tmp_path / "api_versions.json"
+    path.write_text(content)
+    cache = ApiVersionsCache(ttl_s=10, path=str(path), clock=FakeClock())
+    assert cache.get(ADDRESS, None) is None
+
+
+def test_bad_entries_are_skipped(tmp_path: Path) -> None:
+    path = tmp_path / "api_versions.json"
+    path.write_text(f'{{"entries": [{{"host": "127.0.0.1"}}, {VALID_ENTRY}]}}')
+    cache = ApiVersionsCache(ttl_s=10, path=str(path), clock=FakeClock())
+    assert cache.get(ADDRESS, "cluster") == {18: 3}
@@ -0,0 +1,160 @@
+import gc
+import socket
+import sys
+import threading
+import time
+
+import pytest
+
+from buffer_pool import BufferPool
+from read_write import read_int32
+
+
+def test_size_classes() -> None:
+    pool = BufferPool(min_class_bytes=4096, max_class_bytes=65536)
+    assert [pool.size_class(s) for s in [0, 1, 4096, 4097, 65536, 65537]] == [
+        4096,
+        4096,
+        4096,
+        8192,
+        65536,
+        65537,
+    ]
+
+
+def test_reuse() -> None:
+    pool = BufferPool(budget_bytes=1024 * 1024)
+    lease = pool.acquire(5000)
+    assert (lease.size, lease.capacity, len(lease.view)) == (5000, 8192, 5000)
+    buffer = lease.view.obj
+    lease.release()
+    assert lease.released
+
+    with pool.acquire(6000) as lease:
+        assert lease.view.obj is buffer
+    assert pool.allocated_bytes == 8192
+    # Garbage collected leases are returned too.
+    lease = pool.acquire(7000)
+    assert lease.view.obj is buffer
+    del lease
+    gc.collect()
+    with pool.acquire(8000) as lease:
+        assert lease.view.obj is buffer
+    assert pool.allocated_bytes == 8192
+
+
+def test_views_keep_buffer() -> None:
+    pool = BufferPool(budget_bytes=1024 * 1024)
+    lease = pool.acquire(100)
+    lease.view[:5] = b"hello"
+    buffer = lease.view.obj
+    view = lease.view[1:3]
+    lease.release()
+
+    with pool.acquire(100) as other:
+        other.view[:5] = b"xxxxx"
+        other_buffer = other.view.obj
+        assert other_buffer is not buffer
+    assert bytes(view) == b"el"
+    assert pool.allocated_bytes == 2 * 4096
+
+    del view
+    with pool.acquire(100) as lease, pool.acquire(100) as other:
+        assert {id(lease.view.obj), id(other.view.obj)} == {
+            id(buffer),
+            id(other_buffer),
+        }
+    assert pool.allocated_bytes == pool.idle_bytes == 2 * 4096
+
+
+def test_reuse_doesnt_grow_buffers() -> None:
+    budget = 2 * 1024 * 1024
+    pool = BufferPool(budget_bytes=budget, max_class_bytes=budget)
+    lease = pool.acquire(budget)
+    buffer = lease.view.obj
+    assert isinstance(buffer, bytearray)
+    size = sys.getsizeof(buffer)
+    view = lease.view[:10]
+    lease.release()
+    # Checked while still viewed and after.
+    assert pool.idle_bytes == 0
+    del view
+    for _ in range(10):
+        with pool.acquire(budget) as lease:
+            assert lease.view.obj is buffer
+    assert sys.getsizeof(buffer) == size
+    assert sys.getsizeof(buffer) - sys.getsizeof(bytearray()) <= budget + 1
+
+
+def test_budget() -> None:
+    pool = BufferPool(budget_bytes=16384, min_class_bytes=4096)
+    with pytest.raises(ValueError, match="exceeds the pool budget of 16384 bytes"):
+        pool.acquire(16385)
+
+    big = pool.acquire(16384)
+    with pytest.raises(TimeoutError):
+        pool.acquire(1, timeout_s=0.05)
+    assert pool.waits == 1
+
+    acquired = threading.Event()
+
+    def acquire_small() -> None:
+        pool.acquire(4096).release()
+        acquired.set()
+
+    thread = threading.Thread(target=acquire_small)
+    thread.start()
+    assert not acquired.wait(0.05)
+    big.release()
+    assert acquired.wait(5)
+    thread.join()
+
+    # The idle 16 KiB buffer was dropped to make room for the 4 KiB one.
+    assert pool.allocated_bytes == pool.idle_bytes == 4096
+
+
+def test_large_buffers_not_kept() -> None:
+    pool = BufferPool(min_class_bytes=4096, max_class_bytes=8192)
+    pool.acquire(10_000).release()
+    pool.acquire(100).release()
+    assert pool.allocated_bytes == pool.idle_bytes == 4096
+
+
+def _frame(body: bytes) -> bytes:
+    return len(body).to_bytes(4, byteorder="big") + body
+
+
+def test_receive_frame_backpressure() -> None:
+    pool = BufferPool(budget_bytes=8192, min_class_bytes=4096)
+    client, server = socket.socketpair()
+    with client, server:
+        server.sendall(_frame(b"a" * 5000) + _frame(b"b" * 3000))
+        first = pool.receive_frame(client)
+        assert bytes(first.view) == b"a" * 5000
+        assert first.capacity == 8192
+
+        received = []
+        thread = threading.Thread(
+            target=lambda: received.append(pool.receive_frame(client))
+        )
+        thread.start()
+        deadline = time.monotonic() + 5
+        while pool.waits == 0 and time.monotonic() < deadline:
+            time.sleep(0.001)
+        # Only the size has been read, the body waits in the socket.
+        assert pool.waits == 1
+        assert client.recv(10_000, socket.MSG_PEEK) == b"b" * 3000
+
+        view = first.view[:1]
+        first.release()
+        time.sleep(0.05)
+        assert not received
+        # The buffer is free once the last view is dropped.
+        del view
+        thread.join(5)
+        assert bytes(received[0].view) == b"b" * 3000
+        assert read_int32(received[0].reader()) == int.from_bytes(b"bbbb", "big")
+
+        server.close()
+        with pytest.raises(ConnectionError, match="Connection closed"):
+            pool.receive_frame(client)
@@ -0,0 +1,88 @@
+from io import BytesIO
+from types import ModuleType
+from typing import Any
+
+import pytest
+
+import raw_tagged_fields
+import read_write
+import read_write_unchecked
+from compiled import COMPILED_MODULES, is_compiled, load_pure
+from raw_tagged_fields import RawTaggedField
+from test_read_write_unchecked import SCALARS
+
+# These run only after `make mypyc`.
+compiled_only = pytest.mark.skipif(
+    not all(is_compiled(m) for m in (read_write, read_write_unchecked)),
+    reason="codec modules are not compiled",
+)
+
+
+def test_load_pure() -> None:
+    for name in COMPILED_MODULES:
+        assert not is_compiled(load_pure(name))
+
+
+def _encode(module: ModuleType, name: str, value: Any) -> bytes:
+    buf = BytesIO()
+    getattr(module, f"write_{name}")(value, buf)
+    return buf.getvalue()
+
+
+@compiled_only
+@pytest.mark.parametrize("module", [read_write, read_write_unchecked])
+@pytest.mark.parametrize(("name", "values"), SCALARS)
+def test_scalars_parity(module: ModuleType, name: str, values: list[Any]) -> None:
+    pure = load_pure(module.__name__)
+    for value in values:
+        encoded = _encode(module, name, value)
+        assert encoded == _encode(pure, name, value)
+        assert getattr(module, f"read_{name}")(BytesIO(encoded)) == value
+
+
+@compiled_only
+@pytest.mark.parametrize(
+    ("name", "value"), [("int8", 2**7), ("int32", -(2**31) - 1), ("uint16", -1)]
+)
+def test_errors_parity(name: str, value: int) -> None:
+    pure = load_pure("read_write")
+    with pytest.raises(ValueError) as pure_error:
+        _encode(pure, name, value)
+    with pytest.raises(ValueError) as compiled_error:
+        _encode(read_write, name, value)
+    assert str(compiled_error.value) == str(pure_error.value)
+
+
+@compiled_only
+@pytest.mark.parametrize("compact", [True, False])
+def test_variable_length_parity(compact: bool) -> None:
+    pure = load_pure("read_write")
+    for module in (pure, read_write):
+        buf = BytesIO()
+        module.write_nullable_string(None, buf, compact)
+        module.write_string("topic-ü", buf, compact)
+        module.write_bytes(b"\x00" * 200, buf, compact)
+        module.write_array(list(range(300)), module.write_int32, buf, compact)
+        if module is pure:
+            expected = buf.getvalue()
+    assert buf.getvalue() == expected
+    buf.seek(0)
+    assert read_write.read_nullable_string(buf, compact) is None
+    assert read_write.read_string(buf, compact) == "topic-ü"
+    assert read_write.read_bytes(buf, compact) == b"\x00" * 200
+    assert read_write.read_array(read_write.read_int32, buf, compact) == list(
+        range(300)
+    )
+
+
+@compiled_only
+def test_tagged_fields_parity() -> None:
+    fields = [RawTaggedField(tag=0, data=b""), RawTaggedField(tag=300, data=b"x" * 200)]
+    pure = load_pure("raw_tagged_fields")
+    pure_fields = [pure.RawTaggedField(tag=f.tag, data=f.data) for f in fields]
+    compiled_buf, pure_buf = BytesIO(), BytesIO()
+    raw_tagged_fields.write_unknown_tagged_fields(fields, compiled_buf)
+    pure.write_unknown_tagged_fields(pure_fields, pure_buf)
+    assert compiled_buf.getvalue() == pure_buf.getvalue()
+    compiled_buf.seek(0)
+    assert raw_tagged_fields.read_unknown_tagged_fields(compiled_buf) == fields
@@ -0,0 +1,112 @@
+import socket
+from typing import Iterator
+
+import pytest
+
+from api_versions_cache import ApiVersionsCache
+from connection_pool import ConnectionPool, PoolConfig, BrokerUnavailableError
+from mock_broker import MockBroker
+
+
+@pytest.fixture
+def broker() -> Iterator[MockBroker]:
+    with MockBroker() as broker:
+        yield broker
+
+
+def api_versions_requests(broker: MockBroker) -> int:
+    return sum(1 for r in broker.requests if r.api_key == 18)
+
+
+def test_reuse(broker: MockBroker) -> None:
+    pool = ConnectionPool({1: broker.address})
+    for _ in range(3):
+        with pool.connection(1) as conn:
+            assert conn.api_versions == {1: 0, 3: 12, 18: 3}
+            assert conn.sock.getsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY) != 0
+    pool.close()
+
+    assert broker.accepted_connections == 1
+    assert api_versions_requests(broker) == 1
+
+
+def test_handshake_once_per_connection(broker: MockBroker) -> None:
+    pool = ConnectionPool({1: broker.address})
+    conn1 = pool.acquire(1)
+    conn2 = pool.acquire(1)
+    assert conn1 is not conn2
+    pool.release(conn1)
+    pool.release(conn2)
+    with pool.connection(1):
+        pass
+    pool.close()
+
+    assert broker.accepted_connections == 2
+    assert api_versions_requests(broker) == 2
+
+
+def test_handshake_skipped_with_cache(broker: MockBroker) -> None:
+    cache = ApiVersionsCache()
+    pool = ConnectionPool({1: broker.address}, api_versions_cache=cache)
+    conn1 = pool.acquire(1)
+    conn2 = pool.acquire(1)
+    assert conn2.api_versions == conn1.api_versions
+    pool.close()
+    assert api_versions_requests(broker) == 1
+
+
+def test_max_connections_per_broker(broker: MockBroker) -> None:
+    pool = ConnectionPool(
+        {1: broker.address},
+        PoolConfig(max_connections_per_broker=1, acquire_timeout_s=0.05),
+    )
+    conn = pool.acquire(1)
+    with pytest.raises(BrokerUnavailableError, match="Timed out"):
+        pool.acquire(1)
+    pool.release(conn)
+    assert pool.acquire(1) is conn
+
+
+def test_failed_connection_is_not_reused(broker: MockBroker) -> None:
+    pool = ConnectionPool({1: broker.address}, PoolConfig(reconnect_backoff_s=0))
+    with pytest.raises(OSError):
+        with pool.connection(1) as conn:
+            raise OSError("broken")
+    assert conn.closed
+    with pool.connection(1) as conn2:
+        assert conn2 is not conn
+
+
+def test_reconnect_backoff() -> None:
+    # Take a free port and close it, so nothing listens there.
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    address = sock.getsockname()
+    sock.close()
+
+    now = [0.0]
+    pool = ConnectionPool(
+        {1: address},
+        PoolConfig(reconnect_backoff_s=1.0, reconnect_backoff_max_s=3.0),
+        clock=lambda: now[0],
+    )
+    with pytest.raises(BrokerUnavailableError, match="Failed to connect"):
+        pool.acquire(1)
+    with pytest.raises(BrokerUnavailableError, match="backing off after 1 failures"):
+        pool.acquire(1)
+
+    now[0] = 1.0
+    with pytest.raises(BrokerUnavailableError, match="Failed to connect"):
+        pool.acquire(1)
+    assert pool.health(1).next_attempt_at == 3.0
+
+    now[0] = 3.0
+    with pytest.raises(BrokerUnavailableError, match="Failed to connect"):
+        pool.acquire(1)
+    assert pool.health(1).next_attempt_at == 6.0
+
+
+def test_unknown_broker() -> None:
+    pool = ConnectionPool({})
+    with pytest.raises(BrokerUnavailableError, match="Unknown broker 5"):
+        pool.acquire(5)
@@ -0,0 +1,99 @@
+import random
+from io import BytesIO
+from pathlib import Path
+
+import pytest
+
+from api_versions_v3 import ApiVersionsResponseV3
+from corpus import (
+    ApiVersionsShape,
+    FetchShape,
+    RecordBatchShape,
+    fetch_response_v0_chunks,
+    random_api_versions_response_v3,
+    random_fetch_response_v0,
+    write_api_versions_corpus,
+    write_fetch_corpus,
+)
+from fetch_request_v0 import FetchResponseV0
+from record_batch import iter_batches
+from request_response_headers import ResponseHeaderV0
+from wire_capture import CaptureReader, replay
+
+SMALL = FetchShape(
+    topics=2,
+    partitions=50,
+    batches=(0, 3),
+    batch=RecordBatchShape(records=(1, 5), value_size=(0, 100)),
+)
+
+
+def test_deterministic() -> None:
+    a = random_fetch_response_v0(random.Random(1), SMALL)
+    assert a == random_fetch_response_v0(random.Random(1), SMALL)
+    assert a != random_fetch_response_v0(random.Random(2), SMALL)
+
+
+def test_chunks_match_message() -> None:
+    message = random_fetch_response_v0(random.Random(3), SMALL)
+    expected = BytesIO()
+    ResponseHeaderV0(correlation_id=7).write(expected)
+    message.write(expected)
+
+    chunks = list(fetch_response_v0_chunks(random.Random(3), SMALL, 7))
+    assert len(chunks) == 2 * 50
+    assert b"".join(chunks) == expected.getvalue()
+
+
+def test_fetch_response_is_valid() -> None:
+    message = random_fetch_response_v0(random.Random(4), SMALL)
+    buffer = BytesIO()
+    message.write(buffer)
+    buffer.seek(0)
+    assert FetchResponseV0.read(buffer) == message
+
+    batches = 0
+    for topic in message.responses:
+        for partition in topic.partitions:
+            for batch in iter_batches(partition.records or b""):
+                assert batch.verify_crc()
+                assert batch.last_offset < partition.high_watermark
+                batches += 1
+    assert batches > 0
+
+
+@pytest.mark.parametrize("tagged_fields", [(0, 0), (0, 8), (20, 20)])
+def test_api_versions_response(tagged_fields: tuple[int, int]) -> None:
+    shape = ApiVersionsShape(api_keys=300, tagged_fields=tagged_fields)
+    message = random_api_versions_response_v3(random.Random(5), shape)
+    assert len(message.api_keys) == 300
+    assert len(message._unknownTaggedFields) in range(
+        tagged_fields[0], tagged_fields[1] + 1
+    )
+    buffer = BytesIO()
+    message.write(buffer)
+    buffer.seek(0)
+    assert ApiVersionsResponseV3.read(buffer) == message
+
+
+def test_corpus(tmp_path: Path) -> None:
+    fetch_path = str(tmp_path / "fetch")
+    size = write_fetch_corpus(fetch_path, 3, seed=6, shape=SMALL)
+    with CaptureReader(fetch_path) as reader:
+        assert [f.correlation_id for f in reader] == [0, 1, 2]
+        assert sum(len(f.frame) for f in reader) == size
+    assert (tmp_path / "fetch").read_bytes() == _regenerate(tmp_path, 6)
+
+    api_versions_path = str(tmp_path / "api_versions")
+    write_api_versions_corpus(api_versions_path, 2, seed=6)
+
+    for path in (fetch_path, api_versions_path):
+        stats = replay(path)
+        assert stats.skipped == 0
+        assert sum(s.frames for s in stats.decoded.values()) in (2, 3)
+
+
+def _regenerate(tmp_path: Path, seed: int) -> bytes:
+    path = tmp_path / "again"
+    write_fetch_corpus(str(path), 3, seed=seed, shape=SMALL)
+    return path.read_bytes()
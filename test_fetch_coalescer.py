@@ -0,0 +1,262 @@
+from io import BytesIO
+from typing import BinaryIO, Callable
+
+from fetch_coalescer import (
+    FetchCoalescer,
+    FetchInterest,
+    FetchResult,
+    multiplexer_sender,
+)
+from fetch_request_v0 import (
+    FetchRequestV0,
+    FetchResponseV0,
+    FetchResponseResponseV0,
+    FetchResponseResponsePartitionV0,
+)
+from framing import Writable
+from mock_broker import MockBroker, MockRequest
+from multiplexer import Multiplexer
+from request_response_headers import RequestHeaderV1, ResponseHeaderV0
+from test_api_versions_cache import FakeClock
+
+
+def respond(request: FetchRequestV0) -> FetchResponseV0:
+    # Put the fetch offset into the data, so callers can be told apart.
+    return FetchResponseV0(
+        responses=[
+            FetchResponseResponseV0(
+                topic=topic.topic,
+                partitions=[
+                    FetchResponseResponsePartitionV0(
+                        partition_index=p.partition,
+                        error_code=0,
+                        high_watermark=100,
+                        records=str(p.fetch_offset).encode(),
+                    )
+                    for p in topic.partitions
+                ],
+            )
+            for topic in request.topics
+        ]
+    )
+
+
+class FakeSender:
+    def __init__(self) -> None:
+        self.sent: list[
+            tuple[
+                int,
+                FetchRequestV0,
+                Callable[[FetchResponseV0], None],
+                Callable[[Exception], None],
+            ]
+        ] = []
+
+    def __call__(
+        self,
+        node_id: int,
+        request: FetchRequestV0,
+        on_response: Callable[[FetchResponseV0], None],
+        on_error: Callable[[Exception], None],
+    ) -> None:
+        self.sent.append((node_id, request, on_response, on_error))
+
+
+def leader_for(topic: str, partition: int) -> int:
+    return partition % 2
+
+
+def test_coalescing_and_splitting() -> None:
+    clock = FakeClock()
+    sender = FakeSender()
+    coalescer = FetchCoalescer(leader_for, sender, batch_window_s=0.01, clock=clock)
+    results: list[FetchResult] = []
+
+    coalescer.fetch(
+        [FetchInterest("a", 0, 10, 100), FetchInterest("a", 1, 20, 100)],
+        results.append,
+    )
+    coalescer.fetch(
+        [FetchInterest("a", 0, 10, 500), FetchInterest("b", 0, 30, 100)],
+        results.append,
+    )
+    assert coalescer.time_until_flush() == 0.01
+    assert coalescer.flush_due() == 0
+    assert sender.sent == []
+
+    clock.now = 0.01
+    assert coalescer.flush_due() == 2
+    assert coalescer.time_until_flush() is None
+    assert len(sender.sent) == 2
+
+    node_id, request, on_response, _ = sender.sent[0]
+    assert node_id == 0
+    assert [
+        (
+            t.topic,
+            [
+                (p.partition, p.fetch_offset, p.partition_max_bytes)
+                for p in t.partitions
+            ],
+        )
+        for t in request.topics
+    ] == [
+        ("a", [(0, 10, 500)]),
+        ("b", [(0, 30, 100)]),
+    ]
+    on_response(respond(request))
+    # The second caller has everything.
+    assert len(results) == 1
+    assert set(results[0]) == {("a", 0), ("b", 0)}
+
+    _, request, on_response, _ = sender.sent[1]
+    on_response(respond(request))
+    assert len(results) == 2
+    assert set(results[1]) == {("a", 0), ("a", 1)}
+    assert results[1][("a", 0)].records == b"10"
+
+
+def test_same_partition_different_offsets_is_deferred() -> None:
+    sender = FakeSender()
+    coalescer = FetchCoalescer(leader_for, sender)
+    results: list[FetchResult] = []
+    coalescer.fetch([FetchInterest("a", 0, 10, 100)], results.append)
+    coalescer.fetch([FetchInterest("a", 0, 50, 100)], results.append)
+
+    assert coalescer.flush() == 1
+    _, request, on_response, _ = sender.sent[0]
+    assert [p.fetch_offset for p in request.topics[0].partitions] == [10]
+    on_response(respond(request))
+
+    assert coalescer.flush() == 1
+    _, request, on_response, _ = sender.sent[1]
+    assert [p.fetch_offset for p in request.topics[0].partitions] == [50]
+    on_response(respond(request))
+
+    assert [r[("a", 0)].records for r in results] == [b"10", b"50"]
+
+
+def test_flush_on_size() -> None:
+    sender = FakeSender()
+    coalescer = FetchCoalescer(leader_for, sender, max_partitions_per_request=2)
+    coalescer.fetch([FetchInterest("a", 0, 0, 100)], lambda r: None)
+    assert sender.sent == []
+    coalescer.fetch([FetchInterest("a", 2, 0, 100)], lambda r: None)
+    assert len(sender.sent) == 1
+
+    # One caller's interests are split too, and their results merged.
+    results: list[FetchResult] = []
+    coalescer.fetch(
+        [FetchInterest("a", p, 0, 100) for p in (0, 2, 4, 6, 8)], results.append
+    )
+    assert len(sender.sent) == 3
+    coalescer.flush()
+    assert [len(s[1].topics[0].partitions) for s in sender.sent[1:]] == [2, 2, 1]
+    for _, request, on_response, _ in sender.sent[1:]:
+        assert results == []
+        on_response(respond(request))
+    assert [sorted(r) for r in results] == [[("a", p) for p in (0, 2, 4, 6, 8)]]
+
+
+def test_errors() -> None:
+    sender = FakeSender()
+    coalescer = FetchCoalescer(leader_for, sender)
+    errors: list[Exception] = []
+    coalescer.fetch(
+        [FetchInterest("a", 0, 0, 100), FetchInterest("b", 0, 0, 100)],
+        lambda r: None,
+        errors.append,
+    )
+    coalescer.flush()
+    _, request, on_response, _ = sender.sent[0]
+    response = respond(request)
+    response.responses.pop()
+    on_response(response)
+    assert len(errors) == 1
+    assert "No data for b-0" in str(errors[0])
+
+    # Both brokers fail: still one error, and no result after it.
+    errors.clear()
+    results: list[FetchResult] = []
+    coalescer.fetch(
+        [FetchInterest("a", p, 0, 100) for p in range(4)], results.append, errors.append
+    )
+    coalescer.flush()
+    for _, _, _, on_error in sender.sent[1:]:
+        on_error(ConnectionError("Connection closed"))
+    assert [str(e) for e in errors] == ["Connection closed"]
+
+    errors.clear()
+    coalescer.fetch(
+        [FetchInterest("a", p, 0, 100) for p in range(4)], results.append, errors.append
+    )
+    coalescer.flush()
+    (_, _, _, on_error), (_, request, on_response, _) = sender.sent[3:]
+    on_error(ConnectionError("Connection closed"))
+    on_response(respond(request))
+    assert len(errors) == 1
+    assert results == []
+
+
+def handle_fetch(request: MockRequest) -> tuple[Writable, Writable]:
+    buffer = BytesIO(request.frame)
+    RequestHeaderV1.read(buffer)
+    return (
+        ResponseHeaderV0(correlation_id=request.correlation_id),
+        respond(FetchRequestV0.read(buffer)),
+    )
+
+
+def test_over_multiplexer() -> None:
+    with MockBroker({1: handle_fetch}) as broker0, MockBroker(
+        {1: handle_fetch}
+    ) as broker1:
+        mux = Multiplexer({0: broker0.address, 1: broker1.address})
+        coalescer = FetchCoalescer(leader_for, multiplexer_sender(mux))
+        results: list[FetchResult] = []
+        for i in range(10):
+            coalescer.fetch(
+                [FetchInterest("a", p, 0, 100) for p in range(2)]
+                + [FetchInterest(f"t{i}", 0, 0, 100)],
+                results.append,
+            )
+        coalescer.flush()
+        assert mux.run_until_idle(timeout=10)
+        mux.close()
+
+    # Everything is fetched with one request per broker.
+    assert len(results) == 10
+    assert all(len(r) == 3 for r in results)
+    assert len(broker0.requests) == 1
+    assert len(broker1.requests) == 1
+
+
+class CorruptBody:
+    def write(self, buffer: BinaryIO) -> None:
+        # 5 topics, none of which follow.
+        buffer.write(b"\x00\x00\x00\x05")
+
+
+def test_decode_error_over_multiplexer() -> None:
+    def handle_corrupt_fetch(request: MockRequest) -> tuple[Writable, Writable]:
+        return ResponseHeaderV0(correlation_id=request.correlation_id), CorruptBody()
+
+    with MockBroker({1: handle_corrupt_fetch}) as broker:
+        mux = Multiplexer({0: broker.address})
+        coalescer = FetchCoalescer(lambda topic, partition: 0, multiplexer_sender(mux))
+        results: list[FetchResult] = []
+        errors: list[Exception] = []
+        for i in range(3):
+            coalescer.fetch(
+                [FetchInterest("a", p, 0, 100) for p in range(2)],
+                results.append,
+                errors.append,
+            )
+        coalescer.flush()
+        assert mux.run_until_idle(timeout=10)
+        mux.close()
+
+    # Every caller hears about it, once.
+    assert results == []
+    assert len(errors) == 3
+    assert all(isinstance(e, ValueError) for e in errors)
@@ -0,0 +1,218 @@
+from __future__ import annotations
+
+from typing import Callable
+
+import pytest
+
+from fetch_planner import FetchPlanner, PlannerConfig
+from fetch_request_v0 import (
+    FetchRequestTopicPartitionV0,
+    FetchRequestTopicV0,
+    FetchRequestV0,
+    FetchResponseResponsePartitionV0,
+    FetchResponseResponseV0,
+    FetchResponseV0,
+)
+from test_record_batch import encode, make_batch
+
+
+class FakeLog:
+    # Batches of one partition, served the way a v0 broker does:
+    # from the batch with the offset, cut at `partition_max_bytes`.
+
+    def __init__(self) -> None:
+        self.batches: list[tuple[int, bytes]] = []
+        self.next_offset = 0
+
+    def append(self, count: int) -> None:
+        self.batches.append(
+            (self.next_offset, encode(make_batch(self.next_offset, count)))
+        )
+        self.next_offset += count
+
+    def fetch(self, offset: int, max_bytes: int) -> bytes:
+        data = b"".join(
+            batch
+            for i, (base_offset, batch) in enumerate(self.batches)
+            if offset
+            < (
+                self.batches[i + 1][0]
+                if i + 1 < len(self.batches)
+                else self.next_offset
+            )
+        )
+        return data[:max_bytes]
+
+
+def serve(logs: dict[int, FakeLog], request: FetchRequestV0) -> FetchResponseV0:
+    return FetchResponseV0(
+        responses=[
+            FetchResponseResponseV0(
+                topic=t.topic,
+                partitions=[
+                    FetchResponseResponsePartitionV0(
+                        partition_index=p.partition,
+                        error_code=0,
+                        high_watermark=logs[p.partition].next_offset,
+                        records=logs[p.partition].fetch(
+                            p.fetch_offset, p.partition_max_bytes
+                        ),
+                    )
+                    for p in t.partitions
+                ],
+            )
+            for t in request.topics
+        ]
+    )
+
+
+def max_bytes(request: FetchRequestV0) -> dict[int, int]:
+    return {
+        p.partition: p.partition_max_bytes for t in request.topics for p in t.partitions
+    }
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def planner_for(
+    logs: dict[int, FakeLog], budget: int, max_partition_bytes: int | None = None
+) -> tuple[FetchPlanner, Clock]:
+    clock = Clock()
+    planner = FetchPlanner(
+        PlannerConfig(
+            response_budget_bytes=budget,
+            min_partition_bytes=1000,
+            max_partition_bytes=max_partition_bytes or budget,
+        ),
+        clock,
+    )
+    for partition in logs:
+        planner.assign("topic", partition, 0)
+    return planner, clock
+
+
+def test_hot_partition_gets_the_budget() -> None:
+    logs = {p: FakeLog() for p in range(4)}
+    for _ in range(300):
+        logs[0].append(10)
+    logs[1].append(1)
+    planner, clock = planner_for(logs, 40_000)
+
+    for _ in range(2):
+        request = planner.plan()
+        assert sum(max_bytes(request).values()) <= 40_000
+        planner.observe(serve(logs, request))
+        clock.now += 0.1
+
+    request = planner.plan()
+    allocated = max_bytes(request)
+    assert allocated[0] > 30_000
+    assert allocated[1] == allocated[2] == allocated[3] == 1000
+    assert planner.stats("topic", 0).lag
+    assert planner.stats("topic", 1).lag == 0
+    # Lagging, so the broker shouldn't wait.
+    assert (request.max_wait_ms, request.min_bytes) == (0, 1)
+
+
+def test_caught_up_waits() -> None:
+    logs = {p: FakeLog() for p in range(2)}
+    planner, clock = planner_for(logs, 40_000)
+    for _ in range(10):
+        for log in logs.values():
+            log.append(10)
+        planner.observe(serve(logs, planner.plan()))
+        clock.now += 0.5
+
+    request = planner.plan()
+    assert request.max_wait_ms == 500
+    assert 1 < request.min_bytes <= sum(max_bytes(request).values()) // 2
+    for p, log in logs.items():
+        assert planner.stats("topic", p).fetch_offset == log.next_offset
+        assert planner.stats("topic", p).bytes_per_s > 0
+
+
+def test_stuck_partition_grows() -> None:
+    logs = {0: FakeLog()}
+    logs[0].append(200)
+    size = len(logs[0].batches[0][1])
+    planner, _ = planner_for(logs, 4 * size, size // 4)
+
+    requested = []
+    for _ in range(10):
+        request = planner.plan()
+        requested.append(max_bytes(request)[0])
+        batches = planner.observe(serve(logs, request))
+        if batches[("topic", 0)]:
+            break
+    assert requested[0] < size <= requested[-1]
+    assert requested == sorted(requested)
+    assert planner.stats("topic", 0).fetch_offset == 200
+
+
+def drain(
+    logs: dict[int, FakeLog],
+    planner: FetchPlanner,
+    clock: Clock,
+    make_request: Callable[[], FetchRequestV0],
+) -> int:
+    # Round trips until all partitions are read to the end.
+    for trips in range(1000):
+        if all(planner.stats("topic", p).lag == 0 for p in logs):
+            return trips
+        request = make_request()
+        assert sum(max_bytes(request).values()) <= 40_000
+        planner.observe(serve(logs, request))
+        clock.now += 0.1
+    raise AssertionError("Not drained")
+
+
+@pytest.mark.parametrize("hot_batches", [50, 200])
+def test_fewer_round_trips_than_static(hot_batches: int) -> None:
+    # The same budget as the static 10_000 bytes per partition,
+    # so the same peak response size.
+    def make_logs() -> dict[int, FakeLog]:
+        logs = {p: FakeLog() for p in range(4)}
+        for _ in range(hot_batches):
+            logs[0].append(10)
+        for p in range(1, 4):
+            logs[p].append(3)
+        return logs
+
+    logs = make_logs()
+    # Only tracks the positions for the static requests.
+    tracker, clock = planner_for(logs, 40_000)
+
+    def static() -> FetchRequestV0:
+        return FetchRequestV0(
+            replica_id=-1,
+            max_wait_ms=3000,
+            min_bytes=1,
+            topics=[
+                FetchRequestTopicV0(
+                    topic="topic",
+                    partitions=[
+                        FetchRequestTopicPartitionV0(
+                            partition=p,
+                            fetch_offset=tracker.stats("topic", p).fetch_offset,
+                            partition_max_bytes=10_000,
+                        )
+                        for p in logs
+                    ],
+                )
+            ],
+        )
+
+    tracker.observe(serve(logs, static()))
+    static_trips = drain(logs, tracker, clock, static)
+
+    logs = make_logs()
+    planner, clock = planner_for(logs, 40_000)
+    planner.observe(serve(logs, planner.plan()))
+    planned_trips = drain(logs, planner, clock, planner.plan)
+    assert planned_trips < static_trips
@@ -0,0 +1,195 @@
+import cProfile
+import pstats
+import re
+import sys
+from dataclasses import dataclass
+from io import BytesIO
+from typing import BinaryIO
+
+import pytest
+
+import read_write
+
+from api_registry import lookup
+from api_versions_v3 import ApiVersionsResponseV3
+from compiled import is_compiled
+from fetch_request_v0 import (
+    FetchResponseResponsePartitionV0,
+    FetchResponseResponseV0,
+    FetchResponseV0,
+)
+from field_spans import patch_field, read_field, read_with_path, trace_read
+from framing import encode_frame
+from mock_broker import default_api_versions_response
+from read_write import DecodeError, read_int16, read_int32, write_int32, write_int64
+from record_batch import RecordBatch
+from request_response_headers import ResponseHeaderV1
+from test_metadata_v12 import make_metadata_response
+from test_record_batch import encode, make_batch
+
+
+def _encode(message: object) -> bytearray:
+    buf = BytesIO()
+    message.write(buf)  # type: ignore[attr-defined]
+    return bytearray(buf.getvalue())
+
+
+def test_api_versions() -> None:
+    data = _encode(default_api_versions_response())
+    message, spans = trace_read(ApiVersionsResponseV3.read, BytesIO(data))
+    assert message == default_api_versions_response()
+    assert list(spans)[:6] == [
+        ("error_code", 0, 2),
+        ("api_keys", 2, 24),
+        ("api_keys[0]", 3, 10),
+        ("api_keys[0].api_key", 3, 5),
+        ("api_keys[0].min_version", 5, 7),
+        ("api_keys[0].max_version", 7, 9),
+    ]
+    assert spans.span("throttle_time_ms") == (24, 28)
+    assert spans.span("_unknownTaggedFields") == (28, 29)
+    assert len(data) == 29
+
+    patch_field(data, spans, "throttle_time_ms", write_int32, 500)
+    patched = ApiVersionsResponseV3.read(BytesIO(data))
+    assert patched.throttle_time_ms == 500
+    assert patched.api_keys == message.api_keys
+
+
+def test_fetch_response() -> None:
+    response = FetchResponseV0(
+        responses=[
+            FetchResponseResponseV0(
+                topic=f"topic-{t}",
+                partitions=[
+                    FetchResponseResponsePartitionV0(
+                        partition_index=p,
+                        error_code=0,
+                        high_watermark=1000 * t + p,
+                        records=b"x" * p if p else None,
+                    )
+                    for p in range(3)
+                ],
+            )
+            for t in range(2)
+        ]
+    )
+    data = _encode(response)
+    _, spans = trace_read(FetchResponseV0.read, BytesIO(data))
+
+    path = "responses[1].partitions[2]"
+    assert read_field(data, spans, path, FetchResponseResponsePartitionV0.read) == (
+        response.responses[1].partitions[2]
+    )
+    assert [p for p, _, _ in spans.subtree(path)] == [
+        path,
+        f"{path}.partition_index",
+        f"{path}.error_code",
+        f"{path}.high_watermark",
+        f"{path}.records",
+    ]
+    patch_field(data, spans, f"{path}.high_watermark", write_int64, 2**40)
+    patched = FetchResponseV0.read(BytesIO(data))
+    assert patched.responses[1].partitions[2].high_watermark == 2**40
+    patched.responses[1].partitions[2].high_watermark = 1002
+    assert patched == response
+
+
+@pytest.mark.skipif(
+    is_compiled(read_write), reason="elements of compiled arrays aren't traced"
+)
+def test_primitive_arrays() -> None:
+    response = make_metadata_response()
+    data = _encode(response)
+    _, spans = trace_read(type(response).read, BytesIO(data))
+    path = "topics[2].partitions[7].replica_nodes"
+    assert read_field(data, spans, f"{path}[1]", read_int32) == 3
+    assert [p for p, _, _ in spans.subtree(path)] == [path, f"{path}[0]", f"{path}[1]"]
+    # Offsets are positions in the buffer, not in the message.
+    buffer = BytesIO(b"\x00" * 10 + data)
+    buffer.seek(10)
+    _, shifted = trace_read(type(response).read, buffer)
+    assert shifted.span(path)[0] == spans.span(path)[0] + 10
+
+
+def test_patch_size_mismatch() -> None:
+    data = _encode(default_api_versions_response())
+    _, spans = trace_read(ApiVersionsResponseV3.read, BytesIO(data))
+    with pytest.raises(ValueError, match="error_code takes 2 bytes"):
+        patch_field(data, spans, "error_code", write_int32, 1)
+    with pytest.raises(ValueError, match="No field nope"):
+        spans.span("nope")
+
+
+@dataclass
+class _OutOfOrder:
+    a: int
+
+    @classmethod
+    def read(cls, buffer: BinaryIO) -> "_OutOfOrder":
+        read_int16(buffer)
+        return _OutOfOrder(a=read_int16(buffer))
+
+
+def test_convention_violation() -> None:
+    previous = sys.getprofile()
+    with pytest.raises(ValueError, match="reads more fields than it declares"):
+        trace_read(_OutOfOrder.read, BytesIO(b"\x00" * 4))
+    assert sys.getprofile() is previous
+    with pytest.raises(ValueError, match="Only `read` classmethods"):
+        trace_read(read_int32, BytesIO(b"\x00" * 4))
+    # Documented as not traceable.
+    with pytest.raises(ValueError):
+        trace_read(RecordBatch.read, BytesIO(encode(make_batch(0, 3))))
+
+
+def test_active_profiler() -> None:
+    response = make_metadata_response()
+    data = bytes(_encode(response))
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        with pytest.raises(ValueError, match="profiler is active"):
+            trace_read(type(response).read, BytesIO(data))
+        # Decoding errors are still raised, just without the path.
+        with pytest.raises(DecodeError) as e:
+            read_with_path(type(response).read, BytesIO(data[:100]))
+        assert e.value.path is None
+    finally:
+        profiler.disable()
+    # The profiler kept working.
+    assert "trace_read" in pstats.Stats(profiler).get_stats_profile().func_profiles
+
+
+def test_decode_error_path() -> None:
+    response = make_metadata_response()
+    data = bytes(_encode(response))
+    _, spans = trace_read(type(response).read, BytesIO(data))
+    path = "topics[2].partitions[7].replica_nodes"
+    start, _ = spans.span(path)
+    # A huge compact array length.
+    corrupt = data[:start] + b"\xff\xff\xff\xff\x07" + data[start + 1 :]
+
+    with pytest.raises(DecodeError, match=f"^{re.escape(path)}: array of length"):
+        read_with_path(type(response).read, BytesIO(corrupt))
+    with pytest.raises(DecodeError) as e:
+        trace_read(type(response).read, BytesIO(corrupt))
+    assert e.value.path == path
+
+    # Truncated.
+    with pytest.raises(DecodeError) as e:
+        read_with_path(
+            type(response).read,
+            BytesIO(data[: spans.span("topics[2].partitions[7]")[0] + 5]),
+        )
+    assert e.value.path is not None and e.value.path.startswith(
+        "topics[2].partitions[7]."
+    )
+
+    header = ResponseHeaderV1(correlation_id=1, _unknownTaggedFields=[])
+    frame = encode_frame(header, response)[4:]
+    assert lookup(3, 12).read_response(BytesIO(frame)) == (header, response)
+    # The registry decodes without tracing.
+    with pytest.raises(DecodeError) as e:
+        lookup(3, 12).read_response(BytesIO(frame[: len(frame) // 2]))
+    assert e.value.path is None
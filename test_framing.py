@@ -0,0 +1,44 @@
+from io import BytesIO
+from typing import BinaryIO
+
+import pytest
+
+from framing import FrameAssembler, encode_frame
+from request_response_headers import ResponseHeaderV0
+from read_write import write_int32
+
+
+def test_encode_frame() -> None:
+    class Message:
+        def write(self, buffer: BinaryIO) -> None:
+            buffer.write(b"abc")
+
+    frame = encode_frame(ResponseHeaderV0(correlation_id=7), Message())
+    assert frame == b"\x00\x00\x00\x07" + b"\x00\x00\x00\x07" + b"abc"
+
+
+def make_stream(frames: list[bytes]) -> bytes:
+    buf = BytesIO()
+    for frame in frames:
+        write_int32(len(frame), buf)
+        buf.write(frame)
+    return buf.getvalue()
+
+
+FRAMES = [b"first", b"", b"x" * 1000, b"last"]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 4, 5, 7, 1000, 10_000])
+def test_frame_assembler(chunk_size: int) -> None:
+    stream = make_stream(FRAMES)
+    assembler = FrameAssembler()
+    result = []
+    for i in range(0, len(stream), chunk_size):
+        result.extend(assembler.feed(stream[i : i + chunk_size]))
+    assert result == FRAMES
+
+
+def test_frame_assembler_invalid_size() -> None:
+    assembler = FrameAssembler(max_frame_size=100)
+    with pytest.raises(ValueError, match="Invalid frame size 101"):
+        assembler.feed(make_stream([b"x" * 101]))
@@ -0,0 +1,126 @@
+import json
+import random
+import socket
+from typing import Iterator
+
+import pytest
+
+import api_versions_v3
+import instrumentation
+from framing import encode_frame
+from instrumentation import Histogram, Metrics
+from mock_broker import MockBroker, default_api_versions_response
+from multiplexer import Multiplexer
+from request_response_headers import ResponseHeaderV0
+from test_multiplexer import api_versions_frame
+
+
+@pytest.fixture
+def metrics() -> Iterator[Metrics]:
+    yield instrumentation.enable()
+    instrumentation.disable()
+
+
+@pytest.mark.parametrize("sub_bucket_bits", [1, 3, 5])
+def test_histogram_buckets(sub_bucket_bits: int) -> None:
+    h = Histogram(sub_bucket_bits)
+    previous = -1
+    for value in list(range(5000)) + [2**40 + 12345, 2**63 - 1]:
+        i = h.bucket(value)
+        low, high = h.bucket_bounds(i)
+        assert low <= value <= high
+        # Relative error is bounded.
+        assert high - low <= max(0, low >> sub_bucket_bits)
+        assert i >= previous
+        previous = i
+    assert h.bucket(2**63 - 1) == len(h.counts) - 1
+
+
+def test_histogram_percentiles() -> None:
+    h = Histogram()
+    rng = random.Random(1)
+    values = [rng.randint(1, 10**6) for _ in range(10_000)]
+    assert len(set(values)) > 9000
+    for v in values:
+        h.record(v)
+    values.sort()
+    assert h.count == 10_000
+    assert h.sum == sum(values)
+    assert (h.min, h.max) == (values[0], values[-1])
+    for q in (50, 90, 99):
+        exact = values[round(len(values) * q / 100) - 1]
+        assert exact <= h.percentile(q) <= exact * 1.125
+    assert h.percentile(100) == values[-1]
+    assert Histogram().percentile(50) == 0
+
+
+def test_disabled_by_default() -> None:
+    assert instrumentation.metrics is None
+    with socket.socket() as sock:
+        assert instrumentation.key(sock, 18, 3) is None
+
+
+def test_request_stages(metrics: Metrics) -> None:
+    with MockBroker() as broker:
+        with socket.create_connection(broker.address) as sock:
+            for correlation_id in range(10):
+                api_versions_v3.send_request(correlation_id, sock)
+                api_versions_v3.read_response(correlation_id, sock)
+
+    broker_name = f"{broker.address[0]}:{broker.address[1]}"
+    key = (18, 3, broker_name)
+    for stage in (
+        instrumentation.SEND,
+        instrumentation.RECEIVE,
+        instrumentation.HEADER_DECODE,
+        instrumentation.BODY_DECODE,
+    ):
+        h = metrics.histograms[(stage, *key)]
+        assert h.count == 10
+        assert h.min > 0
+    assert metrics.bytes_out[key] == 10 * len(api_versions_frame(0))
+    response = encode_frame(
+        ResponseHeaderV0(correlation_id=0), default_api_versions_response()
+    )
+    assert metrics.bytes_in[key] == 10 * len(response)
+
+    snapshot = json.loads(metrics.to_json())
+    assert snapshot == metrics.snapshot()
+    assert {h["stage"] for h in snapshot["histograms"]} == {
+        "send",
+        "receive",
+        "header_decode",
+        "body_decode",
+    }
+    assert snapshot["bytes"] == [
+        {
+            "api_key": 18,
+            "api_version": 3,
+            "broker": broker_name,
+            "out": metrics.bytes_out[key],
+            "in": metrics.bytes_in[key],
+        }
+    ]
+
+
+def test_multiplexer_latency(metrics: Metrics) -> None:
+    with MockBroker() as broker:
+        mux = Multiplexer({7: broker.address})
+        for _ in range(20):
+            mux.send(7, api_versions_frame(mux.next_correlation_id()), lambda f: None)
+        assert mux.run_until_idle(timeout=10)
+        mux.close()
+
+    h = metrics.histograms[(instrumentation.LATENCY, 18, 3, 7)]
+    assert h.count == 20
+    assert metrics.bytes_out[(18, 3, 7)] == 20 * len(api_versions_frame(0))
+
+
+def test_disabled_records_nothing() -> None:
+    metrics = instrumentation.enable()
+    instrumentation.disable()
+    with MockBroker() as broker:
+        with socket.create_connection(broker.address) as sock:
+            api_versions_v3.send_request(1, sock)
+            api_versions_v3.read_response(1, sock)
+    assert metrics.snapshot() == {"histograms": [], "bytes": []}
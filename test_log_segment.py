@@ -0,0 +1,79 @@
+from pathlib import Path
+
+from log_segment import LogSegment, OFFSET_INDEX_ENTRY, TIME_INDEX_ENTRY
+from record_batch import RecordBatch
+from test_record_batch import encode, make_batch
+
+BASE_OFFSET = 1000
+
+
+def write_segment(directory: Path, preallocated_entries: int = 0) -> Path:
+    # 10 batches of 3 records each, every other one is indexed.
+    batches = [make_batch(BASE_OFFSET + i * 3, 3) for i in range(10)]
+    for i, batch in enumerate(batches):
+        batch.base_timestamp = batch.max_timestamp = 1000 * i
+    log = b""
+    index = b""
+    time_index = b""
+    for i, batch in enumerate(batches):
+        if i % 2 == 1:
+            index += OFFSET_INDEX_ENTRY.pack(batch.base_offset - BASE_OFFSET, len(log))
+            time_index += TIME_INDEX_ENTRY.pack(
+                batch.max_timestamp, batch.last_offset - BASE_OFFSET
+            )
+        log += encode(batch)
+
+    stem = directory / f"{BASE_OFFSET:020d}"
+    log_path = Path(f"{stem}.log")
+    log_path.write_bytes(log)
+    Path(f"{stem}.index").write_bytes(
+        index + b"\x00" * OFFSET_INDEX_ENTRY.size * preallocated_entries
+    )
+    Path(f"{stem}.timeindex").write_bytes(
+        time_index + b"\x00" * TIME_INDEX_ENTRY.size * preallocated_entries
+    )
+    return log_path
+
+
+def test_scan(tmp_path: Path) -> None:
+    with LogSegment(str(write_segment(tmp_path))) as segment:
+        assert segment.base_offset == BASE_OFFSET
+        batches = list(segment.batches())
+        assert [b.last_offset for b in batches] == [
+            BASE_OFFSET + i * 3 + 2 for i in range(10)
+        ]
+
+
+def test_start_offset(tmp_path: Path) -> None:
+    for preallocated_entries in [0, 100]:
+        with LogSegment(str(write_segment(tmp_path, preallocated_entries))) as segment:
+            views = list(segment.batch_views(start_offset=BASE_OFFSET + 13))
+            assert views[0].base_offset == BASE_OFFSET + 12
+            assert len(views) == 6
+            assert list(segment.batch_views(start_offset=BASE_OFFSET + 100)) == []
+
+
+def test_offset_for_timestamp(tmp_path: Path) -> None:
+    with LogSegment(str(write_segment(tmp_path, 10))) as segment:
+        assert segment.offset_for_timestamp(0) == BASE_OFFSET
+        assert segment.offset_for_timestamp(3000) == BASE_OFFSET + 9
+        assert segment.offset_for_timestamp(3500) == BASE_OFFSET + 12
+        assert segment.offset_for_timestamp(100_000) is None
+
+
+def test_without_indexes(tmp_path: Path) -> None:
+    log_path = write_segment(tmp_path)
+    Path(str(log_path).replace(".log", ".index")).unlink()
+    Path(str(log_path).replace(".log", ".timeindex")).unlink()
+    with LogSegment(str(log_path)) as segment:
+        first = next(segment.batches(start_offset=BASE_OFFSET + 4))
+        assert isinstance(first, RecordBatch)
+        assert first.base_offset == BASE_OFFSET + 3
+        assert segment.offset_for_timestamp(3000) == BASE_OFFSET + 9
+
+
+def test_empty_segment(tmp_path: Path) -> None:
+    log_path = tmp_path / f"{0:020d}.log"
+    log_path.write_bytes(b"")
+    with LogSegment(str(log_path)) as segment:
+        assert list(segment.batches()) == []
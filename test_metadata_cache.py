@@ -0,0 +1,165 @@
+from uuid import UUID
+
+from api_registry import API_REGISTRY
+from metadata_cache import (
+    METADATA_API_VERSION,
+    MetadataCache,
+    BrokerInfo,
+    PartitionLeader,
+)
+from metadata_v12 import (
+    MetadataResponseV12,
+    MetadataResponseBrokerV12,
+    MetadataResponseTopicV12,
+    MetadataResponsePartitionV12,
+)
+from test_api_versions_cache import FakeClock
+
+TOPIC_ID_1 = UUID("45963434-3053-4af2-825c-4cc77e9aeabe")
+TOPIC_ID_2 = UUID("1473eb8c-203a-46ee-bfc9-ebb9e30d1e97")
+
+
+def make_topic(
+    name: str | None,
+    topic_id: UUID,
+    leaders: list[int],
+    error_code: int = 0,
+    leader_epoch: int = 0,
+) -> MetadataResponseTopicV12:
+    return MetadataResponseTopicV12(
+        error_code=error_code,
+        name=name,
+        topic_id=topic_id,
+        is_internal=False,
+        partitions=[
+            MetadataResponsePartitionV12(
+                error_code=0,
+                partition_index=i,
+                leader_id=leader_id,
+                leader_epoch=leader_epoch,
+                replica_nodes=[leader_id],
+                isr_nodes=[leader_id],
+                offline_replicas=[],
+                _unknownTaggedFields=[],
+            )
+            for i, leader_id in enumerate(leaders)
+        ],
+        topic_authorized_operations=0,
+        _unknownTaggedFields=[],
+    )
+
+
+def make_response(*topics: MetadataResponseTopicV12) -> MetadataResponseV12:
+    return MetadataResponseV12(
+        throttle_time_ms=0,
+        brokers=[
+            MetadataResponseBrokerV12(
+                node_id=node_id,
+                host="localhost",
+                port=9091 + node_id,
+                rack=None,
+                _unknownTaggedFields=[],
+            )
+            for node_id in [1, 2]
+        ],
+        cluster_id="cluster",
+        controller_id=1,
+        topics=list(topics),
+        _unknownTaggedFields=[],
+    )
+
+
+def test_routing() -> None:
+    cache = MetadataCache()
+    changed = cache.update(
+        make_response(
+            make_topic("a", TOPIC_ID_1, [1, 2]), make_topic("b", TOPIC_ID_2, [2])
+        )
+    )
+    assert changed == {"a", "b"}
+    assert cache.cluster_id == "cluster"
+    assert cache.leader("a", 1) == PartitionLeader(leader_id=2, leader_epoch=0)
+    assert cache.leader_broker("a", 0) == BrokerInfo(
+        node_id=1, host="localhost", port=9092, rack=None
+    )
+    assert cache.leader("a", 2) is None
+    assert cache.partitions("a") == [0, 1]
+    assert cache.topic_name(TOPIC_ID_2) == "b"
+    assert cache.topic_id("a") == TOPIC_ID_1
+
+
+def test_incremental_update() -> None:
+    cache = MetadataCache()
+    cache.update(
+        make_response(
+            make_topic("a", TOPIC_ID_1, [1, 2]), make_topic("b", TOPIC_ID_2, [2])
+        )
+    )
+
+    # Only the changed topic is reported, unmentioned topics stay.
+    changed = cache.update(
+        make_response(make_topic("a", TOPIC_ID_1, [1, 1], leader_epoch=1))
+    )
+    assert changed == {"a"}
+    assert cache.leader("a", 1) == PartitionLeader(leader_id=1, leader_epoch=1)
+    assert cache.leader("b", 0) == PartitionLeader(leader_id=2, leader_epoch=0)
+
+    assert cache.update(make_response(make_topic("b", TOPIC_ID_2, [2]))) == set()
+
+    # A full update drops the topics that are gone.
+    assert cache.update(make_response(make_topic("b", TOPIC_ID_2, [2])), full=True) == {
+        "a"
+    }
+    assert cache.leader("a", 0) is None
+    assert cache.topic_name(TOPIC_ID_1) is None
+
+
+def test_topic_identified_by_id_only() -> None:
+    cache = MetadataCache()
+    cache.update(make_response(make_topic("a", TOPIC_ID_1, [1])))
+    assert cache.update(make_response(make_topic(None, TOPIC_ID_1, [2]))) == {"a"}
+    assert cache.leader("a", 0) == PartitionLeader(leader_id=2, leader_epoch=0)
+
+
+def test_topic_error_removes_topic() -> None:
+    cache = MetadataCache()
+    cache.update(make_response(make_topic("a", TOPIC_ID_1, [1])))
+    assert cache.update(
+        make_response(make_topic("a", TOPIC_ID_1, [], error_code=3))
+    ) == {"a"}
+    assert cache.leader("a", 0) is None
+
+
+def test_refresh() -> None:
+    clock = FakeClock()
+    cache = MetadataCache(ttl_s=10, clock=clock)
+    assert cache.needs_refresh()
+
+    cache.update(
+        make_response(
+            make_topic("a", TOPIC_ID_1, [1]), make_topic("b", TOPIC_ID_2, [-1])
+        )
+    )
+    # No leader for "b" yet.
+    assert cache.stale_topics() == {"b"}
+    assert cache.needs_refresh()
+
+    cache.update(make_response(make_topic("b", TOPIC_ID_2, [2])))
+    assert not cache.needs_refresh()
+
+    assert not cache.handle_error("a", 0)
+    assert cache.handle_error("a", 6)
+    assert cache.needs_refresh()
+    request = cache.build_refresh_request()
+    assert isinstance(request, API_REGISTRY[(3, METADATA_API_VERSION)].request_type)
+    assert request.topics is not None
+    assert [t.name for t in request.topics] == ["a"]
+
+    cache.update(make_response(make_topic("a", TOPIC_ID_1, [2])))
+    assert not cache.needs_refresh()
+
+    clock.now += 10
+    assert cache.needs_refresh()
+    request = cache.build_refresh_request()
+    assert request.topics is not None
+    assert [t.name for t in request.topics] == ["a", "b"]
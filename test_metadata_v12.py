@@ -0,0 +1,132 @@
+from io import BytesIO
+from uuid import UUID
+
+from metadata_v12 import (
+    MetadataRequestV12,
+    MetadataRequestTopicV12,
+    MetadataResponseV12,
+    MetadataResponseBrokerV12,
+    MetadataResponseTopicV12,
+    MetadataResponsePartitionV12,
+)
+from raw_tagged_fields import RawTaggedField
+
+
+def make_metadata_response() -> MetadataResponseV12:
+    # Many brokers, topics and partitions, with tagged fields.
+    return MetadataResponseV12(
+        throttle_time_ms=10,
+        brokers=[
+            MetadataResponseBrokerV12(
+                node_id=i,
+                host=f"broker-{i}.example.com",
+                port=9092,
+                rack=None if i % 2 else "rack-a",
+                _unknownTaggedFields=[RawTaggedField(tag=5, data=b"xyz")],
+            )
+            for i in range(5)
+        ],
+        cluster_id="cluster",
+        controller_id=1,
+        topics=[
+            MetadataResponseTopicV12(
+                error_code=0,
+                name=f"topic-{t}",
+                topic_id=UUID(int=t + 1),
+                is_internal=False,
+                partitions=[
+                    MetadataResponsePartitionV12(
+                        error_code=0,
+                        partition_index=p,
+                        leader_id=p % 5,
+                        leader_epoch=3,
+                        replica_nodes=[p % 5, (p + 1) % 5],
+                        isr_nodes=[p % 5],
+                        offline_replicas=[],
+                        _unknownTaggedFields=[],
+                    )
+                    for p in range(50)
+                ],
+                topic_authorized_operations=-2147483648,
+                _unknownTaggedFields=[],
+            )
+            for t in range(3)
+        ],
+        _unknownTaggedFields=[],
+    )
+
+
+def test_request_all_topics() -> None:
+    buf = BytesIO()
+    MetadataRequestV12(
+        topics=None,
+        allow_auto_topic_creation=True,
+        include_topic_authorized_operations=False,
+        _unknownTaggedFields=[],
+    ).write(buf)
+    assert buf.getvalue() == b"\x00\x01\x00\x00"
+
+
+def test_request_topics() -> None:
+    buf = BytesIO()
+    MetadataRequestV12(
+        topics=[
+            MetadataRequestTopicV12(topic_id=None, name="t", _unknownTaggedFields=[])
+        ],
+        allow_auto_topic_creation=False,
+        include_topic_authorized_operations=False,
+        _unknownTaggedFields=[],
+    ).write(buf)
+    assert buf.getvalue() == b"\x02" + b"\x00" * 16 + b"\x02t\x00" + b"\x00\x00\x00"
+
+
+def test_response() -> None:
+    value = MetadataResponseV12(
+        throttle_time_ms=10,
+        brokers=[
+            MetadataResponseBrokerV12(
+                node_id=1,
+                host="localhost",
+                port=9092,
+                rack=None,
+                _unknownTaggedFields=[],
+            ),
+            MetadataResponseBrokerV12(
+                node_id=2,
+                host="localhost",
+                port=9093,
+                rack="rack-a",
+                _unknownTaggedFields=[RawTaggedField(tag=5, data=b"xyz")],
+            ),
+        ],
+        cluster_id="cluster",
+        controller_id=1,
+        topics=[
+            MetadataResponseTopicV12(
+                error_code=0,
+                name="test-topic1",
+                topic_id=UUID("45963434-3053-4af2-825c-4cc77e9aeabe"),
+                is_internal=False,
+                partitions=[
+                    MetadataResponsePartitionV12(
+                        error_code=0,
+                        partition_index=0,
+                        leader_id=1,
+                        leader_epoch=3,
+                        replica_nodes=[1, 2],
+                        isr_nodes=[1],
+                        offline_replicas=[2],
+                        _unknownTaggedFields=[],
+                    )
+                ],
+                topic_authorized_operations=-2147483648,
+                _unknownTaggedFields=[],
+            )
+        ],
+        _unknownTaggedFields=[],
+    )
+    buf = BytesIO()
+    value.write(buf)
+    buf.seek(0)
+    assert MetadataResponseV12.read(buf) == value
+    assert buf.read() == b""
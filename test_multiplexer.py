@@ -0,0 +1,107 @@
+import socket
+from functools import partial
+from io import BytesIO
+
+import pytest
+
+from api_versions_v3 import ApiVersionsRequestV3, ApiVersionsResponseV3
+from framing import encode_frame
+from mock_broker import MockBroker
+from multiplexer import Multiplexer
+from request_response_headers import RequestHeaderV2, ResponseHeaderV0
+
+
+def api_versions_frame(correlation_id: int) -> bytes:
+    return encode_frame(
+        RequestHeaderV2(
+            request_api_key=18,
+            request_api_version=3,
+            correlation_id=correlation_id,
+            client_id="test-client",
+            _unknownTaggedFields=[],
+        ),
+        ApiVersionsRequestV3(
+            client_software_name="test-client",
+            client_software_version="1",
+            _unknownTaggedFields=[],
+        ),
+    )
+
+
+def test_many_requests_across_brokers() -> None:
+    with MockBroker() as broker1, MockBroker() as broker2:
+        mux = Multiplexer({1: broker1.address, 2: broker2.address})
+        received: dict[int, tuple[int, ApiVersionsResponseV3]] = {}
+
+        def on_response(node_id: int, correlation_id: int, frame: bytearray) -> None:
+            buffer = BytesIO(frame)
+            header = ResponseHeaderV0.read(buffer)
+            assert header.correlation_id == correlation_id
+            received[correlation_id] = (node_id, ApiVersionsResponseV3.read(buffer))
+
+        for _ in range(200):
+            correlation_id = mux.next_correlation_id()
+            node_id = 1 + correlation_id % 2
+            mux.send(
+                node_id,
+                api_versions_frame(correlation_id),
+                partial(on_response, node_id, correlation_id),
+            )
+        assert mux.in_flight == 200
+        assert mux.run_until_idle(timeout=10)
+        mux.close()
+
+    assert len(received) == 200
+    assert all(node_id == 1 + c % 2 for c, (node_id, _) in received.items())
+    assert broker1.accepted_connections == 1
+    assert broker2.accepted_connections == 1
+
+
+def test_connection_failure_is_reported() -> None:
+    # Take a free port and close it, so nothing listens there.
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    address = sock.getsockname()
+    sock.close()
+
+    mux = Multiplexer({1: address})
+    errors: list[Exception] = []
+    mux.send(1, api_versions_frame(1), lambda frame: None, errors.append)
+    assert mux.run_until_idle(timeout=5)
+    assert len(errors) == 1
+    assert isinstance(errors[0], ConnectionError)
+
+
+def test_callback_error_fails_only_its_request() -> None:
+    with MockBroker() as broker:
+        mux = Multiplexer({1: broker.address})
+        errors: dict[int, Exception] = {}
+        received: list[int] = []
+
+        def broken(frame: bytearray) -> None:
+            raise ValueError("Can't decode")
+
+        mux.send(1, api_versions_frame(1), broken, partial(errors.__setitem__, 1))
+        mux.send(
+            1,
+            api_versions_frame(2),
+            lambda frame: received.append(2),
+            partial(errors.__setitem__, 2),
+        )
+        assert mux.run_until_idle(timeout=10)
+        assert list(errors) == [1]
+        assert str(errors[1]) == "Can't decode"
+        assert received == [2]
+
+        # Without an error callback, the error comes out of `poll`.
+        mux.send(1, api_versions_frame(3), broken)
+        with pytest.raises(ValueError, match="Can't decode"):
+            while mux.in_flight:
+                mux.poll(timeout=10)
+
+        # The connection is still up.
+        mux.send(1, api_versions_frame(4), lambda frame: received.append(4))
+        assert mux.run_until_idle(timeout=10)
+        assert received == [2, 4]
+        mux.close()
+    assert broker.accepted_connections == 1
@@ -0,0 +1,202 @@
+import socket
+import threading
+from io import BytesIO
+from typing import BinaryIO
+
+import pytest
+
+from api_versions_v0 import ApiVersionsResponseV0
+from api_versions_v3 import ApiVersionsRequestV3, ApiVersionsResponseV3
+from framing import Writable, encode_frame, receive_frame
+from mock_broker import MockBroker, MockRequest, default_api_versions_response
+from proxy import ProxiedRequest, Proxy, ProxyEngine
+from read_write import DecodeError, write_int16, write_int32
+from request_response_headers import (
+    RequestHeaderV1,
+    RequestHeaderV2,
+    ResponseHeaderV0,
+)
+
+
+def api_versions_frame(correlation_id: int, client_id: str = "test-client") -> bytes:
+    return encode_frame(
+        RequestHeaderV2(
+            request_api_key=18,
+            request_api_version=3,
+            correlation_id=correlation_id,
+            client_id=client_id,
+            _unknownTaggedFields=[],
+        ),
+        ApiVersionsRequestV3(
+            client_software_name=client_id,
+            client_software_version="1",
+            _unknownTaggedFields=[],
+        ),
+    )
+
+
+def api_versions_response_frame(correlation_id: int) -> bytes:
+    return encode_frame(
+        ResponseHeaderV0(correlation_id=correlation_id),
+        default_api_versions_response(),
+    )
+
+
+def test_engine_rewrites_correlation_ids() -> None:
+    engine = ProxyEngine()
+    original = api_versions_frame(7)
+    frame = bytearray(original)
+    proxied = engine.request("a", frame)
+    assert (proxied.api_key, proxied.api_version) == (18, 3)
+    assert proxied.correlation_id == 7
+    assert proxied.client_id == "test-client"
+    assert proxied.request is None
+    # Only the correlation id changes.
+    assert frame[:8] == original[:8]
+    assert frame[8:12] == proxied.upstream_correlation_id.to_bytes(4, "big")
+    assert frame[12:] == original[12:]
+
+    # The same correlation id from another client.
+    other = engine.request("b", bytearray(api_versions_frame(7)))
+    assert other.upstream_correlation_id != proxied.upstream_correlation_id
+    assert engine.in_flight == 2
+
+    response = bytearray(api_versions_response_frame(proxied.upstream_correlation_id))
+    assert engine.response(response) is proxied
+    assert response == api_versions_response_frame(7)
+    assert engine.in_flight == 1
+
+    with pytest.raises(ValueError, match="Unexpected correlation id"):
+        engine.response(bytearray(api_versions_response_frame(12345)))
+
+
+def test_engine_decodes_selected_api_keys() -> None:
+    engine = ProxyEngine(decode_api_keys=[18])
+    proxied = engine.request("a", bytearray(api_versions_frame(1)))
+    assert isinstance(proxied.request, ApiVersionsRequestV3)
+    engine.response(
+        bytearray(api_versions_response_frame(proxied.upstream_correlation_id))
+    )
+    assert proxied.response == default_api_versions_response()
+
+    # A version `api_registry` doesn't know is forwarded without decoding.
+    frame = encode_frame(
+        RequestHeaderV1(
+            request_api_key=18,
+            request_api_version=2,
+            correlation_id=2,
+            client_id="old-client",
+        ),
+        ApiVersionsRequestV3(
+            client_software_name="", client_software_version="", _unknownTaggedFields=[]
+        ),
+    )
+    proxied = engine.request("a", bytearray(frame))
+    assert proxied.client_id == "old-client"
+    assert proxied.request is None
+
+
+def test_proxy_multiplexes_clients() -> None:
+    requests: list[ProxiedRequest] = []
+    responses: list[ProxiedRequest] = []
+    with (
+        MockBroker() as broker,
+        Proxy(
+            broker.address,
+            decode_api_keys=[18],
+            on_request=requests.append,
+            on_response=responses.append,
+        ) as proxy,
+    ):
+        errors: list[BaseException] = []
+
+        def run_client(name: str) -> None:
+            try:
+                with socket.create_connection(proxy.address) as sock:
+                    # Pipelined, with the same correlation ids in every client.
+                    for correlation_id in range(20):
+                        sock.sendall(api_versions_frame(correlation_id, name))
+                    for correlation_id in range(20):
+                        buffer = BytesIO(receive_frame(sock))
+                        header = ResponseHeaderV0.read(buffer)
+                        assert header.correlation_id == correlation_id
+                        response = ApiVersionsResponseV3.read(buffer)
+                        assert response == default_api_versions_response()
+            except BaseException as e:
+                errors.append(e)
+
+        clients = [
+            threading.Thread(target=run_client, args=(f"client-{i}",)) for i in range(4)
+        ]
+        for client in clients:
+            client.start()
+        for client in clients:
+            client.join()
+        assert errors == []
+
+    # One upstream connection with unique correlation ids.
+    assert broker.accepted_connections == 1
+    assert len(broker.requests) == 80
+    assert len({r.correlation_id for r in broker.requests}) == 80
+    # Bodies are forwarded untouched.
+    proxied = {r.upstream_correlation_id: r for r in requests}
+    for request in broker.requests:
+        client_request = proxied[request.correlation_id]
+        assert client_request.client_id is not None
+        expected = api_versions_frame(
+            client_request.correlation_id, client_request.client_id
+        )
+        assert request.frame[8:] == expected[12:]
+    assert {r.client_id for r in requests} == {f"client-{i}" for i in range(4)}
+    assert all(isinstance(r.request, ApiVersionsRequestV3) for r in requests)
+    assert len(responses) == 80
+    assert all(r.response == default_api_versions_response() for r in responses)
+    assert proxy.engine.in_flight == 0
+
+
+class UnsupportedVersionBody:
+    # What brokers answer ApiVersions requests of versions they don't support
+    # with: UNSUPPORTED_VERSION in the v0 format, which has no `write`.
+    def write(self, buffer: BinaryIO) -> None:
+        write_int16(35, buffer)
+        write_int32(1, buffer)
+        for value in (18, 0, 2):
+            write_int16(value, buffer)
+
+
+def handle_unsupported_version(request: MockRequest) -> tuple[Writable, Writable]:
+    return (
+        ResponseHeaderV0(correlation_id=request.correlation_id),
+        UnsupportedVersionBody(),
+    )
+
+
+def test_decode_errors_dont_stop_forwarding() -> None:
+    engine = ProxyEngine(decode_api_keys=[18])
+    # Cut short inside the body.
+    frame = bytearray(api_versions_frame(1))
+    frame = frame[: len(frame) - 3]
+    frame[:4] = (len(frame) - 4).to_bytes(4, "big")
+    proxied = engine.request("a", frame)
+    assert proxied.request is None
+    assert isinstance(proxied.decode_error, DecodeError)
+    assert proxied.decode_error.path == "client_software_version"
+    assert engine.in_flight == 1
+
+    responses: list[ProxiedRequest] = []
+    with (
+        MockBroker({18: handle_unsupported_version}) as broker,
+        Proxy(
+            broker.address, decode_api_keys=[18], on_response=responses.append
+        ) as proxy,
+    ):
+        with socket.create_connection(proxy.address) as sock:
+            for correlation_id in range(2):
+                sock.sendall(api_versions_frame(correlation_id))
+                buffer = BytesIO(receive_frame(sock))
+                assert ResponseHeaderV0.read(buffer).correlation_id == correlation_id
+                assert ApiVersionsResponseV0.read(buffer).error_code == 35
+
+    assert len(responses) == 2
+    assert all(r.response is None for r in responses)
+    assert all(isinstance(r.decode_error, ValueError) for r in responses)
@@ -1,9 +1,19 @@
+import time
+import tracemalloc
 from io import BytesIO
+from typing import BinaryIO, Callable
 from uuid import UUID
 
 import pytest
 
+from fetch_request_v0 import (
+    FetchResponseResponsePartitionV0,
+    FetchResponseResponseV0,
+    FetchResponseV0,
+)
+from raw_tagged_fields import read_unknown_tagged_fields
 from read_write import (
+    DecodeError,
     write_boolean,
     read_boolean,
     write_int8,
@@ -16,12 +26,22 @@ from read_write import (
     write_int64,
     write_uint16,
     read_uint16,
+    write_uint32,
+    read_uint32,
     write_float64,
     read_float64,
     write_unsigned_varint,
     read_unsigned_varint,
+    write_varint,
+    read_varint,
+    write_varlong,
+    read_varlong,
     write_uuid,
     read_uuid,
+    read_uuid_bytes,
+    read_uuid_int,
+    write_uuid_bytes,
+    write_uuid_int,
     write_string,
     read_string,
     write_nullable_string,
@@ -121,6 +141,21 @@ def test_uint16_out_of_range(value: bool) -> None:
         write_uint16(value, BytesIO())
 
 
+@pytest.mark.parametrize("value", [0, 1, 2**32 - 1])
+def test_uint32(value: bool) -> None:
+    buf = BytesIO()
+    write_uint32(value, buf)
+    buf.seek(0)
+    read_value = read_uint32(buf)
+    assert read_value == value
+
+
+@pytest.mark.parametrize("value", [-1, 2**32])
+def test_uint32_out_of_range(value: bool) -> None:
+    with pytest.raises(ValueError, match=f"Value {value} is out of range for UINT32"):
+        write_uint32(value, BytesIO())
+
+
 @pytest.mark.parametrize("value", [-3460.123, -1000, -1, 0, 1.01, 5000.9, 1000.12])
 def test_float64(value: float) -> None:
     buf = BytesIO()
@@ -168,6 +203,47 @@ def test_unsigned_varint_out_of_range(value: bool) -> None:
         write_unsigned_varint(value, BytesIO())
 
 
+@pytest.mark.parametrize(
+    ("value", "expected_value"),
+    [
+        (0, b"\x00"),
+        (-1, b"\x01"),
+        (1, b"\x02"),
+        (-64, b"\x7f"),
+        (64, b"\x80\x01"),
+        (300, b"\xd8\x04"),
+        (2**31 - 1, b"\xfe\xff\xff\xff\x0f"),
+        (-(2**31), b"\xff\xff\xff\xff\x0f"),
+    ],
+)
+def test_varint(value: int, expected_value: bytes) -> None:
+    buf = BytesIO()
+    write_varint(value, buf)
+    assert buf.getvalue() == expected_value
+    buf.seek(0)
+    assert read_varint(buf) == value
+
+
+@pytest.mark.parametrize("value", [-(2**31) - 1, 2**31])
+def test_varint_out_of_range(value: int) -> None:
+    with pytest.raises(ValueError, match=f"Value {value} is out of range for VARINT"):
+        write_varint(value, BytesIO())
+
+
+@pytest.mark.parametrize("value", [0, -1, 1, 300, 10**12, 2**63 - 1, -(2**63)])
+def test_varlong(value: int) -> None:
+    buf = BytesIO()
+    write_varlong(value, buf)
+    buf.seek(0)
+    assert read_varlong(buf) == value
+
+
+@pytest.mark.parametrize("value", [-(2**63) - 1, 2**63])
+def test_varlong_out_of_range(value: int) -> None:
+    with pytest.raises(ValueError, match=f"Value {value} is out of range for VARLONG"):
+        write_varlong(value, BytesIO())
+
+
 @pytest.mark.parametrize(
     "value",
     [
@@ -187,6 +263,34 @@ def test_uuid(value: UUID | None) -> None:
     assert read_value == value
 
 
+@pytest.mark.parametrize(
+    "value",
+    [
+        None,
+        UUID("45963434-3053-4af2-825c-4cc77e9aeabe"),
+        UUID("ffffffff-ffff-ffff-ffff-ffffffffffff"),
+    ],
+)
+def test_uuid_raw(value: UUID | None) -> None:
+    buf = BytesIO()
+    write_uuid(value, buf)
+    encoded = buf.getvalue()
+
+    assert read_uuid_bytes(BytesIO(encoded)) == (None if value is None else value.bytes)
+    assert read_uuid_int(BytesIO(encoded)) == (None if value is None else value.int)
+    buf = BytesIO()
+    write_uuid_bytes(None if value is None else value.bytes, buf)
+    write_uuid_int(None if value is None else value.int, buf)
+    assert buf.getvalue() == encoded * 2
+
+
+def test_uuid_raw_invalid() -> None:
+    with pytest.raises(ValueError, match="UUID must be 16 bytes, got 3"):
+        write_uuid_bytes(b"abc", BytesIO())
+    with pytest.raises(ValueError, match="out of range for UUID"):
+        write_uuid_int(2**128, BytesIO())
+
+
 @pytest.mark.parametrize("compact", [True, False])
 @pytest.mark.parametrize("value", ["", "abcd", "XXXXXXXX"])
 def test_string(compact: bool, value: str) -> None:
@@ -262,3 +366,109 @@ def test_nullable_array(compact: bool, value: list[int] | None) -> None:
     buf.seek(0)
     read_value = read_nullable_array(read_int32, buf, compact)
     assert read_value == value
+
+
+def _corrupt_input_cases() -> list[tuple[str, bytes, object]]:
+    huge_compact = b"\xff\xff\xff\xff\x07"
+    return [
+        ("array", b"\x7f\xff\xff\xff" + b"\x00" * 10, _read_int32_array),
+        ("array", huge_compact + b"\x00" * 10, _read_compact_string_array),
+        ("bytes", b"\x7f\xff\xff\xff" + b"\x00" * 10, _read_bytes),
+        ("tagged fields", huge_compact + b"\x00" * 10, read_unknown_tagged_fields),
+        (
+            "tagged field",
+            b"\x01\x00" + huge_compact + b"\x00" * 10,
+            read_unknown_tagged_fields,
+        ),
+    ]
+
+
+def _read_int32_array(buffer: BinaryIO) -> object:
+    return read_array(read_int32, buffer, False)
+
+
+def _read_compact_string_array(buffer: BinaryIO) -> object:
+    return read_array(lambda b: read_string(b, True), buffer, True)
+
+
+def _read_bytes(buffer: BinaryIO) -> object:
+    return read_bytes(buffer, False)
+
+
+@pytest.mark.parametrize(("what", "data", "read"), _corrupt_input_cases())
+def test_corrupt_length(what: str, data: bytes, read: Callable[..., object]) -> None:
+    tracemalloc.start()
+    start = time.perf_counter()
+    with pytest.raises(DecodeError, match=f"^{what} of length .* doesn't fit"):
+        read(BytesIO(data))
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert elapsed < 0.1
+    assert peak < 64 * 1024
+
+
+def test_min_element_size() -> None:
+    # 3 elements of 4 bytes don't fit in 11 bytes.
+    buf = BytesIO()
+    write_int32(3, buf)
+    buf.write(b"\x00" * 11)
+    buf.seek(0)
+    with pytest.raises(
+        DecodeError, match="array of length 3 doesn't fit in the remaining 11"
+    ):
+        read_array(read_int32, buf, False)
+
+    buf = BytesIO()
+    write_int32(-2, buf)
+    buf.seek(0)
+    with pytest.raises(DecodeError, match="array has invalid length -2"):
+        read_nullable_array(read_int32, buf, False)
+
+
+def test_decode_error() -> None:
+    error = DecodeError("Buffer underflow: expected 4, got 1")
+    assert isinstance(error, ValueError)
+    assert str(error) == "Buffer underflow: expected 4, got 1"
+    error.path = "topics[1].name"
+    assert str(error) == "topics[1].name: Buffer underflow: expected 4, got 1"
+
+    with pytest.raises(DecodeError, match="Varint is too long"):
+        read_varint(BytesIO(b"\xff" * 10))
+    with pytest.raises(DecodeError, match="Varint is too long"):
+        read_varlong(BytesIO(b"\xff" * 11))
+
+
+def test_large_frame_isnt_copied() -> None:
+    # Length checks must not export the buffer: `BytesIO(bytes).getbuffer()`
+    # copies the whole frame.
+    size = 16 * 1024 * 1024
+    response = FetchResponseV0(
+        responses=[
+            FetchResponseResponseV0(
+                topic="t",
+                partitions=[
+                    FetchResponseResponsePartitionV0(
+                        partition_index=p,
+                        error_code=0,
+                        high_watermark=0,
+                        records=bytes(size // 4),
+                    )
+                    for p in range(4)
+                ],
+            )
+        ]
+    )
+    buffer = BytesIO()
+    response.write(buffer)
+    frame = buffer.getvalue()
+    del buffer
+
+    tracemalloc.start()
+    try:
+        assert FetchResponseV0.read(BytesIO(frame)) == response
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    # The `records` fields are copied out, the frame itself isn't.
+    assert peak < size * 1.25
@@ -0,0 +1,219 @@
+import random
+import types
+from io import BytesIO
+from typing import Any, Callable
+from uuid import UUID
+
+import pytest
+
+import metadata_v12
+import raw_tagged_fields
+import read_write
+import read_write_unchecked
+import record_batch
+from metadata_v12 import MetadataResponseV12
+from read_write_unchecked import INT32_RANGE, UINT16_RANGE, check_range
+from test_metadata_v12 import make_metadata_response
+from test_record_batch import make_batch
+
+rnd = random.Random(42)
+
+
+def _ints(bits: int, signed: bool) -> list[int]:
+    low, high = (
+        (-(2 ** (bits - 1)), 2 ** (bits - 1) - 1) if signed else (0, 2**bits - 1)
+    )
+    edges = [low, low + 1, -1 if signed else 1, 0, 1, 127, 128, high - 1, high]
+    return [v for v in edges if low <= v <= high] + [
+        rnd.randint(low, high) for _ in range(100)
+    ]
+
+
+SCALARS: list[tuple[str, list[Any]]] = [
+    ("int8", _ints(8, True)),
+    ("int16", _ints(16, True)),
+    ("int32", _ints(32, True)),
+    ("int64", _ints(64, True)),
+    ("uint16", _ints(16, False)),
+    ("uint32", _ints(32, False)),
+    ("unsigned_varint", _ints(31, False)),
+    ("varint", _ints(32, True)),
+    ("varlong", _ints(64, True)),
+    ("boolean", [True, False]),
+    ("float64", [-3460.123, 0.0, 1.01, 1e300]),
+    ("uuid", [None, UUID("45963434-3053-4af2-825c-4cc77e9aeabe")]),
+    ("uuid_bytes", [None, UUID("45963434-3053-4af2-825c-4cc77e9aeabe").bytes]),
+    ("uuid_int", [None, 1, 2**128 - 1]),
+]
+
+
+def _encode(write: Callable[..., None], *args: Any) -> bytes:
+    buf = BytesIO()
+    write(*args, buf)
+    return buf.getvalue()
+
+
+@pytest.mark.parametrize(("name", "values"), SCALARS)
+def test_scalars_identical(name: str, values: list[Any]) -> None:
+    for value in values:
+        strict = _encode(getattr(read_write, f"write_{name}"), value)
+        assert _encode(getattr(read_write_unchecked, f"write_{name}"), value) == strict
+        assert getattr(read_write_unchecked, f"read_{name}")(BytesIO(strict)) == value
+
+
+@pytest.mark.parametrize("compact", [True, False])
+@pytest.mark.parametrize(
+    ("name", "value"),
+    [
+        ("string", ""),
+        ("string", "abcd"),
+        ("string", "ü" * 200),
+        ("nullable_string", None),
+        ("nullable_string", "x"),
+        ("bytes", b""),
+        ("bytes", b"\x00" * 300),
+        ("nullable_bytes", None),
+        ("nullable_bytes", b"abc"),
+    ],
+)
+def test_variable_length_identical(name: str, value: Any, compact: bool) -> None:
+    strict = _encode(
+        lambda v, b: getattr(read_write, f"write_{name}")(v, b, compact), value
+    )
+    unchecked = _encode(
+        lambda v, b: getattr(read_write_unchecked, f"write_{name}")(v, b, compact),
+        value,
+    )
+    assert unchecked == strict
+    read = getattr(read_write_unchecked, f"read_{name}")
+    assert read(BytesIO(strict), compact) == value
+
+
+@pytest.mark.parametrize("compact", [True, False])
+@pytest.mark.parametrize("value", [None, [], [1], [-(2**31), 0, 2**31 - 1]])
+def test_arrays_identical(compact: bool, value: list[int] | None) -> None:
+    strict = BytesIO()
+    read_write.write_nullable_array(value, read_write.write_int32, strict, compact)
+    unchecked = BytesIO()
+    read_write_unchecked.write_nullable_array(
+        value, read_write_unchecked.write_int32, unchecked, compact
+    )
+    assert unchecked.getvalue() == strict.getvalue()
+    if value is not None:
+        packed = BytesIO()
+        read_write_unchecked.write_int32_array(value, packed, compact)
+        assert packed.getvalue() == strict.getvalue()
+        packed.seek(0)
+        assert read_write_unchecked.read_int32_array(packed, compact) == value
+
+
+@pytest.mark.parametrize("compact", [True, False])
+def test_int64_array_identical(compact: bool) -> None:
+    value = _ints(64, True)
+    strict = BytesIO()
+    read_write.write_array(value, read_write.write_int64, strict, compact)
+    packed = BytesIO()
+    read_write_unchecked.write_int64_array(value, packed, compact)
+    assert packed.getvalue() == strict.getvalue()
+    packed.seek(0)
+    assert read_write_unchecked.read_int64_array(packed, compact) == value
+
+
+def test_check_range() -> None:
+    check_range([], INT32_RANGE, "INT32")
+    check_range([0, 2**16 - 1], UINT16_RANGE, "UINT16")
+    check_range(iter([0, 1]), UINT16_RANGE, "UINT16")
+    with pytest.raises(ValueError, match="Value -1 is out of range for UINT16"):
+        check_range([0, -1, 5], UINT16_RANGE, "UINT16")
+    with pytest.raises(ValueError, match="Value 65536 is out of range for UINT16"):
+        check_range([2**16], UINT16_RANGE, "UINT16")
+
+
+@pytest.mark.parametrize("value", [-1, -5, -(2**31)])
+def test_negative_unsigned_varint(value: int) -> None:
+    with pytest.raises(ValueError):
+        read_write_unchecked.write_unsigned_varint(value, BytesIO())
+
+
+def _use_unchecked(monkeypatch: pytest.MonkeyPatch, module: types.ModuleType) -> None:
+    # The tier is a drop-in replacement, so a message module
+    # can be switched to it just by rebinding its imports.
+    for name, value in vars(module).copy().items():
+        if getattr(value, "__module__", None) == "read_write" and hasattr(
+            read_write_unchecked, name
+        ):
+            monkeypatch.setattr(module, name, getattr(read_write_unchecked, name))
+
+
+def test_message_identical(monkeypatch: pytest.MonkeyPatch) -> None:
+    response = make_metadata_response()
+    batch = make_batch(base_offset=100, count=10)
+    strict_response = BytesIO()
+    response.write(strict_response)
+    strict_batch = BytesIO()
+    batch.write(strict_batch)
+
+    for module in (metadata_v12, raw_tagged_fields, record_batch):
+        _use_unchecked(monkeypatch, module)
+    assert metadata_v12.write_int32 is read_write_unchecked.write_int32
+
+    unchecked_response = BytesIO()
+    response.write(unchecked_response)
+    assert unchecked_response.getvalue() == strict_response.getvalue()
+    unchecked_response.seek(0)
+    assert MetadataResponseV12.read(unchecked_response) == response
+
+    unchecked_batch = BytesIO()
+    batch.write(unchecked_batch)
+    assert unchecked_batch.getvalue() == strict_batch.getvalue()
+    unchecked_batch.seek(0)
+    assert record_batch.RecordBatch.read(unchecked_batch).records == batch.records
+
+
+def test_write_unchecked() -> None:
+    response = make_metadata_response()
+    strict = BytesIO()
+    response.write(strict)
+    unchecked = BytesIO()
+    response.write_unchecked(unchecked)
+    assert unchecked.getvalue() == strict.getvalue()
+
+    raw = metadata_v12.MetadataResponseRawIdV12.read(BytesIO(strict.getvalue()))
+    unchecked = BytesIO()
+    raw.write_unchecked(unchecked)
+    assert unchecked.getvalue() == strict.getvalue()
+
+
+@pytest.mark.parametrize(
+    ("corrupt", "match"),
+    [
+        (lambda r: setattr(r.topics[1], "error_code", 2**15), "for INT16"),
+        (
+            lambda r: setattr(r.topics[2].partitions[3], "error_code", -(2**15) - 1),
+            "for INT16",
+        ),
+        (lambda r: setattr(r, "controller_id", 2**31), "for INT32"),
+        (
+            lambda r: r.topics[0].partitions[7].isr_nodes.append(-(2**31) - 1),
+            "for INT32",
+        ),
+        (lambda r: setattr(r.brokers[2], "port", 2**32), "for INT32"),
+        (
+            lambda r: setattr(r.brokers[3], "rack", "x" * 2**15),
+            "string has invalid length",
+        ),
+        (
+            lambda r: setattr(r.topics[0], "name", "ü" * 2**14),
+            "string has invalid length",
+        ),
+    ],
+)
+def test_write_unchecked_checks(
+    corrupt: Callable[[MetadataResponseV12], None], match: str
+) -> None:
+    response = make_metadata_response()
+    corrupt(response)
+    with pytest.raises(ValueError, match=match):
+        response.write(BytesIO())
+    with pytest.raises(ValueError, match=match):
+        response.write_unchecked(BytesIO())
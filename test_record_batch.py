@@ -0,0 +1,155 @@
+from io import BytesIO
+
+import pytest
+
+from read_write import (
+    DecodeError,
+    write_int8,
+    write_int32,
+    write_int64,
+    write_uint32,
+    write_varint,
+)
+from record_batch import (
+    LegacyMessage,
+    Record,
+    RecordBatch,
+    RecordHeader,
+    crc32c,
+    iter_batches,
+    read_batches,
+)
+
+
+def make_batch(base_offset: int, count: int, attributes: int = 0) -> RecordBatch:
+    return RecordBatch(
+        base_offset=base_offset,
+        partition_leader_epoch=1,
+        magic=2,
+        crc=0,
+        attributes=attributes,
+        last_offset_delta=count - 1,
+        base_timestamp=1_700_000_000_000,
+        max_timestamp=1_700_000_000_000 + count - 1,
+        producer_id=-1,
+        producer_epoch=-1,
+        base_sequence=-1,
+        records=[
+            Record(
+                attributes=0,
+                timestamp_delta=i,
+                offset_delta=i,
+                key=None if i % 2 else f"key{i}".encode(),
+                value=f"value{i}".encode() * i,
+                headers=[RecordHeader(key="h", value=None if i % 3 else b"v")],
+            )
+            for i in range(count)
+        ],
+    )
+
+
+def encode(*batches: RecordBatch) -> bytes:
+    buf = BytesIO()
+    for batch in batches:
+        batch.write(buf)
+    return buf.getvalue()
+
+
+def test_crc32c() -> None:
+    assert crc32c(b"123456789") == 0xE3069283
+
+
+@pytest.mark.parametrize("attributes", [0, 1])
+def test_record_batch(attributes: int) -> None:
+    batch = make_batch(100, 5, attributes)
+    buf = BytesIO(encode(batch))
+    read_batch = RecordBatch.read(buf)
+    assert buf.read() == b""
+
+    assert read_batch.crc != 0
+    batch.crc = read_batch.crc
+    assert read_batch == batch
+    assert read_batch.last_offset == 104
+
+
+def test_iter_batches() -> None:
+    data = encode(make_batch(0, 3), make_batch(3, 2), make_batch(5, 1))
+    views = list(iter_batches(data))
+    assert [(v.base_offset, v.last_offset, v.magic) for v in views] == [
+        (0, 2, 2),
+        (3, 4, 2),
+        (5, 5, 2),
+    ]
+    assert all(v.verify_crc() for v in views)
+    assert views[0].max_timestamp == 1_700_000_000_002
+    assert views[1].position == len(encode(make_batch(0, 3)))
+
+    # A truncated last batch, as in Fetch responses, is skipped.
+    assert len(list(iter_batches(data[:-1]))) == 2
+    assert [b.last_offset for b in read_batches(data)] == [2, 4, 5]
+
+
+def test_corrupted_crc() -> None:
+    data = bytearray(encode(make_batch(0, 3)))
+    data[-1] ^= 0xFF
+    assert not next(iter_batches(data)).verify_crc()
+
+
+def test_legacy_message() -> None:
+    buf = BytesIO()
+    write_int64(42, buf)
+    write_int32(4 + 1 + 1 + 8 + 4 + 3 + 4 + 5, buf)
+    write_uint32(0, buf)
+    write_int8(1, buf)
+    write_int8(0, buf)
+    write_int64(1_700_000_000_000, buf)
+    write_int32(3, buf)
+    buf.write(b"key")
+    write_int32(5, buf)
+    buf.write(b"value")
+
+    (view,) = list(iter_batches(buf.getvalue()))
+    assert view.max_timestamp == 1_700_000_000_000
+    (batch,) = list(read_batches(buf.getvalue()))
+    assert batch == LegacyMessage(
+        offset=42,
+        crc=0,
+        magic=1,
+        attributes=0,
+        timestamp=1_700_000_000_000,
+        key=b"key",
+        value=b"value",
+    )
+
+
+@pytest.mark.parametrize(
+    ("position", "value", "what"),
+    [
+        # The records count of the batch.
+        (57, b"\x7f\xff\xff\xff", "records"),
+        # The headers count of the first record, 0 or 1 before.
+        (-1, b"\xfe\xff\xff\xff\x0f", "record headers"),
+    ],
+)
+def test_corrupt_counts(position: int, value: bytes, what: str) -> None:
+    batch = make_batch(0, 1)
+    batch.records[0].headers = []
+    data = encode(batch)
+    if position < 0:
+        # The headers count is the last byte of the only record.
+        data = data[:position] + value
+        # Fix up the lengths, so the corruption is in the count only.
+        batch_length = len(data) - 12
+        data = data[:8] + batch_length.to_bytes(4, "big") + data[12:]
+    else:
+        data = data[:position] + value + data[position + len(value) :]
+    with pytest.raises(DecodeError, match=f"^{what} of length"):
+        RecordBatch.read(BytesIO(data))
+
+
+def test_negative_header_key_length() -> None:
+    header = BytesIO()
+    write_varint(-3, header)
+    header.write(b"abc")
+    with pytest.raises(DecodeError, match="header key has invalid length -3"):
+        RecordHeader.read(BytesIO(header.getvalue()))
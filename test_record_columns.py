@@ -0,0 +1,80 @@
+import pytest
+
+from read_write import DecodeError
+from record_batch import COMPRESSION_GZIP, TIMESTAMP_TYPE_MASK
+from record_columns import read_columns
+from test_record_batch import encode, make_batch
+
+
+def test_read_columns() -> None:
+    batches = [make_batch(100, 5), make_batch(105, 1), make_batch(200, 7)]
+    data = encode(*batches)
+    # A partial batch at the end.
+    columns = read_columns(data + encode(make_batch(300, 2))[:-3])
+
+    records = [(b, r) for b in batches for r in b.records]
+    assert len(columns) == len(records)
+    assert list(columns.offsets) == [b.base_offset + r.offset_delta for b, r in records]
+    assert list(columns.timestamps) == [
+        b.base_timestamp + r.timestamp_delta for b, r in records
+    ]
+    assert list(columns.header_counts) == [len(r.headers) for _, r in records]
+    for i, (_, r) in enumerate(records):
+        key = columns.key(data, i)
+        assert (None if key is None else bytes(key)) == r.key
+        value = columns.value(data, i)
+        assert (None if value is None else bytes(value)) == r.value
+    assert columns.key_starts[1] == columns.key_lengths[1] == -1
+
+
+def test_log_append_time() -> None:
+    batch = make_batch(0, 3, TIMESTAMP_TYPE_MASK)
+    columns = read_columns(encode(batch))
+    assert list(columns.timestamps) == [batch.max_timestamp] * 3
+
+
+def test_unsupported() -> None:
+    with pytest.raises(ValueError, match="Compressed batch at offset 10"):
+        read_columns(encode(make_batch(10, 3, COMPRESSION_GZIP)))
+
+    for count in (2, 4):
+        data = bytearray(encode(make_batch(0, 3), make_batch(3, 3)))
+        # The records count at the start of the batch is wrong.
+        data[57:61] = count.to_bytes(4, byteorder="big")
+        with pytest.raises(
+            DecodeError, match="Record batch at offset 0 has a wrong CRC"
+        ):
+            read_columns(data)
+        with pytest.raises(DecodeError, match="Record batch at offset 0 doesn't match"):
+            read_columns(data, verify_crc=False)
+
+
+@pytest.mark.parametrize(
+    ("position", "value", "error"),
+    [
+        # The first record starts at 61: its length, attributes, timestamp delta
+        # and offset delta, then the key length (4) and the key, the value length (0)
+        # and the headers count (1) at 71. Zigzag varints, 1 is -1.
+        (65, 64, "Record key in batch at offset 0 goes past the end"),
+        (65, 20, "Varint goes past the end of its record"),
+        (61, 0, "Record in batch at offset 0 has invalid length 0"),
+        (61, 1, "Record in batch at offset 0 has invalid length -1"),
+        (71, 1, "Record in batch at offset 0 has invalid headers count -1"),
+    ],
+)
+def test_corrupted(position: int, value: int, error: str) -> None:
+    data = bytearray(encode(make_batch(0, 3)))
+    assert (data[65], data[70], data[71]) == (8, 0, 2)
+    data[position] = value
+    with pytest.raises(DecodeError, match="Record batch at offset 0 has a wrong CRC"):
+        read_columns(data)
+    with pytest.raises(DecodeError, match=error):
+        read_columns(data, verify_crc=False)
+
+
+def test_numpy() -> None:
+    numpy = pytest.importorskip("numpy")
+    columns = read_columns(encode(make_batch(100, 5)))
+    arrays = columns.as_numpy()
+    assert arrays["offsets"].dtype == numpy.int64
+    assert list(arrays["offsets"][arrays["value_lengths"] > 6]) == [102, 103, 104]
@@ -0,0 +1,93 @@
+import sys
+from io import BytesIO
+from uuid import UUID
+
+import pytest
+
+import read_write
+from metadata_cache import PartitionLeader
+from metadata_v12 import MetadataResponseRawIdV12, MetadataResponseV12
+from test_metadata_cache import TOPIC_ID_1, TOPIC_ID_2, make_response, make_topic
+from topic_id_cache import TopicIdCache
+
+
+def _encode(response: MetadataResponseV12) -> bytes:
+    buf = BytesIO()
+    response.write(buf)
+    return buf.getvalue()
+
+
+def _topic_id(i: int) -> UUID:
+    return UUID(int=i + 1)
+
+
+def test_raw_id_decode(monkeypatch: pytest.MonkeyPatch) -> None:
+    response = make_response(
+        *[make_topic(f"topic-{i}", _topic_id(i), [1, 2] * 50) for i in range(100)],
+        make_topic(None, TOPIC_ID_1, [1], error_code=100),
+    )
+    response.topics[-1].topic_id = None
+    data = _encode(response)
+
+    def no_uuids(*args: object, **kwargs: object) -> UUID:
+        raise AssertionError("UUID created")
+
+    monkeypatch.setattr(read_write, "UUID", no_uuids)
+    raw = MetadataResponseRawIdV12.read(BytesIO(data))
+    assert [t.topic_id for t in raw.topics] == [
+        _topic_id(i).bytes for i in range(100)
+    ] + [None]
+    monkeypatch.undo()
+
+    buf = BytesIO()
+    raw.write(buf)
+    assert buf.getvalue() == data
+
+
+def test_resolve() -> None:
+    cache = TopicIdCache()
+    response = make_response(
+        make_topic("".join(["topic", "-1"]), TOPIC_ID_1, [1, -1, 2], leader_epoch=3),
+        make_topic("".join(["topic", "-2"]), TOPIC_ID_2, [2]),
+    )
+    raw = MetadataResponseRawIdV12.read(BytesIO(_encode(response)))
+    assert cache.update(raw) == 2
+
+    route = cache.resolve(TOPIC_ID_1.bytes)
+    assert route is not None
+    assert route.name == "topic-1"
+    assert route.leaders == {
+        0: PartitionLeader(leader_id=1, leader_epoch=3),
+        2: PartitionLeader(leader_id=2, leader_epoch=3),
+    }
+    # Any form of the ID resolves to the same route.
+    assert cache.resolve(TOPIC_ID_1.int) is route
+    assert cache.resolve(TOPIC_ID_1) is route
+    # Interned.
+    assert cache.topic_name(TOPIC_ID_2) is sys.intern("topic-2")
+    assert cache.resolve(UUID(int=1)) is None
+    assert (cache.hits, cache.misses) == (4, 1)
+
+    # Also accepts responses decoded with `UUID`s.
+    cache.update(make_response(make_topic("topic-1", TOPIC_ID_1, [], error_code=100)))
+    assert TOPIC_ID_1 not in cache
+    assert len(cache) == 1
+
+
+def test_eviction() -> None:
+    cache = TopicIdCache(max_topics=2)
+    for i in range(3):
+        cache.put(_topic_id(i).bytes, f"topic-{i}")
+        # The first one is used all the time.
+        assert cache.resolve(_topic_id(0).int) is not None
+    assert len(cache) == 2
+    assert _topic_id(0) in cache
+    assert _topic_id(1) not in cache
+    assert _topic_id(2) in cache
+
+
+def test_invalid() -> None:
+    with pytest.raises(ValueError, match="Topic ID must be 16 bytes, got 4"):
+        TopicIdCache().put(b"abcd", "topic")
+    with pytest.raises(ValueError, match="max_topics must be positive"):
+        TopicIdCache(0)
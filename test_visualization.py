@@ -0,0 +1,80 @@
+from io import BytesIO, StringIO
+
+import pytest
+
+from read_write import write_int16, write_int32, write_string
+from visualization import (
+    dump_annotated,
+    dump_hex,
+    dump_varint,
+    format_byte,
+    visualize_byte_array,
+    visualize_varint,
+)
+
+
+def test_format_byte() -> None:
+    assert format_byte(0) == "[0|0000000]"
+    assert format_byte(0x96) == "[1|0010110]"
+    assert format_byte(0xFF) == "[1|1111111]"
+    assert visualize_varint(b"\x96\x01") == "[1|0010110] [0|0000001] "
+
+
+def test_visualize_byte_array(capsys: pytest.CaptureFixture[str]) -> None:
+    visualize_byte_array(b"\x00\x0a\xff")
+    visualize_byte_array(b"")
+    assert capsys.readouterr().out == "00 0a ff "
+
+
+@pytest.mark.parametrize("size", [0, 1, 15, 16, 17, 100, 1000])
+@pytest.mark.parametrize("lines_per_chunk", [1, 3, 4096])
+def test_dump_hex(size: int, lines_per_chunk: int) -> None:
+    data = bytes(i % 256 for i in range(size))
+    out = StringIO()
+    dump_hex(data, out, lines_per_chunk=lines_per_chunk)
+    expected = "".join(
+        f"{offset:08x}  "
+        + " ".join("{:02x}".format(b) for b in data[offset : offset + 16])
+        + "\n"
+        for offset in range(0, size, 16)
+    )
+    assert out.getvalue() == expected
+
+
+@pytest.mark.parametrize("size", [0, 1, 7, 8, 9, 100])
+@pytest.mark.parametrize("lines_per_chunk", [1, 3, 4096])
+def test_dump_varint(size: int, lines_per_chunk: int) -> None:
+    data = bytes((i * 37) % 256 for i in range(size))
+    out = StringIO()
+    dump_varint(memoryview(data), out, lines_per_chunk=lines_per_chunk)
+    expected = "".join(
+        f"{offset:08x}  " + visualize_varint(data[offset : offset + 8])[:-1] + "\n"
+        for offset in range(0, size, 8)
+    )
+    assert out.getvalue() == expected
+
+
+def test_dump_annotated() -> None:
+    buf = BytesIO()
+    spans = []
+    start = buf.tell()
+    write_int16(18, buf)
+    spans.append(("header.request_api_key", start, buf.tell()))
+    start = buf.tell()
+    write_int32(7, buf)
+    spans.append(("header.correlation_id", start, buf.tell()))
+    spans.append(("header", 0, buf.tell()))
+    start = buf.tell()
+    write_string("x" * 40, buf, True)
+    spans.append(("body.client_software_name", start, buf.tell()))
+
+    out = StringIO()
+    dump_annotated(buf.getvalue(), spans, out)
+    assert out.getvalue() == (
+        "00000000-00000006  header\n"
+        "00000000-00000002    header.request_api_key: 00 12\n"
+        "00000002-00000006    header.correlation_id: 00 00 00 07\n"
+        "00000006-0000002f  body.client_software_name: 29 "
+        + "78 " * 30
+        + "78 ... (+9 bytes)\n"
+    )
@@ -0,0 +1,169 @@
+import os
+import socket
+from io import BytesIO
+from pathlib import Path
+from typing import cast
+
+import pytest
+
+import api_versions_v3
+from api_versions_v3 import ApiVersionsResponseV3
+from memory_reader import memory_reader
+from mock_broker import MockBroker, default_api_versions_response
+from read_write import (
+    DecodeError,
+    read_int32,
+    read_string,
+    write_int32,
+    write_string,
+)
+from request_response_headers import ResponseHeaderV0
+from wire_capture import (
+    INDEX_ENTRY,
+    REQUEST,
+    RESPONSE,
+    CaptureReader,
+    CaptureWriter,
+    CapturingSocket,
+    replay,
+    with_header,
+)
+
+
+def test_memory_reader() -> None:
+    buf = BytesIO()
+    write_int32(123, buf)
+    write_string("abc", buf, True)
+    reader = memory_reader(memoryview(buf.getvalue())[0:])
+    assert read_int32(reader) == 123
+    assert reader.tell() == 4
+    assert read_string(reader, True) == "abc"
+    assert reader.read(1) == b""
+    reader.seek(2)
+    assert reader.read() == b"\x00\x7b\x04abc"
+
+
+def test_writer_and_reader(tmp_path: Path) -> None:
+    path = str(tmp_path / "capture")
+    with CaptureWriter(path) as writer:
+        writer.append(REQUEST, 18, 3, 1, b"request", timestamp_ns=10)
+        writer.append(RESPONSE, 18, 3, 1, b"response", timestamp_ns=20)
+    # Appending to an existing capture.
+    with CaptureWriter(path) as writer:
+        writer.append_chunks(
+            RESPONSE, 1, 0, 2, iter([b"chu", b"nked"]), timestamp_ns=30
+        )
+
+    with CaptureReader(path) as reader:
+        assert len(reader) == 3
+        frames = [
+            (
+                f.direction,
+                f.api_key,
+                f.api_version,
+                f.correlation_id,
+                f.timestamp_ns,
+                bytes(f.frame),
+            )
+            for f in reader
+        ]
+    assert frames == [
+        (REQUEST, 18, 3, 1, 10, b"request"),
+        (RESPONSE, 18, 3, 1, 20, b"response"),
+        (RESPONSE, 1, 0, 2, 30, b"chunked"),
+    ]
+
+
+def test_index_never_ahead_of_data(tmp_path: Path) -> None:
+    path = str(tmp_path / "capture")
+    with CaptureWriter(path) as writer:
+        # Index entries are larger than these frames, unflushed entries
+        # would reach the disk first.
+        for i in range(10_000):
+            writer.append(REQUEST, 18, 3, i, b"abcd", timestamp_ns=i)
+            if i % 500 == 0:
+                index = Path(f"{path}.index").read_bytes()[8:]
+                entries = len(index) // INDEX_ENTRY.size
+                if entries:
+                    offset, length, *_ = INDEX_ENTRY.unpack_from(
+                        index, (entries - 1) * INDEX_ENTRY.size
+                    )
+                    assert offset + length <= os.path.getsize(path)
+    with CaptureReader(path) as reader:
+        assert len(reader) == 10_000
+
+
+def test_not_a_capture(tmp_path: Path) -> None:
+    path = tmp_path / "capture"
+    path.write_bytes(b"something else")
+    Path(f"{path}.index").write_bytes(b"")
+    with pytest.raises(ValueError, match="not a capture data file"):
+        CaptureReader(str(path))
+
+
+def test_capture_and_replay(tmp_path: Path) -> None:
+    path = str(tmp_path / "capture")
+    with MockBroker() as broker, CaptureWriter(path) as writer:
+        sock = socket.create_connection(broker.address)
+        capturing = cast(socket.socket, CapturingSocket(sock, writer))
+        for correlation_id in [1, 2, 3]:
+            api_versions_v3.send_request(correlation_id, capturing)
+            _, response = api_versions_v3.read_response(correlation_id, capturing)
+            assert response == default_api_versions_response()
+        capturing.close()
+
+    with CaptureReader(path) as reader:
+        assert [
+            (f.direction, f.api_key, f.api_version, f.correlation_id) for f in reader
+        ] == [
+            (direction, 18, 3, correlation_id)
+            for correlation_id in [1, 2, 3]
+            for direction in [REQUEST, RESPONSE]
+        ]
+        header = ResponseHeaderV0.read(memory_reader(reader[1].frame))
+        assert header.correlation_id == 1
+
+    stats = replay(path, repeat=2)
+    assert stats.decoded[(REQUEST, 18, 3)].frames == 6
+    assert stats.decoded[(RESPONSE, 18, 3)].frames == 6
+    assert stats.skipped == 0
+
+    stats = replay(
+        path,
+        decoders={
+            (RESPONSE, 18, 3): with_header(
+                ResponseHeaderV0.read, ApiVersionsResponseV3.read
+            )
+        },
+    )
+    assert stats.decoded[(RESPONSE, 18, 3)].frames == 3
+    assert stats.skipped == 3
+
+    # A broken frame doesn't stop the replay.
+    with CaptureReader(path) as reader:
+        frames = [
+            (f.direction, f.api_key, f.api_version, f.correlation_id, bytes(f.frame))
+            for f in reader
+        ]
+    broken = str(tmp_path / "broken")
+    with CaptureWriter(broken) as writer:
+        for i, (direction, api_key, api_version, correlation_id, frame) in enumerate(
+            frames
+        ):
+            if i == 1:
+                frame = frame[: len(frame) // 2]
+            writer.append(direction, api_key, api_version, correlation_id, frame)
+    stats = replay(broken, repeat=2)
+    assert stats.decoded[(REQUEST, 18, 3)].frames == 6
+    assert stats.decoded[(RESPONSE, 18, 3)].frames == 4
+    assert list(stats.errors) == [1]
+    assert isinstance(stats.errors[1], DecodeError)
+
+
+def test_frames_outliving_reader(tmp_path: Path) -> None:
+    path = str(tmp_path / "capture")
+    with CaptureWriter(path) as writer:
+        writer.append(REQUEST, 18, 3, 1, b"request")
+    with CaptureReader(path) as reader:
+        frame = reader[0].frame
+    assert bytes(frame) == b"request"
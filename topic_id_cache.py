@@ -0,0 +1,116 @@
+from __future__ import annotations
+
+import sys
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Final
+from uuid import UUID
+
+from metadata_cache import PartitionLeader
+from metadata_v12 import MetadataResponseRawIdV12, MetadataResponseV12
+
+# Resolves topic IDs, as decoded by `read_uuid_bytes`/`read_uuid_int`,
+# to topic names and routing without creating `UUID` objects.
+# Names are interned, so the name of a topic is the same object
+# in every route and every lookup.
+
+TopicId = bytes | int | UUID
+
+DEFAULT_MAX_TOPICS: Final = 10_000
+
+
+def topic_id_key(topic_id: TopicId) -> bytes:
+    # Keys are the raw 16 bytes as they are on the wire.
+    if isinstance(topic_id, bytes):
+        if len(topic_id) != 16:
+            raise ValueError(f"Topic ID must be 16 bytes, got {len(topic_id)}")
+        return topic_id
+    if isinstance(topic_id, UUID):
+        return topic_id.bytes
+    return topic_id.to_bytes(16, byteorder="big")
+
+
+@dataclass
+class TopicRoute:
+    name: str
+    topic_id: bytes
+    # Only partitions with a leader.
+    leaders: dict[int, PartitionLeader] = field(default_factory=dict)
+
+
+class TopicIdCache:
+    # The least recently resolved topics are evicted when there are more
+    # than `max_topics` of them.
+
+    def __init__(self, max_topics: int = DEFAULT_MAX_TOPICS) -> None:
+        if max_topics <= 0:
+            raise ValueError(f"max_topics must be positive, got {max_topics}")
+        self._max_topics = max_topics
+        self._routes: OrderedDict[bytes, TopicRoute] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._routes)
+
+    def __contains__(self, topic_id: TopicId) -> bool:
+        return topic_id_key(topic_id) in self._routes
+
+    def resolve(self, topic_id: TopicId) -> TopicRoute | None:
+        key = topic_id if type(topic_id) is bytes else topic_id_key(topic_id)
+        route = self._routes.get(key)
+        if route is None:
+            self.misses += 1
+            return None
+        self._routes.move_to_end(key)
+        self.hits += 1
+        return route
+
+    def topic_name(self, topic_id: TopicId) -> str | None:
+        route = self.resolve(topic_id)
+        return None if route is None else route.name
+
+    def put(
+        self,
+        topic_id: TopicId,
+        name: str,
+        leaders: dict[int, PartitionLeader] | None = None,
+    ) -> TopicRoute:
+        key = topic_id_key(topic_id)
+        route = TopicRoute(
+            name=sys.intern(name),
+            topic_id=key,
+            leaders=leaders if leaders is not None else {},
+        )
+        self._routes[key] = route
+        self._routes.move_to_end(key)
+        while len(self._routes) > self._max_topics:
+            self._routes.popitem(last=False)
+        return route
+
+    def remove(self, topic_id: TopicId) -> None:
+        self._routes.pop(topic_id_key(topic_id), None)
+
+    def update(self, response: MetadataResponseV12 | MetadataResponseRawIdV12) -> int:
+        # Adds or replaces the routes of the topics in the response.
+        # Topics with errors are removed. Returns the number of routes added.
+        added = 0
+        for topic in response.topics:
+            if topic.topic_id is None:
+                continue
+            if topic.error_code != 0 or topic.name is None:
+                self.remove(topic.topic_id)
+                continue
+            self.put(
+                topic.topic_id,
+                topic.name,
+                {
+                    p.partition_index: PartitionLeader(
+                        leader_id=p.leader_id, leader_epoch=p.leader_epoch
+                    )
+                    for p in topic.partitions
+                    if p.leader_id >= 0
+                },
+            )
+            added += 1
+        return added
@@ -1,16 +1,149 @@
+from __future__ import annotations
+
+import argparse
+import mmap
+import sys
+from typing import Callable, Final, Iterable, TextIO
+
+
 def visualize_byte_array(array: bytes) -> None:
-    for i in array:
-        print("{:02x}".format(i), end=" ")
+    if array:
+        sys.stdout.write(array.hex(" ") + " ")
 
 
 def visualize_varint(array: bytes) -> str:
-    result = ""
-    for b in array:
-        result += format_byte(b) + " "
-    return result
+    return "".join([_VARINT_CELLS[b] for b in array])
 
 
 def format_byte(b: int) -> str:
+    return _VARINT_BYTES[b]
+
+
+def _format_byte(b: int) -> str:
     result = "{:08b}".format(b)
-    result = "[" + result[0] + "|" + result[1:] + "]"
-    return result
+    return "[" + result[0] + "|" + result[1:] + "]"
+
+
+# `[m|ppppppp]`: the "more bytes follow" bit and the payload bits.
+_VARINT_BYTES: Final = [_format_byte(b) for b in range(256)]
+_VARINT_CELLS: Final = [s + " " for s in _VARINT_BYTES]
+
+# Everything below writes to a file object in chunks of many lines.
+# A chunk is formatted at once, with a single `hex` call or table lookups
+# inside one `join`, and then cut into lines of fixed width.
+
+BYTES_PER_LINE: Final = 16
+LINES_PER_CHUNK: Final = 4096
+
+Data = bytes | bytearray | memoryview | mmap.mmap
+
+
+def dump_hex(
+    data: Data,
+    out: TextIO,
+    bytes_per_line: int = BYTES_PER_LINE,
+    lines_per_chunk: int = LINES_PER_CHUNK,
+) -> None:
+    # `00000010  0a 0b ...`, one line per `bytes_per_line` bytes.
+    _dump(data, out, lambda chunk: chunk.hex(" "), 3, bytes_per_line, lines_per_chunk)
+
+
+def dump_varint(
+    data: Data,
+    out: TextIO,
+    bytes_per_line: int = 8,
+    lines_per_chunk: int = LINES_PER_CHUNK,
+) -> None:
+    # `00000008  [1|0010110] [0|0000001] ...`
+    _dump(
+        data,
+        out,
+        lambda chunk: " ".join(map(_VARINT_BYTES.__getitem__, chunk)),
+        12,
+        bytes_per_line,
+        lines_per_chunk,
+    )
+
+
+def _dump(
+    data: Data,
+    out: TextIO,
+    format_chunk: Callable[[memoryview], str],
+    # Of a byte with its separator.
+    width: int,
+    bytes_per_line: int,
+    lines_per_chunk: int,
+) -> None:
+    view = memoryview(data).cast("B")
+    step = bytes_per_line * lines_per_chunk
+    line_width = bytes_per_line * width
+    for chunk_start in range(0, len(view), step):
+        chunk = view[chunk_start : chunk_start + step]
+        formatted = format_chunk(chunk)
+        out.write(
+            "".join(
+                [
+                    f"{chunk_start + i * bytes_per_line:08x}  "
+                    f"{formatted[i * line_width : (i + 1) * line_width - 1]}\n"
+                    for i in range((len(chunk) + bytes_per_line - 1) // bytes_per_line)
+                ]
+            )
+        )
+
+
+# A labelled byte range [start, end) of a frame, e.g. a field recorded while decoding.
+Span = tuple[str, int, int]
+
+
+def dump_annotated(
+    data: Data,
+    spans: Iterable[Span],
+    out: TextIO,
+    max_bytes: int = 32,
+) -> None:
+    # One line per span, nested spans are indented under the enclosing ones.
+    # Only the innermost spans show their bytes, at most `max_bytes` of them.
+    view = memoryview(data).cast("B")
+    ordered = sorted(spans, key=lambda s: (s[1], -s[2]))
+    lines = []
+    # The ends of the enclosing spans.
+    open_ends: list[int] = []
+    for i, (label, start, end) in enumerate(ordered):
+        while open_ends and start >= open_ends[-1]:
+            open_ends.pop()
+        line = f"{start:08x}-{end:08x}  {'  ' * len(open_ends)}{label}"
+        is_leaf = i + 1 == len(ordered) or ordered[i + 1][1] >= end
+        if is_leaf:
+            shown = view[start : min(end, start + max_bytes)].hex(" ")
+            more = (
+                f" ... (+{end - start - max_bytes} bytes)"
+                if end - start > max_bytes
+                else ""
+            )
+            line += f": {shown}{more}"
+        lines.append(line + "\n")
+        open_ends.append(end)
+        if len(lines) >= LINES_PER_CHUNK:
+            out.write("".join(lines))
+            lines.clear()
+    out.write("".join(lines))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Dump a binary file")
+    parser.add_argument("path")
+    parser.add_argument("--varint", action="store_true")
+    args = parser.parse_args()
+
+    with open(args.path, "rb") as f:
+        if f.seek(0, 2) == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            if args.varint:
+                dump_varint(data, sys.stdout)
+            else:
+                dump_hex(data, sys.stdout)
+
+
+if __name__ == "__main__":
+    main()
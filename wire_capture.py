@@ -0,0 +1,335 @@
+from __future__ import annotations
+
+import argparse
+import mmap
+import socket
+import struct
+import time
+from dataclasses import dataclass, field
+from io import BytesIO
+from typing import BinaryIO, Callable, Final, Iterator
+
+from api_registry import API_REGISTRY
+from framing import FrameAssembler
+from memory_reader import memory_reader
+from read_write import read_int16, read_int32
+from request_response_headers import read_response_correlation_id
+
+# A capture is two files:
+# - the data file with raw frames (without the size prefix) back to back;
+# - the index file with a fixed-size entry per frame, pointing into the data file.
+# Both start with a magic string.
+DATA_MAGIC: Final = b"KWCAPD01"
+INDEX_MAGIC: Final = b"KWCAPI01"
+# offset, length, direction, api_key, api_version, correlation_id, timestamp_ns
+INDEX_ENTRY: Final = struct.Struct(">QIBhhiq")
+
+REQUEST: Final = 0
+RESPONSE: Final = 1
+
+# Index entries are held back until the data they point to is flushed,
+# so the index on disk never points past the data. Up to this many bytes.
+INDEX_BUFFER_BYTES: Final = 64 * 1024
+
+
+def index_path(path: str) -> str:
+    return f"{path}.index"
+
+
+@dataclass
+class CapturedFrame:
+    direction: int
+    api_key: int
+    api_version: int
+    correlation_id: int
+    timestamp_ns: int
+    # The frame without the size prefix. Valid only while the reader is open.
+    frame: memoryview
+
+
+class CaptureWriter:
+    def __init__(self, path: str) -> None:
+        self._data = open(path, "ab")
+        self._index = open(index_path(path), "ab")
+        if self._data.tell() == 0:
+            self._data.write(DATA_MAGIC)
+        if self._index.tell() == 0:
+            self._index.write(INDEX_MAGIC)
+        self._offset = self._data.tell()
+        self._index_buffer = bytearray()
+
+    def append(
+        self,
+        direction: int,
+        api_key: int,
+        api_version: int,
+        correlation_id: int,
+        frame: bytes | bytearray | memoryview,
+        timestamp_ns: int | None = None,
+    ) -> None:
+        length = self._data.write(frame)
+        self._append_index(
+            direction, api_key, api_version, correlation_id, length, timestamp_ns
+        )
+
+    def append_chunks(
+        self,
+        direction: int,
+        api_key: int,
+        api_version: int,
+        correlation_id: int,
+        chunks: Iterator[bytes],
+        timestamp_ns: int | None = None,
+    ) -> int:
+        # For frames that are too large to be built in memory at once.
+        length = 0
+        for chunk in chunks:
+            length += self._data.write(chunk)
+        self._append_index(
+            direction, api_key, api_version, correlation_id, length, timestamp_ns
+        )
+        return length
+
+    def _append_index(
+        self,
+        direction: int,
+        api_key: int,
+        api_version: int,
+        correlation_id: int,
+        length: int,
+        timestamp_ns: int | None,
+    ) -> None:
+        if timestamp_ns is None:
+            timestamp_ns = time.time_ns()
+        self._index_buffer += INDEX_ENTRY.pack(
+            self._offset,
+            length,
+            direction,
+            api_key,
+            api_version,
+            correlation_id,
+            timestamp_ns,
+        )
+        self._offset += length
+        if len(self._index_buffer) >= INDEX_BUFFER_BYTES:
+            self.flush()
+
+    def flush(self) -> None:
+        # The data goes first, so the index never points past the data.
+        self._data.flush()
+        self._index.write(self._index_buffer)
+        self._index_buffer.clear()
+        self._index.flush()
+
+    def close(self) -> None:
+        self.flush()
+        self._data.close()
+        self._index.close()
+
+    def __enter__(self) -> CaptureWriter:
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        self.close()
+
+
+class CapturingSocket:
+    # Wraps a socket and records every request it sends and response it receives,
+    # so the existing `send_request`/`receive_response` functions can be captured
+    # without changes.
+
+    def __init__(self, sock: socket.socket, writer: CaptureWriter) -> None:
+        self._sock = sock
+        self._writer = writer
+        self._outgoing = FrameAssembler()
+        self._incoming = FrameAssembler()
+        # correlation_id -> (api_key, api_version), responses don't carry them.
+        self._pending: dict[int, tuple[int, int]] = {}
+
+    def sendall(self, data: bytes) -> None:
+        self._sock.sendall(data)
+        for frame in self._outgoing.feed(data):
+            buffer = BytesIO(frame)
+            api_key = read_int16(buffer)
+            api_version = read_int16(buffer)
+            correlation_id = read_int32(buffer)
+            self._pending[correlation_id] = (api_key, api_version)
+            self._writer.append(REQUEST, api_key, api_version, correlation_id, frame)
+
+    def recv(self, bufsize: int) -> bytes:
+        data = self._sock.recv(bufsize)
+        self._record_incoming(data)
+        return data
+
+    def recv_into(self, buffer: bytearray | memoryview, nbytes: int = 0) -> int:
+        n = self._sock.recv_into(buffer, nbytes)
+        self._record_incoming(memoryview(buffer)[:n])
+        return n
+
+    def _record_incoming(self, data: bytes | memoryview) -> None:
+        for frame in self._incoming.feed(data):
+            correlation_id = read_response_correlation_id(BytesIO(frame[:4]))
+            api_key, api_version = self._pending.pop(correlation_id, (-1, -1))
+            self._writer.append(RESPONSE, api_key, api_version, correlation_id, frame)
+
+    def __getattr__(self, name: str) -> object:
+        return getattr(self._sock, name)
+
+
+class CaptureReader:
+    def __init__(self, path: str) -> None:
+        with open(path, "rb") as f:
+            self._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        with open(index_path(path), "rb") as f:
+            self._index = f.read()
+        if self._data[: len(DATA_MAGIC)] != DATA_MAGIC:
+            raise ValueError(f"{path} is not a capture data file")
+        if self._index[: len(INDEX_MAGIC)] != INDEX_MAGIC:
+            raise ValueError(f"{index_path(path)} is not a capture index file")
+        # A partially written last entry is ignored.
+        self._count = (len(self._index) - len(INDEX_MAGIC)) // INDEX_ENTRY.size
+        self._view = memoryview(self._data)
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __iter__(self) -> Iterator[CapturedFrame]:
+        for i in range(self._count):
+            yield self[i]
+
+    def __getitem__(self, i: int) -> CapturedFrame:
+        if i < 0 or i >= self._count:
+            raise IndexError(i)
+        (
+            offset,
+            length,
+            direction,
+            api_key,
+            api_version,
+            correlation_id,
+            timestamp_ns,
+        ) = INDEX_ENTRY.unpack_from(
+            self._index, len(INDEX_MAGIC) + i * INDEX_ENTRY.size
+        )
+        return CapturedFrame(
+            direction=direction,
+            api_key=api_key,
+            api_version=api_version,
+            correlation_id=correlation_id,
+            timestamp_ns=timestamp_ns,
+            frame=self._view[offset : offset + length],
+        )
+
+    def close(self) -> None:
+        self._view.release()
+        try:
+            self._data.close()
+        except BufferError:
+            # Some frames are still referenced,
+            # the file gets unmapped when the last of them is dropped.
+            pass
+
+    def __enter__(self) -> CaptureReader:
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        self.close()
+
+
+Decoder = Callable[[BinaryIO], object]
+
+
+def with_header(read_header: Decoder, read_body: Decoder) -> Decoder:
+    def decode(buffer: BinaryIO) -> object:
+        read_header(buffer)
+        return read_body(buffer)
+
+    return decode
+
+
+def registry_decoder(direction: int, api_key: int, api_version: int) -> Decoder | None:
+    # Decodes whole frames with the codecs from the API registry.
+    spec = API_REGISTRY.get((api_key, api_version))
+    if spec is None:
+        return None
+    return spec.read_request if direction == REQUEST else spec.read_response
+
+
+@dataclass
+class ApiReplayStats:
+    frames: int = 0
+    bytes: int = 0
+    seconds: float = 0.0
+
+
+@dataclass
+class ReplayStats:
+    decoded: dict[tuple[int, int, int], ApiReplayStats] = field(default_factory=dict)
+    skipped: int = 0
+    # Frames that failed to decode, by their position in the capture.
+    errors: dict[int, ValueError] = field(default_factory=dict)
+
+    @property
+    def seconds(self) -> float:
+        return sum(s.seconds for s in self.decoded.values())
+
+
+def replay(
+    path: str,
+    decoders: dict[tuple[int, int, int], Decoder] | None = None,
+    repeat: int = 1,
+) -> ReplayStats:
+    # By default, everything the API registry knows is decoded.
+    stats = ReplayStats()
+    with CaptureReader(path) as reader:
+        for _ in range(repeat):
+            for i, captured in enumerate(reader):
+                key = (captured.direction, captured.api_key, captured.api_version)
+                decoder = (
+                    registry_decoder(*key) if decoders is None else decoders.get(key)
+                )
+                if decoder is None:
+                    stats.skipped += 1
+                    continue
+                start = time.perf_counter()
+                try:
+                    decoder(memory_reader(captured.frame))
+                except ValueError as e:
+                    # E.g. a frame cut short when the capture was stopped.
+                    stats.errors[i] = e
+                    continue
+                elapsed = time.perf_counter() - start
+
+                api_stats = stats.decoded.get(key)
+                if api_stats is None:
+                    api_stats = stats.decoded[key] = ApiReplayStats()
+                api_stats.frames += 1
+                api_stats.bytes += len(captured.frame)
+                api_stats.seconds += elapsed
+    return stats
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Decode all frames of a capture")
+    parser.add_argument("path")
+    parser.add_argument("--repeat", type=int, default=1)
+    args = parser.parse_args()
+
+    stats = replay(args.path, repeat=args.repeat)
+    print(
+        f"{'direction':>9} {'api_key':>7} {'version':>7} {'frames':>8} {'MB':>10} {'MB/s':>10}"
+    )
+    for (direction, api_key, api_version), s in sorted(stats.decoded.items()):
+        mb = s.bytes / 1024 / 1024
+        mb_per_s = mb / s.seconds if s.seconds > 0 else 0.0
+        print(
+            f"{'request' if direction == REQUEST else 'response':>9} "
+            f"{api_key:>7} {api_version:>7} {s.frames:>8} {mb:>10.2f} {mb_per_s:>10.2f}"
+        )
+    print(f"skipped frames without a decoder: {stats.skipped}")
+    for i, error in sorted(stats.errors.items()):
+        print(f"frame {i} failed to decode: {error}")
+
+
+if __name__ == "__main__":
+    main()